@@ -0,0 +1,186 @@
+"""
+准入控制（纯 ASGI 中间件）
+
+需要等待上游 API 的接口（激活、查询、消费记录等，单次最长约 30 秒）按路由类别限制同时处理的请求数，
+超出的请求在有界队列中等待；队列已满或等待超时时立即返回 503（管理接口）或 429（公共接口），
+并通过 Retry-After 告知客户端多久后重试。只读本地数据库的接口不受限制，上游拥堵时仍能快速响应。
+公共同步接口另外按客户端 IP 限流，超出的请求在解析请求体之前直接返回 429。
+"""
+import asyncio
+import math
+import time
+from typing import Optional
+
+from starlette.responses import JSONResponse
+
+from .config import (
+    ADMISSION_SYNC_CONCURRENCY, ADMISSION_SYNC_QUEUE, ADMISSION_UPSTREAM_CONCURRENCY,
+    ADMISSION_UPSTREAM_QUEUE, ADMISSION_WAIT_TIMEOUT, SYNC_RATE_LIMIT_PER_IP, SYNC_RATE_WINDOW
+)
+from .middleware import compile_routes
+from .rate_limit import SlidingWindowLimiter
+
+# 平均处理时间的平滑系数（指数移动平均）
+EWMA_ALPHA = 0.2
+
+
+class RouteClass:
+    """
+    一类路由的并发限制：最多 limit 个请求同时处理，最多 queue_size 个请求排队等待
+
+    client_limiter 不为空时，每个客户端 IP 的请求频率也受限制（在排队之前检查）
+    """
+
+    def __init__(
+        self,
+        name: str,
+        routes: tuple,
+        limit: int,
+        queue_size: int,
+        reject_status: int,
+        client_limiter: Optional[SlidingWindowLimiter] = None
+    ):
+        self.name = name
+        self.pattern = compile_routes(routes)
+        self.limit = limit
+        self.queue_size = queue_size
+        self.reject_status = reject_status
+        self.client_limiter = client_limiter
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        # 平均处理时间（秒），用于估算 Retry-After
+        self.avg_duration = 1.0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    async def acquire(self, timeout: float) -> bool:
+        """获取处理名额，队列已满或等待超时返回 False"""
+        if self.active < self.limit and not self.waiting:
+            await self.semaphore.acquire()
+        elif self.waiting >= self.queue_size:
+            self.rejected += 1
+            return False
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+            finally:
+                self.waiting -= 1
+        self.active += 1
+        self.admitted += 1
+        return True
+
+    def release(self, duration: float) -> None:
+        self.active -= 1
+        self.avg_duration += EWMA_ALPHA * (duration - self.avg_duration)
+        self.semaphore.release()
+
+    def retry_after(self) -> int:
+        """估算排队请求处理完需要的时间（秒）"""
+        return max(1, math.ceil(self.avg_duration * (self.waiting + 1) / self.limit))
+
+    def status(self) -> dict:
+        status = {
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_duration_ms": round(self.avg_duration * 1000, 1),
+        }
+        if self.client_limiter is not None:
+            status["per_client"] = self.client_limiter.status()
+        return status
+
+
+# 路由类别（按顺序匹配，第一个匹配的生效；语法与鉴权中间件的路由规则相同）
+ROUTE_CLASSES = (
+    RouteClass(
+        "sync",
+        ("/api/cards/*/sync-activation",),
+        ADMISSION_SYNC_CONCURRENCY, ADMISSION_SYNC_QUEUE, 429,
+        client_limiter=SlidingWindowLimiter(SYNC_RATE_LIMIT_PER_IP, SYNC_RATE_WINDOW)
+    ),
+    RouteClass(
+        "upstream",
+        (
+            "/api/cards/*/activate",
+            "/api/cards/*/query",
+            "/api/cards/*/transactions",
+            "/api/cards/*/full",
+            "/api/cards/spend-summary",
+        ),
+        ADMISSION_UPSTREAM_CONCURRENCY, ADMISSION_UPSTREAM_QUEUE, 503
+    ),
+)
+
+# 需要限流的请求方法（CORS 预检等请求不占用名额）
+LIMITED_METHODS = ("GET", "POST")
+
+
+def admission_status() -> dict:
+    """各路由类别当前的并发、排队和拒绝数量（当前 worker 进程）"""
+    return {route_class.name: route_class.status() for route_class in ROUTE_CLASSES}
+
+
+def _reject(status_code: int, retry_after: int, reason: str = "服务繁忙") -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": f"{reason}，请 {retry_after} 秒后重试"},
+        headers={"Retry-After": str(retry_after)}
+    )
+
+
+def _client_host(scope) -> str:
+    """客户端 IP（反向代理后需要启用 uvicorn 的 --proxy-headers 才是真实 IP）"""
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _match(method: str, path: str) -> Optional[RouteClass]:
+    if method not in LIMITED_METHODS:
+        return None
+    for route_class in ROUTE_CLASSES:
+        if route_class.pattern.match(path):
+            return route_class
+    return None
+
+
+class AdmissionMiddleware:
+    """按路由类别限制并发，超出队列容量的请求直接拒绝"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        route_class = _match(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        if route_class.client_limiter is not None:
+            retry_after = route_class.client_limiter.hit(_client_host(scope))
+            if retry_after is not None:
+                await _reject(429, retry_after, "请求过于频繁")(scope, receive, send)
+                return
+
+        if not await route_class.acquire(ADMISSION_WAIT_TIMEOUT):
+            await _reject(route_class.reject_status, route_class.retry_after())(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route_class.release(time.monotonic() - started)
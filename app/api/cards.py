@@ -1,14 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
-
-from .. import crud, schemas, models
-from ..database import get_db
-from ..utils.activation import auto_activate_if_needed, extract_card_info, query_card_from_api, get_card_transactions
+import asyncio
+import hashlib
+import hmac
+import time
+
+from .. import card_sync, crud, expiry, schemas, models, spend, versioning
+from ..config import (
+    CARD_DETAIL_DB_TIMEOUT, CARD_DETAIL_UPSTREAM_TIMEOUT, SPEND_CACHE_TTL, SYNC_API_SECRET,
+    SYNC_RATE_LIMIT_PER_CARD, SYNC_RATE_WINDOW, SYNC_REPLAY_CACHE_SIZE
+)
+from ..database import get_db, read_session, SessionLocal
+from ..rate_limit import ReplayCache, SlidingWindowLimiter
+from ..utils import export
+from ..utils.activation import auto_activate_if_needed, query_card_from_api, get_card_transactions
 
 router = APIRouter(prefix="/cards", tags=["cards"])
 
+# 汇总类查询结果的进程内缓存（按数据版本跨 worker 失效）
+summary_cache = versioning.VersionedCache(versioning.CARDS)
+
+
+FIELDS_DESCRIPTION = "只返回指定字段，逗号分隔（如 card_id,card_number），可选值：" + ", ".join(crud.CARD_FIELDS)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[list[str]]:
+    """解析并校验 fields 参数，未指定时返回 None（表示全部字段）"""
+    if not fields:
+        return None
+
+    selected = []
+    for name in fields.split(","):
+        name = name.strip()
+        if not name or name in selected:
+            continue
+        if name not in crud.CARD_FIELDS:
+            raise HTTPException(status_code=400, detail=f"不支持的字段: {name}")
+        selected.append(name)
+    return selected or None
+
 
 @router.post("/", response_model=schemas.CardResponse, status_code=201, summary="创建新卡片")
 async def create_card(
@@ -26,6 +58,8 @@ async def create_card(
     existing_card = crud.get_card_by_id(db, card.card_id)
     if existing_card:
         raise HTTPException(status_code=400, detail="卡密已存在")
+    if crud.get_archived_card_ids(db, [card.card_id]):
+        raise HTTPException(status_code=400, detail="卡密已归档")
 
     db_card = crud.create_card(db, card)
     return db_card
@@ -33,10 +67,12 @@ async def create_card(
 
 @router.get("/", response_model=List[schemas.CardResponse], summary="获取卡片列表")
 async def list_cards(
+    request: Request,
     skip: int = Query(0, ge=0, description="跳过的记录数（用于分页）"),
     limit: int = Query(100, ge=1, le=1000, description="返回的记录数（1-1000）"),
     status: Optional[str] = Query(None, description="按状态筛选（active/inactive/expired/not_expired）"),
     search: Optional[str] = Query(None, description="搜索关键词（匹配卡密或卡号）"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
     """
@@ -46,25 +82,241 @@ async def list_cards(
     - **limit**: 返回的记录数，范围 1-1000（默认 100）
     - **status**: 按状态筛选，可选值：active（已激活）、inactive（未激活）、expired（已过期）、not_expired（未过期且已激活）
     - **search**: 搜索关键词，会在卡密和卡号中搜索匹配项
+    - **fields**: 只返回指定字段（逗号分隔），只查询这些列，适合只需要少量字段的场景
+
+    支持条件请求：携带 `If-None-Match` 且数据未变化时返回 304。
+    """
+    selected_fields = parse_fields(fields)
+
+    crud.update_expired_cards(db)
+    etag = versioning.make_etag(
+        versioning.CARDS, versioning.get_data_version(db), skip, limit, status, search,
+        ",".join(selected_fields or [])
+    )
+    if versioning.etag_matches(request, etag):
+        return versioning.not_modified(etag)
+
+    # 快速路径：按列查询 + orjson 序列化，跳过逐行的响应模型校验
+    rows = crud.get_card_rows(
+        db, skip=skip, limit=limit, status=status, search=search, fields=selected_fields
+    )
+    response = ORJSONResponse(rows)
+    versioning.set_etag(response, etag)
+    return response
+
+
+@router.get("/export", summary="导出卡片（CSV/JSONL）")
+async def export_cards(
+    export_format: str = Query("csv", alias="format", pattern="^(csv|jsonl)$", description="导出格式（csv/jsonl）"),
+    status: Optional[str] = Query(None, description="按状态筛选（active/inactive/expired）"),
+    search: Optional[str] = Query(None, description="搜索关键词（匹配卡密或卡号）"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    include_archived: bool = Query(False, description="是否同时导出归档的卡片（排在未归档卡片之后）"),
+    db: Session = Depends(get_db)
+):
+    """
+    导出卡片数据（流式响应）
+
+    筛选条件与卡片列表一致，数据从数据库游标分批读取后直接写入响应，
+    内存占用与卡片总数无关，适合导出整张表用于对账。
+    启用只读副本（READ_REPLICA_INTERVAL）时从副本读取，数据最多延迟一个刷新间隔。
+
+    - **format**: 导出格式，csv（默认）或 jsonl
+    - **status**: 按状态筛选
+    - **search**: 搜索关键词
+    - **fields**: 只导出指定字段（逗号分隔），默认导出全部字段
+    - **include_archived**: 同时导出归档表中符合条件的卡片（默认 false）
+    """
+    from ..config import get_current_time
+
+    selected_fields = parse_fields(fields) or list(crud.CARD_FIELDS)
+    crud.update_expired_cards(db)
+
+    def iter_rows():
+        # 响应发送时请求的数据库会话已关闭，流式读取使用独立的会话（启用只读副本时读副本）
+        stream_db = read_session()
+        try:
+            yield from crud.iter_card_rows(stream_db, status=status, search=search, fields=selected_fields)
+            if include_archived:
+                yield from crud.iter_card_rows(
+                    stream_db, status=status, search=search, fields=selected_fields, archived=True
+                )
+        finally:
+            stream_db.close()
+
+    if export_format == "csv":
+        body = export.iter_csv(iter_rows(), selected_fields)
+    else:
+        body = export.iter_jsonl(iter_rows())
+
+    filename = f"cards-{get_current_time():%Y%m%d-%H%M%S}.{export_format}"
+    return StreamingResponse(
+        body,
+        media_type=export.EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/archive", response_model=List[schemas.ArchivedCardResponse], summary="查询归档卡片")
+async def list_archived_cards(
+    card_id: Optional[str] = Query(None, description="卡密（精确匹配）"),
+    card_number: Optional[str] = Query(None, description="卡号（精确匹配）"),
+    skip: int = Query(0, ge=0, description="跳过的记录数（用于分页）"),
+    limit: int = Query(100, ge=1, le=1000, description="返回的记录数（1-1000）"),
+    db: Session = Depends(get_db)
+):
     """
-    cards = crud.get_cards(db, skip=skip, limit=limit, status=status, search=search)
-    return cards
+    查询已归档的卡片
+
+    过期或退款超过 ARCHIVE_AFTER_DAYS 天的卡片会被移到归档表，不再出现在卡片列表和单卡查询中，
+    需要通过这个接口按卡密或卡号查询（索引精确匹配）。都不指定时按归档时间倒序列出。
+
+    - **card_id**: 卡密
+    - **card_number**: 卡号
+    - **skip** / **limit**: 分页
+    """
+    rows = crud.get_archived_card_rows(db, card_id=card_id, card_number=card_number, skip=skip, limit=limit)
+    return ORJSONResponse(rows)
+
+
+@router.get("/expiring", response_model=List[schemas.CardResponse], summary="获取即将过期的卡片")
+async def list_expiring_cards(
+    within: int = Query(86400, ge=1, le=30 * 86400, description="时间范围（秒，默认 86400 即 24 小时）"),
+    limit: int = Query(100, ge=1, le=1000, description="返回的记录数（1-1000）"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: Session = Depends(get_db)
+):
+    """
+    获取指定时间内即将过期的卡片（按过期时间升序）
+
+    只返回未删除、未过期的卡片，通过过期时间索引范围查询，耗时只与结果数量有关。
+
+    - **within**: 时间范围（秒），返回在该时间内过期的卡片
+    - **limit**: 返回的记录数，范围 1-1000（默认 100）
+    - **fields**: 只返回指定字段（逗号分隔）
+    """
+    selected_fields = parse_fields(fields)
+    crud.update_expired_cards(db)
+    rows = crud.get_expiring_card_rows(db, within, limit=limit, fields=selected_fields)
+    return ORJSONResponse(rows)
+
+
+@router.get("/spend-summary", response_model=schemas.SpendSummaryResponse, summary="消费汇总")
+async def get_spend_summary(
+    max_age: int = Query(SPEND_CACHE_TTL, ge=0, description="余额缓存最长使用时间（秒），0 表示全部重新查询"),
+    db: Session = Depends(get_db)
+):
+    """
+    汇总所有已激活、未退款卡片的额度和消费
+
+    并发查询每张卡片的余额信息（并发数由 SPEND_CONCURRENCY 控制），结果按卡片缓存。
+    部分卡片查询失败时仍返回其余卡片的汇总（partial=true），有旧缓存的卡片返回旧数据并标记为 stale。
+
+    - **max_age**: 缓存未超过该时间（秒）时直接使用，不重新查询
+    """
+    cards = crud.get_spend_card_rows(db)
+    return await spend.summarize_spend(cards, max_age=max_age)
 
 
 @router.get("/{card_id}", response_model=schemas.CardResponse, summary="获取单个卡片信息")
 async def get_card(
+    request: Request,
     card_id: str = Path(..., description="卡密（格式：mio-xxxxx-xxxxx-xxxxx-xxxxx）"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
     """
     根据卡密获取单个卡片的详细信息
     
     - **card_id**: 卡密，格式为 mio-xxxxx-xxxxx-xxxxx-xxxxx
+    - **fields**: 只返回指定字段（逗号分隔）
+
+    支持条件请求：携带 `If-None-Match` 且卡片未变化时返回 304。
+    """
+    selected_fields = parse_fields(fields)
+
+    row_version = crud.get_card_version(db, card_id)
+    if row_version is None:
+        # 卡片不存在，或已到期需要先更新状态
+        db_card = crud.get_card_by_id(db, card_id)
+        if not db_card:
+            raise HTTPException(status_code=404, detail="卡片不存在")
+        row_version = db_card.row_version
+
+    etag = versioning.make_etag("card", card_id, row_version, ",".join(selected_fields or []))
+    if versioning.etag_matches(request, etag):
+        return versioning.not_modified(etag)
+
+    row = crud.get_card_row(db, card_id, fields=selected_fields)
+    if row is None:
+        raise HTTPException(status_code=404, detail="卡片不存在")
+    response = ORJSONResponse(row)
+    versioning.set_etag(response, etag)
+    return response
+
+
+def log_to_dict(log: models.ActivationLog) -> dict:
+    """激活记录转换为响应字典"""
+    return {
+        "id": log.id,
+        "status": log.status,
+        "error_message": log.error_message,
+        "activation_time": log.activation_time,
+    }
+
+
+def load_activation_logs(card_id: str) -> list[dict]:
+    """在线程中读取激活记录（使用独立的数据库会话）"""
+    db = SessionLocal()
+    try:
+        return [log_to_dict(log) for log in crud.get_activation_logs(db, card_id)]
+    finally:
+        db.close()
+
+
+async def fetch_logs_part(card_id: str) -> dict:
+    """卡片详情的激活记录部分（超过 CARD_DETAIL_DB_TIMEOUT 时标记为超时）"""
+    try:
+        logs = await asyncio.wait_for(asyncio.to_thread(load_activation_logs, card_id), CARD_DETAIL_DB_TIMEOUT)
+    except asyncio.TimeoutError:
+        return {"status": "timeout", "data": None, "error": f"读取超时（{CARD_DETAIL_DB_TIMEOUT:g} 秒）"}
+    except Exception as e:
+        return {"status": "error", "data": None, "error": str(e)}
+    return {"status": "ok", "data": logs, "error": None}
+
+
+async def fetch_transactions_part(card_number: Optional[str]) -> dict:
+    """卡片详情的消费记录部分（未激活的卡片不查询）"""
+    if not card_number:
+        return {"status": "skipped", "error": "卡片未激活，无法查询消费记录"}
+    return await spend.fetch_card_info(str(card_number), CARD_DETAIL_UPSTREAM_TIMEOUT)
+
+
+@router.get("/{card_id}/full", response_model=schemas.CardFullResponse, summary="获取卡片详情（含激活记录和消费记录）")
+async def get_card_full(
+    card_id: str = Path(..., description="卡密"),
+    db: Session = Depends(get_db)
+):
+    """
+    一次返回卡片信息、激活记录和消费记录（管理页面卡片详情使用）
+
+    读取卡片后，激活记录（独立会话）和消费记录（上游 API）并发加载，各自有超时时间：
+    某一部分超时或失败时只在该部分的 status/error 中标记，其他部分正常返回。
+    消费记录查询失败时返回缓存的余额信息（如果有）。
+
+    - **card_id**: 卡密
     """
     db_card = crud.get_card_by_id(db, card_id)
     if not db_card:
         raise HTTPException(status_code=404, detail="卡片不存在")
-    return db_card
+    card = schemas.CardResponse.model_validate(db_card)
+
+    logs, transactions = await asyncio.gather(
+        fetch_logs_part(card_id),
+        fetch_transactions_part(db_card.card_number),
+    )
+
+    return {"card": card, "logs": logs, "transactions": transactions}
 
 
 @router.put("/{card_id}", response_model=schemas.CardResponse, summary="更新卡片信息")
@@ -79,10 +331,10 @@ async def update_card(
     - **card_id**: 卡密
     - **card_update**: 要更新的字段（card_nickname、card_limit、validity_hours、status）
     """
-    db_card = crud.update_card(db, card_id, card_update)
-    if not db_card:
+    card = crud.update_card(db, card_id, card_update)
+    if not card:
         raise HTTPException(status_code=404, detail="卡片不存在")
-    return db_card
+    return card
 
 
 @router.delete("/{card_id}", response_model=schemas.APIResponse, summary="删除卡片")
@@ -127,46 +379,12 @@ async def activate_card(
         crud.create_activation_log(db, card_id, "failed", error_message=message)
         raise HTTPException(status_code=400, detail=message)
 
-    card_info = extract_card_info(card_data)
-
-    if card_info.get("card_number"):
-        from datetime import datetime, timezone, timedelta
-        from ..config import APP_TIMEZONE
-        exp_date = None
-        if card_info.get("exp_date"):
-            try:
-                dt = datetime.fromisoformat(card_info["exp_date"].replace('Z', '+00:00'))
-                if dt.tzinfo is None:
-                    utc8 = timezone(timedelta(hours=8))
-                    dt = dt.replace(tzinfo=utc8)
-                exp_date = dt.astimezone(APP_TIMEZONE).replace(tzinfo=None)
-            except:
-                pass
-
-        crud.activate_card_in_db(
-            db,
-            card_id,
-            card_info["card_number"],
-            card_info["card_cvc"],
-            card_info["card_exp_date"],
-            card_info.get("billing_address"),
-            validity_hours=card_info.get("validity_hours"),
-            exp_date=exp_date
-        )
-
-        crud.create_activation_log(db, card_id, "success")
-        db_card = crud.get_card_by_id(db, card_id)
-        return {
-            "success": True,
-            "message": message,
-            "card_data": db_card
-        }
-    else:
-        return {
-            "success": True,
-            "message": message,
-            "card_data": db_card
-        }
+    card = card_sync.apply_activation_result(db, card_id, card_data)
+    return {
+        "success": True,
+        "message": message,
+        "card_data": card or db_card
+    }
 
 
 @router.post("/{card_id}/query", response_model=schemas.ActivationResponse, summary="查询并更新卡片信息")
@@ -189,47 +407,13 @@ async def query_card(
     if not success:
         raise HTTPException(status_code=400, detail=error or "查询失败")
 
-    card_info = extract_card_info(card_data)
-
-    from datetime import datetime, timezone, timedelta
-    from ..config import APP_TIMEZONE
-    exp_date = None
-    if card_info.get("exp_date"):
-        try:
-            dt = datetime.fromisoformat(card_info["exp_date"].replace('Z', '+00:00'))
-            if dt.tzinfo is None:
-                utc8 = timezone(timedelta(hours=8))
-                dt = dt.replace(tzinfo=utc8)
-            exp_date = dt.astimezone(APP_TIMEZONE).replace(tzinfo=None)
-        except:
-            pass
-
-    update_data = schemas.CardUpdate(
-        card_limit=card_info.get("card_limit"),
-        status=card_info.get("status")
-    )
-
-    if card_info.get("card_number"):
-        crud.activate_card_in_db(
-            db,
-            card_id,
-            str(card_info["card_number"]),
-            str(card_info["card_cvc"]),
-            card_info["card_exp_date"],
-            card_info.get("billing_address"),
-            validity_hours=card_info.get("validity_hours"),
-            exp_date=exp_date
-        )
-    else:
-        db_card.validity_hours = card_info.get("validity_hours")
-        db_card.exp_date = exp_date
-        crud.update_card(db, card_id, update_data)
-
-    db_card = crud.get_card_by_id(db, card_id)
+    card = card_sync.apply_query_result(db, db_card, card_data)
+    if card is None:
+        raise HTTPException(status_code=404, detail="卡片不存在于本地数据库")
     return {
         "success": True,
         "message": "查询成功",
-        "card_data": db_card
+        "card_data": card
     }
 
 
@@ -246,15 +430,7 @@ async def get_activation_logs(
     返回激活日志列表，包含每次激活的状态（success/failed）、错误信息、激活时间等。
     """
     logs = crud.get_activation_logs(db, card_id)
-    return [
-        {
-            "id": log.id,
-            "status": log.status,
-            "error_message": log.error_message,
-            "activation_time": log.activation_time,
-        }
-        for log in logs
-    ]
+    return [log_to_dict(log) for log in logs]
 
 
 @router.post("/{card_id}/refund", response_model=schemas.APIResponse, summary="切换退款状态")
@@ -269,34 +445,21 @@ async def toggle_refund_status(
     
     - **card_id**: 卡密
     """
-    from datetime import datetime
-
-    db_card = crud.get_card_by_id(db, card_id)
-    if not db_card:
+    card = crud.toggle_refund(db, card_id)
+    if not card:
         raise HTTPException(status_code=404, detail="卡片不存在")
 
-    db_card.refund_requested = not db_card.refund_requested
-
-    if db_card.refund_requested:
-        from ..config import get_current_time
-        db_card.refund_requested_time = get_current_time()
-        message = "已标记为申请退款"
-    else:
-        db_card.refund_requested_time = None
-        message = "已取消退款标记"
-
-    db.commit()
-    db.refresh(db_card)
-
     return {
         "success": True,
-        "message": message,
-        "data": {"refund_requested": db_card.refund_requested}
+        "message": "已标记为申请退款" if card["refund_requested"] else "已取消退款标记",
+        "data": {"refund_requested": bool(card["refund_requested"])}
     }
 
 
 @router.get("/batch/unreturned-card-numbers", response_model=schemas.APIResponse, summary="获取已过期未退款卡号列表")
 async def get_unreturned_card_numbers(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """
@@ -308,17 +471,27 @@ async def get_unreturned_card_numbers(
     - 未标记为已申请退款
     
     返回卡号列表和总数。
+
+    支持条件请求：携带 `If-None-Match` 且数据未变化时返回 304。
     """
     crud.update_expired_cards(db)
-
-    cards = db.query(models.Card).filter(
-        models.Card.status == 'expired',
-        models.Card.is_activated == True,
-        models.Card.refund_requested == False,
-        models.Card.card_number.isnot(None)
-    ).all()
-
-    card_numbers = [str(card.card_number) for card in cards]
+    data_version = versioning.get_data_version(db)
+    etag = versioning.make_etag("unreturned", data_version)
+    if versioning.etag_matches(request, etag):
+        return versioning.not_modified(etag)
+    versioning.set_etag(response, etag)
+
+    summary_cache.sync(data_version)
+    card_numbers = summary_cache.get("unreturned")
+    if card_numbers is None:
+        cards = db.query(models.Card).filter(
+            models.Card.status == 'expired',
+            models.Card.is_activated == True,
+            models.Card.refund_requested == False,
+            models.Card.card_number.isnot(None)
+        ).all()
+        card_numbers = [str(card.card_number) for card in cards]
+        summary_cache.set("unreturned", card_numbers)
 
     return {
         "success": True,
@@ -330,7 +503,7 @@ async def get_unreturned_card_numbers(
     }
 
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 
 class SyncActivationRequest(BaseModel):
     """同步激活请求模型"""
@@ -339,6 +512,176 @@ class SyncActivationRequest(BaseModel):
     signature: str  # HMAC 签名
 
 
+class SyncActivationBatchItem(SyncActivationRequest):
+    """批量同步激活的单条数据"""
+    card_id: str
+
+
+class SyncActivationBatchRequest(BaseModel):
+    """批量同步激活请求模型（每张卡片最多一条，结果与提交的数据一一对应）"""
+    items: list[SyncActivationBatchItem] = Field(..., min_length=1, max_length=100)
+
+    @field_validator("items")
+    @classmethod
+    def unique_card_ids(cls, items: list[SyncActivationBatchItem]) -> list[SyncActivationBatchItem]:
+        seen = set()
+        for item in items:
+            if item.card_id in seen:
+                raise ValueError(f"卡密重复: {item.card_id}")
+            seen.add(item.card_id)
+        return items
+
+
+# 签名有效期（毫秒），防止重放攻击
+SYNC_SIGNATURE_TTL_MS = 5 * 60 * 1000
+
+# 每张卡片的同步请求频率限制（每个客户端 IP 的限制在准入控制中间件中检查）
+sync_card_limiter = SlidingWindowLimiter(SYNC_RATE_LIMIT_PER_CARD, SYNC_RATE_WINDOW)
+# 已处理的签名：时间戳在当前时间前后 SYNC_SIGNATURE_TTL_MS 内有效，签名最长可用 2 倍时长
+sync_replay_cache = ReplayCache(2 * SYNC_SIGNATURE_TTL_MS / 1000, SYNC_REPLAY_CACHE_SIZE)
+
+SYNC_MESSAGES = {
+    "rate_limited": "请求过于频繁，请稍后重试",
+    "replayed": "请求已处理，请勿重复提交",
+    "expired": "请求已过期",
+    "invalid_signature": "签名验证失败",
+    "not_in_database": "卡片不在本地数据库中，无需同步",
+    "already_activated": "卡片已在数据库中激活，无需同步",
+    "card_not_activated": "卡片未激活，无法同步",
+}
+
+
+def verify_sync_signature(card_id: str, request_data: SyncActivationRequest) -> Optional[str]:
+    """
+    验证同步请求的时间戳和签名，失败时返回原因（expired/invalid_signature）
+
+    签名格式: HMAC-SHA256(card_id + timestamp + card_number)
+    使用卡号作为签名数据，简单且不易伪造
+    """
+    if abs(int(time.time() * 1000) - request_data.timestamp) > SYNC_SIGNATURE_TTL_MS:
+        return "expired"
+
+    card_number = str(request_data.card_data.get("card_number", ""))
+    sign_data = f"{card_id}{request_data.timestamp}{card_number}"
+    expected_signature = hmac.new(
+        SYNC_API_SECRET.encode(),
+        sign_data.encode(),
+        hashlib.sha256
+    ).hexdigest()
+    if not hmac.compare_digest(request_data.signature, expected_signature):
+        return "invalid_signature"
+    return None
+
+
+def check_sync_request(card_id: str, request_data: SyncActivationRequest) -> Optional[str]:
+    """
+    同步请求的前置检查，失败时返回原因（replayed/expired/invalid_signature/rate_limited）
+
+    先检查重复签名（只查内存），再验证签名；只有签名有效的请求才计入卡片的请求频率，
+    伪造签名的请求不会占用真实同步的额度。
+    签名在激活信息写入数据库后才由 mark_sync_processed 记录，跳过或写入失败的请求可以用相同的数据重试。
+    """
+    if sync_replay_cache.seen(request_data.signature):
+        return "replayed"
+    reason = verify_sync_signature(card_id, request_data)
+    if reason:
+        return reason
+    if sync_card_limiter.hit(card_id) is not None:
+        return "rate_limited"
+    return None
+
+
+def mark_sync_processed(signature: str) -> None:
+    """记录已写入数据库的同步请求签名，相同的请求再次提交时直接拒绝，不会再访问数据库"""
+    sync_replay_cache.add(signature)
+
+
+def sync_guard_status() -> dict:
+    """同步接口限流和防重放的统计（当前 worker 进程）"""
+    return {"per_card": sync_card_limiter.status(), "replay_cache": sync_replay_cache.status()}
+
+
+def sync_skip_reason(db_card: Optional[models.Card], card_data: dict) -> Optional[str]:
+    """签名有效但不需要同步时返回原因"""
+    if not db_card:
+        # 数据库中没有这张卡，不需要同步
+        return "not_in_database"
+    if db_card.is_activated:
+        return "already_activated"
+    if not card_data.get("card_number"):
+        return "card_not_activated"
+    return None
+
+
+def sync_activation_fields(card_data: dict) -> dict:
+    """把公共查询页面提交的 API 卡片数据转换为 crud.set_card_activation 的参数"""
+    return {
+        "card_number": str(card_data["card_number"]),
+        "card_cvc": str(card_data.get("card_cvc", "")),
+        "card_exp_date": card_data.get("card_exp_date", ""),
+        "billing_address": card_data.get("billing_address"),
+        "validity_hours": card_data.get("exp_date"),  # API 的 exp_date 是有效期小时数
+        "exp_ts": expiry.parse_api_datetime(card_data.get("delete_date")),
+    }
+
+
+SYNC_LOG_MESSAGE = "通过公共查询页面同步激活"
+
+
+@router.post("/batch/sync-activation", response_model=schemas.APIResponse, summary="批量同步激活信息（公共）")
+async def sync_card_activations(
+    request_data: SyncActivationBatchRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    批量同步卡片激活信息到本地数据库（公共接口）
+
+    公共查询页面查询到多张已激活的卡片时一次提交。先验证全部签名，再用一次查询获取所有卡片，
+    最后在同一个事务中写入所有激活信息。每条数据的校验规则与单卡同步接口相同，单条失败不影响其他数据。
+
+    - **items**: 数据列表（最多 100 条，卡密不能重复），每条包含 card_id、card_data、timestamp、signature
+
+    返回的 results 与 items 按顺序一一对应。
+    """
+    # 按提交顺序返回每条数据的结果，None 表示已同步
+    results = dict.fromkeys(item.card_id for item in request_data.items)
+    verified = {}
+    for item in request_data.items:
+        reason = check_sync_request(item.card_id, item)
+        if reason:
+            results[item.card_id] = reason
+        else:
+            verified[item.card_id] = item
+
+    db_cards = crud.get_cards_by_ids(db, list(verified))
+    activations = []
+    signatures = []
+    for card_id, item in verified.items():
+        db_card = db_cards.get(card_id)
+        reason = sync_skip_reason(db_card, item.card_data)
+        if reason:
+            results[card_id] = reason
+        else:
+            activations.append((db_card, sync_activation_fields(item.card_data)))
+            signatures.append(item.signature)
+
+    synced_count = crud.activate_cards_in_db(db, activations, log_message=SYNC_LOG_MESSAGE)
+    for signature in signatures:
+        mark_sync_processed(signature)
+
+    return {
+        "success": True,
+        "message": f"已同步 {synced_count} 张卡片的激活信息",
+        "data": {
+            "synced_count": synced_count,
+            "results": [
+                {"card_id": card_id, "synced": reason is None, "reason": reason}
+                for card_id, reason in results.items()
+            ]
+        }
+    }
+
+
 @router.post("/{card_id}/sync-activation", response_model=schemas.APIResponse, summary="同步激活信息（公共）")
 async def sync_card_activation(
     card_id: str = Path(..., description="卡密"),
@@ -354,100 +697,38 @@ async def sync_card_activation(
     - **card_id**: 卡密
     - **request_data**: 包含卡片数据、时间戳和签名
     """
-    import hmac
-    import hashlib
-    import time
-    import json
-    from ..config import SYNC_API_SECRET
-    
-    # 验证时间戳（防止重放攻击，允许 5 分钟的时间差）
-    current_time = int(time.time() * 1000)
-    time_diff = abs(current_time - request_data.timestamp)
-    if time_diff > 5 * 60 * 1000:  # 5 分钟
+    reason = check_sync_request(card_id, request_data)
+    if reason:
         return {
             "success": False,
-            "message": "请求已过期",
-            "data": {"synced": False, "reason": "expired"}
+            "message": SYNC_MESSAGES[reason],
+            "data": {"synced": False, "reason": reason}
         }
-    
-    # 验证签名
-    # 签名格式: HMAC-SHA256(card_id + timestamp + card_number)
-    # 使用卡号作为签名数据，简单且不易伪造
-    card_data = request_data.card_data
-    card_number = str(card_data.get("card_number", ""))
-    sign_data = f"{card_id}{request_data.timestamp}{card_number}"
-    expected_signature = hmac.new(
-        SYNC_API_SECRET.encode(),
-        sign_data.encode(),
-        hashlib.sha256
-    ).hexdigest()
-    
-    if not hmac.compare_digest(request_data.signature, expected_signature):
-        return {
-            "success": False,
-            "message": "签名验证失败",
-            "data": {"synced": False, "reason": "invalid_signature"}
-        }
-    # 检查本地数据库是否有这张卡
+
+    # 检查本地数据库是否有这张卡、是否已激活、传入的数据是否包含激活信息
     db_card = crud.get_card_by_id(db, card_id)
-    if not db_card:
-        # 数据库中没有这张卡，不需要同步
-        return {
-            "success": True,
-            "message": "卡片不在本地数据库中，无需同步",
-            "data": {"synced": False, "reason": "not_in_database"}
-        }
-    
-    # 检查卡片是否已激活
-    if db_card.is_activated:
-        # 已激活，不需要再同步
+    reason = sync_skip_reason(db_card, request_data.card_data)
+    if reason:
         return {
             "success": True,
-            "message": "卡片已在数据库中激活，无需同步",
-            "data": {"synced": False, "reason": "already_activated"}
+            "message": SYNC_MESSAGES[reason],
+            "data": {"synced": False, "reason": reason}
         }
-    
-    # 检查传入的数据是否包含激活信息
-    card_number = card_data.get("card_number")
-    if not card_number:
+
+    # 同步激活信息到数据库（get_card_by_id 返回缓存的只读快照，写入前加载 ORM 对象并按最新数据再检查一次）
+    db_card = crud.get_cards_by_ids(db, [card_id]).get(card_id)
+    reason = sync_skip_reason(db_card, request_data.card_data)
+    if reason:
         return {
             "success": True,
-            "message": "卡片未激活，无法同步",
-            "data": {"synced": False, "reason": "card_not_activated"}
+            "message": SYNC_MESSAGES[reason],
+            "data": {"synced": False, "reason": reason}
         }
-    
-    # 同步激活信息到数据库
-    from datetime import datetime, timezone, timedelta
-    from ..config import APP_TIMEZONE
-    
-    exp_date = None
-    delete_date_str = card_data.get("delete_date")
-    if delete_date_str:
-        try:
-            dt = datetime.fromisoformat(delete_date_str.replace('Z', '+00:00'))
-            if dt.tzinfo is None:
-                # 没有时区信息，假定为东八区
-                utc8 = timezone(timedelta(hours=8))
-                dt = dt.replace(tzinfo=utc8)
-            # 转换为配置的时区并移除时区信息（存储为 naive datetime）
-            exp_date = dt.astimezone(APP_TIMEZONE).replace(tzinfo=None)
-        except:
-            pass
-    
-    crud.activate_card_in_db(
-        db,
-        card_id,
-        str(card_number),
-        str(card_data.get("card_cvc", "")),
-        card_data.get("card_exp_date", ""),
-        card_data.get("billing_address"),
-        validity_hours=card_data.get("exp_date"),  # API 的 exp_date 是有效期小时数
-        exp_date=exp_date
+    crud.activate_cards_in_db(
+        db, [(db_card, sync_activation_fields(request_data.card_data))], log_message=SYNC_LOG_MESSAGE
     )
-    
-    # 记录激活日志
-    crud.create_activation_log(db, card_id, "success", error_message="通过公共查询页面同步激活")
-    
+    mark_sync_processed(request_data.signature)
+
     return {
         "success": True,
         "message": "激活信息已同步到数据库",
@@ -483,6 +764,8 @@ async def get_card_transaction_history(
     if not success:
         raise HTTPException(status_code=400, detail=error or "查询消费记录失败")
 
+    spend.remember(db_card.card_number, card_info)
+
     return {
         "success": True,
         "message": "查询成功",
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
+from typing import Callable, Optional
 
-from .. import crud, schemas
+from .. import import_batches, schemas
 from ..database import get_db
-from ..utils.parser import parse_txt_file, validate_card_id
+from ..utils.parser import parse_card_line
 
 router = APIRouter(prefix="/import", tags=["import"])
 
@@ -14,6 +15,77 @@ class TextImportRequest(BaseModel):
     content: str = Field(..., description="卡片数据文本内容，支持多行，每行一条卡片信息。格式：卡密: mio-xxx 额度: x 有效期: x小时")
 
 
+def _run_import(
+    db: Session,
+    source: str,
+    lines: list[tuple[int, str]],
+    parse: Callable[[str], Optional[dict]]
+) -> dict:
+    """
+    幂等导入
+
+    lines 为 (行号, 行内容) 列表。只解析、导入之前的批次中没有处理过，或对应卡片已被删除的行，
+    并记录本次批次；相同内容已导入过且所有行的卡片都还在（或已归档）时直接返回上次的结果。
+    """
+    digest = import_batches.content_hash(line for _, line in lines)
+    hashes = [import_batches.line_hash(line) for _, line in lines]
+    seen = import_batches.seen_line_hashes(db, hashes)
+
+    batch = import_batches.find_batch(db, digest)
+    if batch and seen.issuperset(hashes):
+        return import_batches.stored_result(batch)
+
+    new_lines = []
+    for (line_num, line), line_hash in zip(lines, hashes):
+        if line_hash in seen:
+            continue
+        seen.add(line_hash)
+        new_lines.append((line_num, line, line_hash))
+    skipped_count = len(lines) - len(new_lines)
+
+    parsed_cards = []
+    failed_lines = []
+    line_cards = {}
+    for line_num, line, line_hash in new_lines:
+        parsed = parse(line)
+        if parsed:
+            parsed_cards.append(parsed)
+            line_cards[line_hash] = import_batches.line_card_id(parsed["card_id"])
+        else:
+            failed_lines.append(f"第{line_num}行: {line}")
+            line_cards[line_hash] = import_batches.NO_CARD
+
+    if new_lines and not parsed_cards:
+        raise HTTPException(
+            status_code=400,
+            detail=f"没有成功解析任何卡片数据。失败的行: {failed_lines}"
+        )
+
+    success_count, failed_items = import_batches.add_cards(db, parsed_cards)
+    failed_count = len(failed_items)
+
+    message = f"成功导入 {success_count} 张卡片，失败 {failed_count} 张"
+    if skipped_count:
+        message += f"，跳过 {skipped_count} 行已导入过的内容"
+    result = {
+        "success_count": success_count,
+        "failed_count": failed_count,
+        "failed_items": failed_items,
+        "skipped_count": skipped_count,
+        "message": message
+    }
+
+    batch = import_batches.save_batch(db, source, digest, len(lines), line_cards, result, batch)
+    if batch is None:
+        # 相同内容同时提交，另一个请求已完成导入
+        batch = import_batches.find_batch(db, digest)
+        if batch is None:
+            raise HTTPException(status_code=409, detail="导入冲突，请稍后重试")
+        return import_batches.stored_result(batch)
+
+    return {**result, "batch_id": batch.id, "duplicate": False}
+
+
 @router.post("/text", response_model=schemas.CardImportResponse, summary="从文本批量导入卡片")
 async def import_from_text(
     request: TextImportRequest,
@@ -30,6 +102,10 @@ async def import_from_text(
     
     - **content**: 文本内容，支持多行
     
+    导入是幂等的：内容完全相同的重复提交直接返回上次的导入结果（duplicate 为 true），
+    部分重复的内容只导入之前没有出现过的行（跳过的行数见 skipped_count）。
+    卡片被删除后，对应的行不再算作已导入：再次提交时会重新导入该卡片。
+    
     返回导入结果，包括成功数量、失败数量和失败详情。
     """
     text_content = request.content.strip()
@@ -37,54 +113,13 @@ async def import_from_text(
     if not text_content:
         raise HTTPException(status_code=400, detail="文本内容不能为空")
 
-    parsed_cards, failed_lines = parse_txt_file(text_content)
-
-    if not parsed_cards:
-        raise HTTPException(
-            status_code=400,
-            detail=f"没有成功解析任何卡片数据。失败的行: {failed_lines}"
-        )
+    lines = [
+        (line_num, line.strip())
+        for line_num, line in enumerate(text_content.split('\n'), 1)
+        if line.strip()
+    ]
 
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-
-    for card_data in parsed_cards:
-        try:
-            if not validate_card_id(card_data["card_id"]):
-                failed_count += 1
-                failed_items.append({
-                    "card_id": card_data["card_id"],
-                    "reason": "卡密格式不正确"
-                })
-                continue
-
-            existing_card = crud.get_card_by_id(db, card_data["card_id"])
-            if existing_card:
-                failed_count += 1
-                failed_items.append({
-                    "card_id": card_data["card_id"],
-                    "reason": "卡密已存在"
-                })
-                continue
-
-            card_create = schemas.CardCreate(**card_data)
-            crud.create_card(db, card_create)
-            success_count += 1
-
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({
-                "card_id": card_data.get("card_id", "未知"),
-                "reason": str(e)
-            })
-
-    return {
-        "success_count": success_count,
-        "failed_count": failed_count,
-        "failed_items": failed_items,
-        "message": f"成功导入 {success_count} 张卡片，失败 {failed_count} 张"
-    }
+    return _run_import(db, "text", lines, parse_card_line)
 
 
 @router.post("/json", response_model=schemas.CardImportResponse, summary="从 JSON 批量导入卡片")
@@ -110,49 +145,19 @@ async def import_from_json(
     
     - **cards**: 卡片数组，每个卡片包含 card_id、card_limit、validity_hours
     
+    与文本导入相同，重复提交的内容不会再次导入；卡片被删除后再次提交会重新导入该卡片。
+    
     返回导入结果，包括成功数量、失败数量和失败详情。
     """
-    success_count = 0
-    failed_count = 0
-    failed_items = []
-
-    for card_item in import_data.cards:
-        try:
-            if not validate_card_id(card_item.card_id):
-                failed_count += 1
-                failed_items.append({
-                    "card_id": card_item.card_id,
-                    "reason": "卡密格式不正确"
-                })
-                continue
-
-            existing_card = crud.get_card_by_id(db, card_item.card_id)
-            if existing_card:
-                failed_count += 1
-                failed_items.append({
-                    "card_id": card_item.card_id,
-                    "reason": "卡密已存在"
-                })
-                continue
-
-            card_create = schemas.CardCreate(
-                card_id=card_item.card_id,
-                card_limit=card_item.card_limit,
-                validity_hours=card_item.validity_hours
-            )
-            crud.create_card(db, card_create)
-            success_count += 1
-
-        except Exception as e:
-            failed_count += 1
-            failed_items.append({
-                "card_id": card_item.card_id,
-                "reason": str(e)
-            })
-
-    return {
-        "success_count": success_count,
-        "failed_count": failed_count,
-        "failed_items": failed_items,
-        "message": f"成功导入 {success_count} 张卡片，失败 {failed_count} 张"
-    }
+    items = {}
+    lines = []
+    for index, card_item in enumerate(import_data.cards, 1):
+        line = import_batches.json_line(card_item.card_id, card_item.card_limit, card_item.validity_hours)
+        items[line] = {
+            "card_id": card_item.card_id,
+            "card_limit": card_item.card_limit,
+            "validity_hours": card_item.validity_hours
+        }
+        lines.append((index, line))
+
+    return _run_import(db, "json", lines, items.get)
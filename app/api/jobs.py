@@ -0,0 +1,109 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from sqlalchemy.orm import Session
+import json
+
+from .. import crud, jobs, schemas
+from ..database import get_db
+from ..utils.parser import parse_txt_file
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def get_job_or_404(db: Session, job_id: int):
+    job = jobs.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+@router.post("/", response_model=schemas.JobResponse, status_code=201, summary="创建批量任务")
+async def create_job(
+    request: schemas.JobCreateRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    创建批量查询、激活、刷新或导入任务
+
+    任务由后台进程逐条执行，每条执行完立即保存结果；服务重启后从未完成的子任务继续，
+    失败的子任务会自动重试。创建后通过 `GET /api/jobs/{job_id}` 查看进度。
+
+    - **type**: 任务类型（query/activate/refresh/import）
+    - **card_ids**: 卡密列表（可选，未指定时按 status/search 筛选）
+    - **status** / **search**: 卡片筛选条件（可选）
+    - **content**: 导入任务的文本内容（每行一条卡片信息）
+    """
+    params = None
+    if request.type == "import":
+        text_content = (request.content or "").strip()
+        if not text_content:
+            raise HTTPException(status_code=400, detail="文本内容不能为空")
+        parsed_cards, failed_lines = parse_txt_file(text_content)
+        if not parsed_cards:
+            raise HTTPException(
+                status_code=400,
+                detail=f"没有成功解析任何卡片数据。失败的行: {failed_lines}"
+            )
+        payloads = [json.dumps(card_data, ensure_ascii=False) for card_data in parsed_cards]
+        if failed_lines:
+            params = {"failed_lines": failed_lines}
+    elif request.card_ids:
+        payloads = list(dict.fromkeys(request.card_ids))
+    else:
+        status = request.status or jobs.DEFAULT_CARD_STATUS[request.type]
+        crud.update_expired_cards(db)
+        payloads = [
+            row["card_id"]
+            for row in crud.iter_card_rows(db, status=status, search=request.search, fields=["card_id"])
+        ]
+        params = {"status": status, "search": request.search}
+
+    if not payloads:
+        raise HTTPException(status_code=400, detail="没有需要处理的卡片")
+
+    job = jobs.create_job(db, request.type, payloads, params)
+    return jobs.get_job_progress(db, job)
+
+
+@router.get("/", response_model=list[schemas.JobResponse], summary="获取批量任务列表")
+async def list_jobs(
+    skip: int = Query(0, ge=0, description="跳过的记录数"),
+    limit: int = Query(20, ge=1, le=100, description="返回的最大记录数"),
+    db: Session = Depends(get_db)
+):
+    """获取最近的批量任务及其进度（按创建时间倒序）"""
+    return [jobs.get_job_progress(db, job) for job in jobs.get_jobs(db, skip, limit)]
+
+
+@router.get("/{job_id}", response_model=schemas.JobResponse, summary="获取批量任务进度")
+async def get_job(
+    job_id: int = Path(..., description="任务ID"),
+    db: Session = Depends(get_db)
+):
+    """
+    获取批量任务进度
+
+    返回各状态子任务数量、完成比例、吞吐量（子任务数/秒）、预计剩余时间和失败的子任务。
+    """
+    return jobs.get_job_progress(db, get_job_or_404(db, job_id))
+
+
+@router.post("/{job_id}/retry", response_model=schemas.JobResponse, summary="重试失败的子任务")
+async def retry_job(
+    job_id: int = Path(..., description="任务ID"),
+    db: Session = Depends(get_db)
+):
+    """把已达到最大重试次数的失败子任务重置为待执行，任务重新进入执行队列"""
+    job = get_job_or_404(db, job_id)
+    jobs.retry_failed_items(db, job)
+    return jobs.get_job_progress(db, job)
+
+
+@router.post("/{job_id}/cancel", response_model=schemas.JobResponse, summary="取消批量任务")
+async def cancel_job(
+    job_id: int = Path(..., description="任务ID"),
+    db: Session = Depends(get_db)
+):
+    """取消任务：正在执行的子任务完成后停止，尚未执行的子任务不再执行"""
+    job = get_job_or_404(db, job_id)
+    jobs.cancel_job(db, job)
+    return jobs.get_job_progress(db, job)
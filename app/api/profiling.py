@@ -0,0 +1,91 @@
+import os
+
+from fastapi import APIRouter, HTTPException, Path, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+
+from .. import profiling
+
+router = APIRouter(prefix="/profiling", tags=["profiling"])
+
+PROFILE_ID = Path(..., description="分析结果 ID（响应头 X-Profile-Id）")
+
+
+@router.get("/profiles", summary="CPU 分析结果列表")
+async def list_profiles():
+    """
+    列出已保存的请求分析结果（按时间倒序）
+
+    已登录的请求带 `X-Profile: 1` 头或 `?profile=1` 参数时会被记录，响应头 X-Profile-Id 为结果 ID。
+    """
+    return {"success": True, "data": profiling.list_profiles()}
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse, summary="CPU 分析报告")
+async def get_profile_report(
+    profile_id: str = PROFILE_ID,
+    sort: str = Query("cumulative", description="排序方式：" + ", ".join(profiling.SORT_KEYS)),
+    limit: int = Query(50, ge=1, le=1000, description="最多显示的函数数量")
+):
+    """以 pstats 文本格式返回分析报告"""
+    if sort not in profiling.SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"不支持的排序方式: {sort}")
+    report = profiling.profile_report(profile_id, sort, limit)
+    if report is None:
+        raise HTTPException(status_code=404, detail="分析结果不存在")
+    return report
+
+
+@router.get("/profiles/{profile_id}/download", summary="下载 CPU 分析结果")
+async def download_profile(profile_id: str = PROFILE_ID):
+    """下载原始 .prof 文件（可用 snakeviz 等工具查看）"""
+    path = profiling.profile_path(profile_id)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="分析结果不存在")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+
+@router.get("/memory", summary="内存追踪状态")
+async def get_memory_status():
+    """当前 worker 进程的 tracemalloc 状态、已分配内存和快照列表"""
+    return {"success": True, "data": profiling.memory_status()}
+
+
+@router.post("/memory/start", summary="启动内存追踪")
+async def start_memory_tracing(
+    frames: int = Query(10, ge=1, le=100, description="每次分配记录的调用栈深度")
+):
+    """启动 tracemalloc（启动后内存分配会变慢，分析完成后请停止）"""
+    return {"success": True, "data": profiling.start_memory_tracing(frames)}
+
+
+@router.post("/memory/stop", summary="停止内存追踪")
+async def stop_memory_tracing():
+    """停止 tracemalloc 并清除当前进程的所有快照"""
+    return {"success": True, "data": profiling.stop_memory_tracing()}
+
+
+@router.post("/memory/snapshots", summary="拍摄内存快照")
+async def take_memory_snapshot(
+    limit: int = Query(20, ge=1, le=200, description="返回占用最多的代码位置数量")
+):
+    """
+    拍摄当前进程的内存快照
+
+    在列表、导出、导入等操作前后各拍一次，再用 `/memory/diff` 对比。
+    """
+    if not profiling.memory_status()["tracing"]:
+        raise HTTPException(status_code=400, detail="内存追踪未启动，请先调用 /api/profiling/memory/start")
+    return {"success": True, "data": profiling.take_snapshot(limit)}
+
+
+@router.get("/memory/diff", summary="对比内存快照")
+async def diff_memory_snapshots(
+    base: str = Query(..., alias="from", description="起始快照 ID"),
+    target: str = Query(..., alias="to", description="结束快照 ID"),
+    limit: int = Query(20, ge=1, le=200, description="返回增长最多的代码位置数量")
+):
+    """按代码行对比两个快照，返回内存增长最多的位置（两个快照必须在同一个 worker 进程中）"""
+    result = profiling.compare_snapshots(base, target, limit)
+    if result is None:
+        raise HTTPException(status_code=404, detail="快照不存在（可能在其他 worker 进程中或已被清除）")
+    return {"success": True, "data": result}
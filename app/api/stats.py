@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
+
+from .. import schemas, stats
+from ..config import APP_TIMEZONE
+from ..database import get_read_db
+from ..expiry import now_epoch
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+# 未指定起点时默认统计的时间范围（秒）
+DEFAULT_RANGE = {"hour": 24 * 3600, "day": 30 * 86400}
+
+
+def to_epoch(value: datetime) -> int:
+    """查询参数中的时间转换为 UTC 时间戳（不带时区时按配置时区处理）"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=APP_TIMEZONE)
+    return int(value.timestamp())
+
+
+@router.get("/activations", response_model=schemas.ActivationStatsResponse, summary="激活统计")
+async def get_activation_stats(
+    bucket: str = Query("hour", pattern="^(hour|day)$", description="时间桶粒度（hour/day）"),
+    start: Optional[datetime] = Query(None, alias="from", description="统计起点（ISO 时间或时间戳，默认 hour 为 24 小时前，day 为 30 天前）"),
+    end: Optional[datetime] = Query(None, alias="to", description="统计终点（不含，默认当前时间）"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    按小时或天统计激活成功/失败次数、成功率和失败原因
+
+    数据来自激活记录写入时同步更新的汇总表，查询耗时只与时间范围有关，与激活记录总量无关。
+    启用只读副本（READ_REPLICA_INTERVAL）时从副本读取，数据最多延迟一个刷新间隔。
+
+    - **bucket**: 时间桶粒度，hour 或 day（按配置时区的自然日）
+    - **from** / **to**: 统计时间范围，不带时区的时间按配置时区处理
+    """
+    end_ts = to_epoch(end) if end else now_epoch()
+    start_ts = to_epoch(start) if start else end_ts - DEFAULT_RANGE[bucket]
+
+    if start_ts >= end_ts:
+        raise HTTPException(status_code=400, detail="from 必须早于 to")
+    if (end_ts - start_ts) // stats.BUCKET_SECONDS[bucket] > stats.MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"时间范围过大，最多 {stats.MAX_BUCKETS} 个时间桶")
+
+    return stats.get_activation_stats(db, bucket, start_ts, end_ts)
@@ -0,0 +1,230 @@
+"""
+后台任务调度（多 worker 部署）
+
+多个 worker 进程通过 leases 表选举出一个 leader，只有 leader 运行单例后台任务。
+leader 定期续约；进程退出或卡死导致租约过期后，其他进程会在下一次续约检查时接管。
+"""
+import asyncio
+import os
+import socket
+import time
+import traceback
+import uuid
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import insert, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from . import backup, crud, jobs, models
+from .config import (
+    ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_INTERVAL, BACKGROUND_JOBS_ENABLED, BACKUP_INTERVAL,
+    EXPIRY_SWEEP_INTERVAL, JOB_POLL_INTERVAL, LEADER_LEASE_TTL, POLLER_CALLS_PER_MINUTE, POLLER_INTERVAL,
+    READ_REPLICA_INTERVAL
+)
+from .database import IS_SQLITE, REPLICA_PATH, SessionLocal, engine
+from .poller import poller
+
+
+class LeaderElection:
+    """基于数据库行租约的 leader 选举"""
+
+    def __init__(self, name: str = "background-jobs", ttl: float = LEADER_LEASE_TTL):
+        self.name = name
+        self.ttl = ttl
+        self.holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def try_acquire(self) -> bool:
+        """获取或续约租约，返回当前进程是否为 leader"""
+        now = time.time()
+        with engine.begin() as conn:
+            result = conn.execute(
+                update(models.Lease)
+                .where(
+                    models.Lease.name == self.name,
+                    or_(models.Lease.holder == self.holder_id, models.Lease.expires_at < now)
+                )
+                .values(holder=self.holder_id, expires_at=now + self.ttl)
+            )
+            if result.rowcount:
+                return True
+
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    insert(models.Lease).values(
+                        name=self.name, holder=self.holder_id, expires_at=now + self.ttl
+                    )
+                )
+            return True
+        except IntegrityError:
+            # 租约已被其他进程持有
+            return False
+
+    def release(self) -> None:
+        """主动释放租约（正常关闭时调用，其他进程可以立即接管）"""
+        with engine.begin() as conn:
+            conn.execute(
+                update(models.Lease)
+                .where(models.Lease.name == self.name, models.Lease.holder == self.holder_id)
+                .values(expires_at=0)
+            )
+
+
+class SingletonJob:
+    """周期执行的单例任务"""
+
+    def __init__(self, name: str, func: Callable[[], Awaitable], interval: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                await self.func()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                print(f"❌ 后台任务 {self.name} 执行失败:\n{traceback.format_exc()}")
+            await asyncio.sleep(self.interval)
+
+
+class Scheduler:
+    """
+    单例任务调度器
+
+    每个 worker 都运行调度循环，但只有持有租约的进程会启动已注册的任务；
+    失去租约时立即停止任务。
+    """
+
+    def __init__(self, election: LeaderElection):
+        self.election = election
+        self.jobs: list[SingletonJob] = []
+        self.is_leader = False
+        self._tasks: list[asyncio.Task] = []
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, interval: float):
+        """注册单例任务的装饰器"""
+        def decorator(func: Callable[[], Awaitable]):
+            self.jobs.append(SingletonJob(name, func, interval))
+            return func
+        return decorator
+
+    def start(self) -> None:
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._election_loop())
+
+    async def stop(self) -> None:
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+        await self._stop_jobs()
+        if self.is_leader:
+            self.is_leader = False
+            await asyncio.to_thread(self.election.release)
+
+    async def _election_loop(self) -> None:
+        # 续约间隔为租约有效期的 1/3，保证网络或数据库短暂抖动时不会丢失租约
+        renew_interval = max(self.election.ttl / 3, 1)
+        while True:
+            try:
+                leader = await asyncio.to_thread(self.election.try_acquire)
+            except Exception:
+                print(f"⚠️  leader 租约续约失败:\n{traceback.format_exc()}")
+                leader = False
+
+            if leader and not self.is_leader:
+                self.is_leader = True
+                self._tasks = [asyncio.create_task(job.run_forever()) for job in self.jobs]
+                print(f"✅ 当前进程成为后台任务 leader（{self.election.holder_id}）")
+            elif not leader and self.is_leader:
+                self.is_leader = False
+                await self._stop_jobs()
+                print(f"⚠️  当前进程失去后台任务 leader 租约（{self.election.holder_id}）")
+
+            await asyncio.sleep(renew_interval)
+
+    async def _stop_jobs(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+scheduler = Scheduler(LeaderElection())
+
+
+def run_with_session(func: Callable, *args):
+    """在独立的数据库会话中执行同步函数（在线程中调用）"""
+    db = SessionLocal()
+    try:
+        return func(db, *args)
+    finally:
+        db.close()
+
+
+@scheduler.register("expiry-sweep", interval=EXPIRY_SWEEP_INTERVAL)
+async def sweep_expired_cards():
+    """定期把已到期的卡片标记为 expired"""
+    await asyncio.to_thread(run_with_session, crud.update_expired_cards)
+
+
+@scheduler.register("batch-jobs", interval=JOB_POLL_INTERVAL)
+async def run_batch_jobs():
+    """执行批量任务队列中未完成的任务"""
+    await jobs.run_pending_jobs()
+
+
+@scheduler.register("inactive-poller", interval=POLLER_INTERVAL)
+async def poll_inactive_cards():
+    """按调用预算轮询未激活的卡片，同步在别处完成的激活"""
+    if POLLER_CALLS_PER_MINUTE > 0:
+        await poller.run_once()
+
+
+async def backup_database():
+    """定期在线备份数据库（距最近一次备份不足 BACKUP_INTERVAL 时跳过）"""
+    if not await asyncio.to_thread(backup.backup_due, BACKUP_INTERVAL):
+        return
+    result = await asyncio.to_thread(backup.create_backup)
+    print(f"✅ 数据库已备份: {result['path']}（{result['size_bytes'] / 1048576:.1f} MB，{result['duration_ms']:.0f}ms）")
+
+
+async def refresh_read_replica():
+    """定期刷新只读副本"""
+    await asyncio.to_thread(backup.refresh_replica)
+
+
+async def archive_old_cards():
+    """把过期或申请退款超过 ARCHIVE_AFTER_DAYS 天的卡片分批移到归档表（每批一个事务，批与批之间释放写锁）"""
+    archived = 0
+    while True:
+        moved = await asyncio.to_thread(
+            run_with_session, crud.archive_cards_batch, ARCHIVE_AFTER_DAYS * 86400, ARCHIVE_BATCH_SIZE
+        )
+        if not moved:
+            break
+        archived += moved
+    if archived:
+        print(f"✅ 已归档 {archived} 张过期或退款的卡片")
+
+
+if ARCHIVE_AFTER_DAYS > 0:
+    scheduler.register("card-archive", interval=ARCHIVE_INTERVAL)(archive_old_cards)
+# 在线备份和只读副本只支持 SQLite，间隔为 0 时不启用
+if IS_SQLITE and BACKUP_INTERVAL > 0:
+    # 每分钟检查一次是否到了备份时间
+    scheduler.register("database-backup", interval=min(BACKUP_INTERVAL, 60))(backup_database)
+if REPLICA_PATH is not None:
+    scheduler.register("read-replica", interval=READ_REPLICA_INTERVAL)(refresh_read_replica)
+
+
+def start_background_jobs() -> None:
+    if BACKGROUND_JOBS_ENABLED:
+        scheduler.start()
+
+
+async def stop_background_jobs() -> None:
+    await scheduler.stop()
@@ -0,0 +1,122 @@
+"""
+SQLite 在线备份和本地只读副本
+
+使用 SQLite backup API 在应用运行时复制数据库，不需要停止服务：
+- 源连接先开启读事务，整个备份读取同一个快照（WAL 模式下写入不受影响，也不会导致备份重新开始）
+- 每步复制 BACKUP_PAGES_PER_STEP 页，步与步之间让出 BACKUP_STEP_SLEEP 秒，在线程中执行，不阻塞事件循环
+- 先写入临时文件，完成后整体替换目标文件；备份文件转换为 DELETE 日志模式，单个文件即可恢复
+
+定时备份保存在备份目录中，文件名带时间，超过 BACKUP_KEEP 个时删除最旧的。
+只读副本（READ_REPLICA_INTERVAL > 0）定期用同样的方式刷新，导出和统计查询读副本，不占用主库。
+"""
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Optional
+
+from .config import BACKUP_DIR, BACKUP_KEEP, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP
+from .database import IS_SQLITE, REPLICA_PATH, engine, get_data_dir
+
+BACKUP_PREFIX = "cards-"
+BACKUP_SUFFIX = ".db"
+
+
+def backup_dir() -> str:
+    return BACKUP_DIR or os.path.join(get_data_dir(), "backups")
+
+
+def copy_database(dest_path: str, pages: int = BACKUP_PAGES_PER_STEP, sleep: float = BACKUP_STEP_SLEEP) -> dict:
+    """
+    在线复制当前 SQLite 数据库到 dest_path（同步执行，应在线程中调用）
+
+    返回 {"path", "size_bytes", "pages", "duration_ms"}
+    """
+    if not IS_SQLITE:
+        raise RuntimeError("在线备份只支持 SQLite（PostgreSQL 请使用 pg_dump 或流复制）")
+
+    os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+    tmp_path = f"{dest_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    started = time.perf_counter()
+    copied = {"pages": 0}
+
+    def progress(status, remaining, total):
+        copied["pages"] = total
+        # sqlite3 的 backup 只在数据库忙时才使用 sleep 参数，步与步之间的让出在这里完成
+        if remaining and sleep > 0:
+            time.sleep(sleep)
+
+    raw = engine.raw_connection()
+    try:
+        source = raw.driver_connection
+        target = sqlite3.connect(tmp_path)
+        try:
+            # 读事务固定快照：备份期间其他连接的写入对本次备份不可见
+            source.execute("BEGIN")
+            source.execute("SELECT 1 FROM sqlite_master LIMIT 1")
+            source.backup(target, pages=pages, progress=progress)
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+            source.rollback()
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        raw.close()
+
+    os.replace(tmp_path, dest_path)
+    return {
+        "path": dest_path,
+        "size_bytes": os.path.getsize(dest_path),
+        "pages": copied["pages"],
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def list_backups() -> list[dict]:
+    """备份目录中的备份文件（按时间倒序）"""
+    directory = backup_dir()
+    if not os.path.isdir(directory):
+        return []
+    backups = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not (name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX)):
+            continue
+        path = os.path.join(directory, name)
+        backups.append({"name": name, "path": path, "size_bytes": os.path.getsize(path), "mtime": os.path.getmtime(path)})
+    return backups
+
+
+def _rotate(keep: int) -> list[str]:
+    """删除超出保留数量的旧备份，返回删除的文件名"""
+    removed = []
+    for backup in list_backups()[max(keep, 1):]:
+        os.remove(backup["path"])
+        removed.append(backup["name"])
+    return removed
+
+
+def create_backup(keep: int = BACKUP_KEEP) -> dict:
+    """创建一个带时间戳的备份并删除超出保留数量的旧备份"""
+    name = f"{BACKUP_PREFIX}{datetime.now():%Y%m%d-%H%M%S}{BACKUP_SUFFIX}"
+    result = copy_database(os.path.join(backup_dir(), name))
+    result["removed"] = _rotate(keep)
+    return result
+
+
+def backup_due(interval: float) -> bool:
+    """距最近一次备份已超过 interval 秒（应用重启或 leader 切换后不会立即重复备份）"""
+    backups = list_backups()
+    return not backups or time.time() - backups[0]["mtime"] >= interval
+
+
+def refresh_replica() -> Optional[dict]:
+    """刷新只读副本（未启用时返回 None）"""
+    if REPLICA_PATH is None:
+        return None
+    return copy_database(REPLICA_PATH)
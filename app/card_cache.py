@@ -0,0 +1,147 @@
+"""
+卡片读缓存
+
+crud.get_card_by_id 前的进程内 LRU 缓存（按卡密），命中时不访问数据库。
+- 缓存的是不可变的 CardRecord（__slots__），不是 ORM 对象，不会被会话过期或修改
+- 精确失效：ORM 写入（before_flush 记录变更的卡密）和 crud 的 UPDATE 语句在事务提交后删除对应缓存
+- 多 worker：其他进程的写入通过全局数据版本发现，每 CARD_CACHE_SYNC_INTERVAL 秒最多检查一次，
+  版本变化时清空缓存（跨进程最多读到该时长内的旧数据）
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Mapping, Optional
+
+from sqlalchemy import event
+
+from . import models, versioning
+from .config import CARD_CACHE_SIZE, CARD_CACHE_SYNC_INTERVAL
+from .database import SessionLocal
+
+COLUMNS = tuple(column.key for column in models.Card.__table__.columns)
+
+
+class CardRecord:
+    """卡片的只读快照（字段与 cards 表的列相同）"""
+
+    __slots__ = COLUMNS
+
+    def __init__(self, values: Mapping):
+        for name in COLUMNS:
+            object.__setattr__(self, name, values.get(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CardRecord 是只读的")
+
+    def to_dict(self, fields: Iterable[str] = COLUMNS) -> dict:
+        return {name: getattr(self, name) for name in fields}
+
+
+class CardCache:
+    """按卡密的 LRU 缓存（线程安全，同步路由在线程池中执行）"""
+
+    def __init__(self, maxsize: int = CARD_CACHE_SIZE, sync_interval: float = CARD_CACHE_SYNC_INTERVAL):
+        self.maxsize = maxsize
+        self.sync_interval = sync_interval
+        self.hits = 0
+        self.misses = 0
+        # 每次失效递增：查询数据库期间发生过失效时，查询结果可能是旧数据，不写入缓存
+        self.generation = 0
+        self.version: Optional[int] = None
+        self._synced_at = 0.0
+        self._items: OrderedDict[str, CardRecord] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sync(self, db) -> None:
+        """距上次检查超过 sync_interval 时读取数据版本，其他进程写入后清空缓存"""
+        now = time.monotonic()
+        if now - self._synced_at < self.sync_interval:
+            return
+        version = versioning.get_data_version(db)
+        with self._lock:
+            if version != self.version:
+                self.generation += 1
+                self._items.clear()
+                self.version = version
+            self._synced_at = now
+
+    def get(self, db, card_id: str) -> Optional[CardRecord]:
+        if not self.maxsize:
+            return None
+        self._sync(db)
+        with self._lock:
+            record = self._items.get(card_id)
+            if record is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(card_id)
+            self.hits += 1
+            return record
+
+    def put(self, values: Mapping, generation: Optional[int] = None) -> CardRecord:
+        """缓存一行卡片数据；generation 为查询前读取的 self.generation"""
+        record = CardRecord(values)
+        if self.maxsize:
+            with self._lock:
+                if generation is not None and generation != self.generation:
+                    return record
+                self._items[record.card_id] = record
+                self._items.move_to_end(record.card_id)
+                while len(self._items) > self.maxsize:
+                    self._items.popitem(last=False)
+        return record
+
+    def invalidate(self, card_ids) -> None:
+        with self._lock:
+            self.generation += 1
+            for card_id in card_ids:
+                self._items.pop(card_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._items.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+        }
+
+
+card_cache = CardCache()
+
+
+# ============================================
+# 失效
+# ============================================
+
+_DIRTY_KEY = "card_cache_dirty"
+
+
+def mark_dirty(session, card_id: str) -> None:
+    """记录本事务修改的卡密（提交后删除缓存），用于不经过 ORM flush 的 UPDATE 语句"""
+    session.info.setdefault(_DIRTY_KEY, set()).add(card_id)
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _track_card_writes(session, flush_context, instances):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, models.Card) and obj.card_id:
+            mark_dirty(session, obj.card_id)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_committed(session):
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if dirty:
+        card_cache.invalidate(dirty)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_dirty(session):
+    session.info.pop(_DIRTY_KEY, None)
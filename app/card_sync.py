@@ -0,0 +1,109 @@
+"""
+卡片同步
+把 MisaCard API 返回的卡片数据写入本地数据库，单卡接口和批量任务共用同一套逻辑。
+"""
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import crud, expiry, schemas
+from .utils.activation import auto_activate_if_needed, extract_card_info, query_card_from_api
+
+CARD_NOT_FOUND = "卡片不存在于本地数据库"
+
+
+def apply_query_result(db: Session, db_card, card_data: dict) -> Optional[dict]:
+    """
+    用查询接口返回的数据更新本地卡片（已激活时写入完整卡片信息）
+
+    返回更新后的卡片行（卡片已不存在时返回 None）
+    """
+    card_info = extract_card_info(card_data)
+    exp_ts = expiry.parse_api_datetime(card_info.get("exp_date"))
+
+    if card_info.get("card_number"):
+        return crud.activate_card_in_db(
+            db,
+            db_card.card_id,
+            str(card_info["card_number"]),
+            str(card_info["card_cvc"]),
+            card_info["card_exp_date"],
+            card_info.get("billing_address"),
+            validity_hours=card_info.get("validity_hours"),
+            exp_ts=exp_ts
+        )
+
+    values = {
+        "validity_hours": card_info.get("validity_hours"),
+        **expiry.expiry_values(exp_ts),
+        **schemas.CardUpdate(
+            card_limit=card_info.get("card_limit"),
+            status=card_info.get("status")
+        ).model_dump(exclude_unset=True),
+    }
+    return crud.update_card_fields(db, db_card.card_id, values)
+
+
+def query_result_changed(db_card, card_data: dict) -> bool:
+    """查询接口返回的数据与本地卡片是否有差异（没有差异时不需要写入）"""
+    card_info = extract_card_info(card_data)
+    if card_info.get("card_number"):
+        return str(card_info["card_number"]) != db_card.card_number
+    return (
+        card_info.get("validity_hours") != db_card.validity_hours
+        or expiry.parse_api_datetime(card_info.get("exp_date")) != db_card.exp_ts
+        or card_info.get("card_limit") != db_card.card_limit
+        or card_info.get("status") != db_card.status
+    )
+
+
+def apply_activation_result(db: Session, card_id: str, card_data: dict) -> Optional[dict]:
+    """
+    用激活接口返回的数据更新本地卡片并记录激活日志
+
+    返回更新后的卡片行（没有卡号时不修改本地数据，返回 None）
+    """
+    card_info = extract_card_info(card_data)
+    if not card_info.get("card_number"):
+        return None
+
+    row = crud.activate_card_in_db(
+        db,
+        card_id,
+        card_info["card_number"],
+        card_info["card_cvc"],
+        card_info["card_exp_date"],
+        card_info.get("billing_address"),
+        validity_hours=card_info.get("validity_hours"),
+        exp_ts=expiry.parse_api_datetime(card_info.get("exp_date"))
+    )
+    crud.create_activation_log(db, card_id, "success")
+    return row
+
+
+async def query_and_update(db: Session, card_id: str) -> Tuple[bool, str]:
+    """查询卡片并更新本地数据库，返回 (是否成功, 消息)"""
+    db_card = crud.get_card_by_id(db, card_id)
+    if not db_card:
+        return False, CARD_NOT_FOUND
+
+    success, card_data, error = await query_card_from_api(card_id)
+    if not success:
+        return False, error or "查询失败"
+
+    apply_query_result(db, db_card, card_data)
+    return True, "查询成功"
+
+
+async def activate_and_update(db: Session, card_id: str) -> Tuple[bool, str]:
+    """激活卡片（已激活时只查询）并更新本地数据库，返回 (是否成功, 消息)"""
+    if not crud.get_card_by_id(db, card_id):
+        return False, CARD_NOT_FOUND
+
+    success, card_data, message = await auto_activate_if_needed(card_id)
+    if not success:
+        crud.create_activation_log(db, card_id, "failed", error_message=message)
+        return False, message
+
+    apply_activation_result(db, card_id, card_data)
+    return True, message
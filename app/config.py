@@ -59,7 +59,12 @@ def parse_timezone(tz_str: str) -> timezone:
 
 # 解析时区
 APP_TIMEZONE = parse_timezone(TZ_CONFIG)
-print(f"✅ 时区设置: {TZ_CONFIG} (UTC{'+' if APP_TIMEZONE.utcoffset(None).total_seconds() >= 0 else ''}{int(APP_TIMEZONE.utcoffset(None).total_seconds() // 3600)}:{abs(int(APP_TIMEZONE.utcoffset(None).total_seconds() % 3600 // 60)):02d})")
+
+
+def describe_timezone() -> str:
+    """时区描述，如 "Asia/Shanghai (UTC+8:00)"（启动完成时输出）"""
+    offset = APP_TIMEZONE.utcoffset(None).total_seconds()
+    return f"{TZ_CONFIG} (UTC{'+' if offset >= 0 else ''}{int(offset // 3600)}:{abs(int(offset % 3600 // 60)):02d})"
 
 
 def get_current_time():
@@ -106,8 +111,6 @@ if MISACARD_API_CONFIGS_RAW:
                 "base_url": config["base_url"].rstrip("/"),  # 移除尾部斜杠
                 "token": config["token"]
             })
-        
-        print(f"✅ 已加载 {len(MISACARD_API_CONFIGS)} 个 API 配置")
     except json.JSONDecodeError as e:
         raise ValueError(f"MISACARD_API_CONFIGS 格式错误：{e}")
     except Exception as e:
@@ -148,6 +151,28 @@ MISACARD_API_HEADERS = {
 }
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cards.db")
+
+# PostgreSQL 连接池：常驻连接数、高峰时额外允许的连接数、等待空闲连接的超时（秒）、
+# 连接最长复用时间（秒，超过后重新建立，避免被服务端或代理断开）。SQLite 不使用这些配置
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+
+# SQLite 在线备份（由后台任务 leader 执行）：备份间隔（秒，0 表示不自动备份）、保留的备份数量、
+# 备份目录（默认为数据目录下的 backups/）、每步复制的页数、每步之间让出的时间（秒）
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", 0))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", 7))
+BACKUP_DIR = os.getenv("BACKUP_DIR", "")
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", 256))
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", 0.005))
+# SQLite 本地只读副本的刷新间隔（秒，0 表示不启用）：启用后导出和统计查询读副本，数据最多延迟该时长
+READ_REPLICA_INTERVAL = int(os.getenv("READ_REPLICA_INTERVAL", 0))
+# 卡片归档（由后台任务 leader 执行）：过期或申请退款超过多少天的卡片移到归档表（0 表示不归档）、
+# 每批移动的卡片数量（每批一个事务）、归档任务的执行间隔（秒）
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 0))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 500))
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", 3600))
 DEBUG = os.getenv("DEBUG", "true").lower() == "true"
 
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
@@ -164,6 +189,70 @@ if not SECRET_KEY:
 
 SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", 86400))
 
+# 响应压缩阈值（字节），小于该大小的响应不压缩
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", 1024))
+
+# 后台任务（多 worker 部署时只在选举出的 leader 进程中运行）
+BACKGROUND_JOBS_ENABLED = os.getenv("BACKGROUND_JOBS_ENABLED", "true").lower() == "true"
+# leader 租约有效期（秒），leader 进程退出后最多经过该时间由其他进程接管
+LEADER_LEASE_TTL = int(os.getenv("LEADER_LEASE_TTL", 30))
+# 过期卡片状态巡检间隔（秒）
+EXPIRY_SWEEP_INTERVAL = int(os.getenv("EXPIRY_SWEEP_INTERVAL", 60))
+
+# 批量任务：同时处理的子任务数、单个子任务最多尝试次数、空闲时检查新任务的间隔（秒）
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", 3))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2))
+
+# 未激活卡片自动轮询：每分钟最多调用上游 API 的次数（0 表示不轮询）、检查间隔（秒）、
+# 查询结果没有变化的卡片下次轮询的最短 / 最长间隔（秒，按连续无变化次数翻倍）
+POLLER_CALLS_PER_MINUTE = int(os.getenv("POLLER_CALLS_PER_MINUTE", 30))
+POLLER_INTERVAL = float(os.getenv("POLLER_INTERVAL", 5))
+POLLER_MIN_INTERVAL = float(os.getenv("POLLER_MIN_INTERVAL", 30))
+POLLER_MAX_INTERVAL = float(os.getenv("POLLER_MAX_INTERVAL", 1800))
+
+# 消费汇总：查询余额的并发数、余额缓存有效期（秒）、查询失败时可以返回的旧数据最长时间（秒）
+SPEND_CONCURRENCY = int(os.getenv("SPEND_CONCURRENCY", 5))
+SPEND_CACHE_TTL = int(os.getenv("SPEND_CACHE_TTL", 300))
+SPEND_CACHE_MAX_STALE = int(os.getenv("SPEND_CACHE_MAX_STALE", 3600))
+
+# 卡片详情聚合接口（/api/cards/{card_id}/full）：激活记录、消费记录各部分的超时时间（秒），
+# 超时的部分单独标记，不影响其他部分返回
+CARD_DETAIL_DB_TIMEOUT = float(os.getenv("CARD_DETAIL_DB_TIMEOUT", 2))
+CARD_DETAIL_UPSTREAM_TIMEOUT = float(os.getenv("CARD_DETAIL_UPSTREAM_TIMEOUT", 5))
+
+# 单卡读缓存（crud.get_card_by_id）：最多缓存的卡片数（0 表示不缓存）、
+# 检查其他 worker 写入（全局数据版本）的间隔（秒）
+CARD_CACHE_SIZE = int(os.getenv("CARD_CACHE_SIZE", 4096))
+CARD_CACHE_SYNC_INTERVAL = float(os.getenv("CARD_CACHE_SYNC_INTERVAL", 1))
+
+# 请求追踪：导出方式（留空不启用，jsonl=写入本地文件，otlp=发送到 OTLP/HTTP collector）、
+# 采样比例（0~1，按 trace 采样）、JSONL 文件路径、OTLP 接收地址、服务名
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "").lower()
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", 0.1))
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "misacard-manager")
+
+# 按需性能分析（仅登录后可用）：是否启用、最多保留的 CPU 分析结果数量
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 50))
+
+# 准入控制：需要等待上游 API 的接口同时处理的请求数和排队数量（每个 worker 进程），
+# 公共同步接口单独限制；排队超过 ADMISSION_WAIT_TIMEOUT 秒直接返回 503/429
+ADMISSION_UPSTREAM_CONCURRENCY = int(os.getenv("ADMISSION_UPSTREAM_CONCURRENCY", 8))
+ADMISSION_UPSTREAM_QUEUE = int(os.getenv("ADMISSION_UPSTREAM_QUEUE", 16))
+ADMISSION_SYNC_CONCURRENCY = int(os.getenv("ADMISSION_SYNC_CONCURRENCY", 4))
+ADMISSION_SYNC_QUEUE = int(os.getenv("ADMISSION_SYNC_QUEUE", 32))
+ADMISSION_WAIT_TIMEOUT = float(os.getenv("ADMISSION_WAIT_TIMEOUT", 10))
+
+# 公共同步接口限流（每个 worker 进程，滑动窗口）：每个客户端 IP、每张卡片在 SYNC_RATE_WINDOW 秒内
+# 最多的请求次数（0 表示不限制）；防重放：最多记住的已处理签名数量
+SYNC_RATE_LIMIT_PER_IP = int(os.getenv("SYNC_RATE_LIMIT_PER_IP", 60))
+SYNC_RATE_LIMIT_PER_CARD = int(os.getenv("SYNC_RATE_LIMIT_PER_CARD", 10))
+SYNC_RATE_WINDOW = float(os.getenv("SYNC_RATE_WINDOW", 60))
+SYNC_REPLAY_CACHE_SIZE = int(os.getenv("SYNC_REPLAY_CACHE_SIZE", 100000))
+
 # 同步API签名密钥（用于防止伪造请求）
 # 如果未设置，使用 SECRET_KEY 的哈希作为默认值
 SYNC_API_SECRET = os.getenv("SYNC_API_SECRET")
@@ -2,34 +2,53 @@
 数据库 CRUD 操作
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import and_, case, delete, func, insert, not_, null, or_, select, text, update
 from datetime import datetime, timedelta
-from typing import Optional
-from . import models, schemas
+from typing import Iterator, Optional
+from . import expiry, models, schemas, tracing, versioning
+from .card_cache import CardRecord, card_cache, mark_dirty
+from .database import insert_ignore
 
+# 未删除且未标记过期（与过期时间部分索引的条件相同）
+LIVE_CARD = text(models.LIVE_CARD_CONDITION)
 
-def get_card_by_id(db: Session, card_id: str) -> Optional[models.Card]:
-    """根据卡密获取卡片"""
-    card = db.query(models.Card).filter(models.Card.card_id == card_id).first()
+# 等待激活（与轮询候选卡片部分索引的条件相同）
+WAITING_CARD = text(models.WAITING_CARD_CONDITION)
 
-    # 检查并更新单张卡片的过期状态
-    if card and card.exp_date and card.status not in ['deleted', 'expired']:
-        from .config import get_current_time
-        now = get_current_time()
-        exp_date = card.exp_date
-        
-        # 移除时区信息进行比较
-        now_naive = now.replace(tzinfo=None) if now.tzinfo else now
-        exp_naive = exp_date.replace(tzinfo=None) if exp_date.tzinfo else exp_date
 
-        if now_naive > exp_naive:
-            card.status = 'expired'
-            db.commit()
-            db.refresh(card)
+def _card_record(db: Session, card_id: str) -> Optional[CardRecord]:
+    """按卡密读取卡片快照：优先读缓存，未命中时查询一行（不创建 ORM 对象）并写入缓存"""
+    record = card_cache.get(db, card_id)
+    if record is not None:
+        return record
+
+    generation = card_cache.generation
+    row = db.execute(
+        select(*models.Card.__table__.columns).where(models.Card.card_id == card_id)
+    ).mappings().first()
+    if row is None:
+        return None
+    return card_cache.put(row, generation)
+
+
+@tracing.traced()
+def get_card_by_id(db: Session, card_id: str) -> Optional[CardRecord]:
+    """
+    根据卡密获取卡片（只读快照，经过进程内缓存）
+
+    需要修改 ORM 对象时使用 get_cards_by_ids。
+    """
+    record = _card_record(db, card_id)
+
+    # 检查并更新单张卡片的过期状态
+    if record and expiry.is_expired(record.exp_ts, record.status):
+        row = _update_card_row(db, card_id, {"status": "expired"})
+        record = card_cache.put(row) if row else None
 
-    return card
+    return record
 
 
+@tracing.traced()
 def get_cards(
     db: Session,
     skip: int = 0,
@@ -41,58 +60,257 @@ def get_cards(
     # 先更新所有过期的卡片状态
     update_expired_cards(db)
 
-    query = db.query(models.Card)
+    query = _filter_cards(db.query(models.Card), status, search)
+    return query.order_by(models.Card.id).offset(skip).limit(limit).all()
+
 
+def _filter_cards(query, status: Optional[str] = None, search: Optional[str] = None, model=models.Card):
+    """为 ORM 查询或 select 语句添加状态筛选和搜索条件（model 为 Card 或 ArchivedCard）"""
     # 状态筛选
     if status:
-        query = query.filter(models.Card.status == status)
+        query = query.filter(model.status == status)
 
-    # 搜索功能（卡密、昵称、卡号）
+    # 搜索功能（卡密、昵称、卡号；不区分大小写，PostgreSQL 的 LIKE 区分大小写，与 SQLite 保持一致）
     if search:
         query = query.filter(
             or_(
-                models.Card.card_id.contains(search),
-                models.Card.card_nickname.contains(search),
-                models.Card.card_number.contains(search)
+                model.card_id.icontains(search),
+                model.card_nickname.icontains(search),
+                model.card_number.icontains(search)
             )
         )
 
-    return query.offset(skip).limit(limit).all()
+    return query
+
+
+# 卡片响应包含的字段（与 schemas.CardResponse 保持一致，同时作为 fields 参数的白名单）
+CARD_FIELDS = tuple(schemas.CardResponse.model_fields)
+
+# 归档卡片响应包含的字段（与 schemas.ArchivedCardResponse 保持一致）
+ARCHIVED_CARD_FIELDS = tuple(schemas.ArchivedCardResponse.model_fields)
+
+
+def _card_columns(fields: Optional[list[str]] = None, model=models.Card) -> list:
+    """字段名列表转换为查询列（未指定时返回全部响应字段）"""
+    return [getattr(model, name) for name in (fields or CARD_FIELDS)]
+
+
+@tracing.traced()
+def get_card_rows(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    status: Optional[str] = None,
+    search: Optional[str] = None,
+    fields: Optional[list[str]] = None
+) -> list[dict]:
+    """
+    获取卡片列表（快速路径）
+
+    只查询需要的列（fields 指定的字段，默认全部响应字段），直接返回字典列表，
+    不创建 ORM 对象，也不经过 Pydantic 校验，适合直接交给 orjson 序列化。
+    调用方需要先调用 update_expired_cards 更新过期状态。
+    """
+    stmt = _filter_cards(select(*_card_columns(fields)), status, search)
+    result = db.execute(stmt.order_by(models.Card.id).offset(skip).limit(limit))
+    return [dict(row) for row in result.mappings()]
+
+
+def iter_card_rows(
+    db: Session,
+    status: Optional[str] = None,
+    search: Optional[str] = None,
+    fields: Optional[list[str]] = None,
+    batch_size: int = 1000,
+    archived: bool = False
+) -> Iterator[dict]:
+    """
+    逐行迭代符合条件的卡片（用于导出）
+
+    使用 yield_per 分批从游标读取，内存占用与总行数无关
+    （PostgreSQL 使用服务端游标，结果不会一次性传到客户端）。
+    调用方需要先调用 update_expired_cards 更新过期状态。
+    archived 为 True 时迭代归档表中的卡片。
+    """
+    model = models.ArchivedCard if archived else models.Card
+    stmt = _filter_cards(select(*_card_columns(fields, model)), status, search, model)
+    stmt = stmt.order_by(model.id).execution_options(stream_results=True, yield_per=batch_size)
+    for row in db.execute(stmt).mappings():
+        yield dict(row)
+
+
+@tracing.traced()
+def get_archived_card_rows(
+    db: Session,
+    card_id: Optional[str] = None,
+    card_number: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100
+) -> list[dict]:
+    """按卡密或卡号精确查询归档卡片（都未指定时按归档时间倒序列出）"""
+    stmt = select(*_card_columns(ARCHIVED_CARD_FIELDS, models.ArchivedCard))
+    if card_id:
+        stmt = stmt.where(models.ArchivedCard.card_id == card_id)
+    if card_number:
+        stmt = stmt.where(models.ArchivedCard.card_number == card_number)
+    stmt = stmt.order_by(models.ArchivedCard.archived_time.desc(), models.ArchivedCard.id.desc())
+    return [dict(row) for row in db.execute(stmt.offset(skip).limit(limit)).mappings()]
+
+
+@tracing.traced()
+def get_archived_card_ids(db: Session, card_ids: list[str]) -> set[str]:
+    """返回 card_ids 中已归档的卡密（归档的卡密不能重新创建或导入）"""
+    if not card_ids:
+        return set()
+    return set(db.execute(
+        select(models.ArchivedCard.card_id).where(models.ArchivedCard.card_id.in_(card_ids))
+    ).scalars())
+
+
+def _archivable(expired_before: int, refunded_before: datetime):
+    """可以归档的卡片：过期时间早于 expired_before，或退款申请时间早于 refunded_before"""
+    return or_(
+        and_(models.Card.status == 'expired', models.Card.exp_ts < expired_before),
+        and_(models.Card.refund_requested.is_(True), models.Card.refund_requested_time < refunded_before)
+    )
+
+
+@tracing.traced()
+def archive_cards_batch(db: Session, older_than: int, batch_size: int) -> int:
+    """
+    把一批过期或申请退款超过 older_than 秒的卡片移到归档表（单个事务），返回移动的卡片数量
+
+    分别按 status/id 索引和退款时间索引取出候选卡片，再用 DELETE ... RETURNING 删除
+    （删除时重新检查条件，期间被修改的卡片不会归档），删除的行原样写入归档表。
+    不经过 ORM flush，在同一事务内手动递增数据版本并失效单卡缓存。
+    """
+    from .config import get_current_time
+    expired_before = expiry.now_epoch() - older_than
+    refunded_before = get_current_time() - timedelta(seconds=older_than)
+
+    candidates = db.execute(
+        select(models.Card.id)
+        .where(models.Card.status == 'expired', models.Card.exp_ts < expired_before)
+        .order_by(models.Card.id)
+        .limit(batch_size)
+    ).scalars().all()
+    if len(candidates) < batch_size:
+        candidates += db.execute(
+            select(models.Card.id)
+            .where(models.Card.refund_requested.is_(True), models.Card.refund_requested_time < refunded_before)
+            .order_by(models.Card.refund_requested_time)
+            .limit(batch_size - len(candidates))
+        ).scalars().all()
+    if not candidates:
+        db.rollback()
+        return 0
+
+    rows = db.execute(
+        delete(models.Card)
+        .where(models.Card.id.in_(set(candidates)), _archivable(expired_before, refunded_before))
+        .returning(*models.Card.__table__.columns)
+        .execution_options(synchronize_session=False)
+    ).mappings().all()
+    if not rows:
+        db.rollback()
+        return 0
+
+    db.execute(insert(models.ArchivedCard), [dict(row) for row in rows])
+    versioning.bump_data_version(db)
+    for row in rows:
+        mark_dirty(db, row["card_id"])
+    db.commit()
+    return len(rows)
+
+
+@tracing.traced()
+def get_spend_card_rows(db: Session) -> list[dict]:
+    """获取参与消费汇总的卡片（已激活、未退款、未删除）"""
+    stmt = select(models.Card.card_id, models.Card.card_number, models.Card.card_limit).where(
+        models.Card.is_activated.is_(True),
+        models.Card.card_number.isnot(None),
+        or_(models.Card.refund_requested.is_(False), models.Card.refund_requested.is_(None)),
+        models.Card.status != 'deleted'
+    ).order_by(models.Card.id)
+    return [dict(row) for row in db.execute(stmt).mappings()]
+
+
+@tracing.traced()
+def get_unactivated_card_rows(db: Session) -> list[dict]:
+    """获取等待激活的卡片（未激活状态、没有卡号），供后台轮询使用"""
+    stmt = select(
+        models.Card.card_id, models.Card.create_time, models.Card.validity_hours, models.Card.exp_ts
+    ).where(WAITING_CARD)
+    return [dict(row) for row in db.execute(stmt).mappings()]
+
+
+@tracing.traced()
+def get_card_row(db: Session, card_id: str, fields: Optional[list[str]] = None) -> Optional[dict]:
+    """按卡密获取单张卡片的指定字段（不创建 ORM 对象，经过进程内缓存）"""
+    record = _card_record(db, card_id)
+    return record.to_dict(fields or CARD_FIELDS) if record else None
+
+
+@tracing.traced()
+def get_card_version(db: Session, card_id: str) -> Optional[int]:
+    """
+    获取卡片的行版本（用于 ETag）
+
+    卡片不存在，或卡片已到期但状态尚未更新时返回 None，
+    此时调用方应走完整的查询流程。
+    """
+    record = _card_record(db, card_id)
+    if record is None or expiry.is_expired(record.exp_ts, record.status):
+        return None
+    return record.row_version
 
 
+@tracing.traced()
 def update_expired_cards(db: Session) -> int:
     """
     检查并更新所有过期的卡片
     返回更新的卡片数量
-    """
-    from .config import get_current_time
-    now = get_current_time()
 
-    # 查找所有未删除且有过期时间的卡片
+    只加载已到期的卡片（exp_ts 部分索引范围扫描），耗时与卡片总数无关
+    """
     cards = db.query(models.Card).filter(
-        models.Card.status != 'deleted',
-        models.Card.status != 'expired',
-        models.Card.exp_date.isnot(None)
+        LIVE_CARD,
+        models.Card.exp_ts < expiry.now_epoch()
     ).all()
+    if not cards:
+        return 0
 
     # 更新状态为已过期
-    count = 0
     for card in cards:
-        exp_date = card.exp_date
-        # 移除时区信息进行比较（假设都是同一时区）
-        now_naive = now.replace(tzinfo=None) if now.tzinfo else now
-        exp_naive = exp_date.replace(tzinfo=None) if exp_date.tzinfo else exp_date
+        card.status = 'expired'
+    db.commit()
 
-        if now_naive > exp_naive:
-            card.status = 'expired'
-            count += 1
+    return len(cards)
 
-    if count > 0:
-        db.commit()
 
-    return count
+@tracing.traced()
+def get_expiring_card_rows(
+    db: Session,
+    within: int,
+    limit: int = 100,
+    fields: Optional[list[str]] = None
+) -> list[dict]:
+    """
+    获取 within 秒内即将过期的卡片（按过期时间升序）
+
+    只包含未删除、未过期的卡片，使用 exp_ts 部分索引范围扫描
+    """
+    now = expiry.now_epoch()
+    stmt = (
+        select(*_card_columns(fields))
+        .where(LIVE_CARD, models.Card.exp_ts >= now, models.Card.exp_ts < now + within)
+        .order_by(models.Card.exp_ts)
+        .limit(limit)
+    )
+    return [dict(row) for row in db.execute(stmt).mappings()]
 
 
+@tracing.traced()
 def create_card(db: Session, card: schemas.CardCreate) -> models.Card:
     """创建新卡片"""
     # 注意：过期时间(exp_date)应该从API的delete_date字段获取，而不是自己计算
@@ -111,21 +329,89 @@ def create_card(db: Session, card: schemas.CardCreate) -> models.Card:
     return db_card
 
 
-def update_card(db: Session, card_id: str, card_update: schemas.CardUpdate) -> Optional[models.Card]:
-    """更新卡片信息"""
-    db_card = get_card_by_id(db, card_id)
-    if not db_card:
-        return None
+@tracing.traced()
+def insert_new_cards(db: Session, cards: list[dict]) -> set[str]:
+    """
+    批量插入未激活的新卡片（不提交），返回实际插入的卡密
 
-    update_data = card_update.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_card, field, value)
+    使用 INSERT ... ON CONFLICT (card_id) DO NOTHING RETURNING，已存在的卡密直接跳过，
+    不需要先查询，并发导入相同卡密时也不会违反唯一约束。
+    不经过 ORM flush，因此先在同一事务内递增数据版本（UPDATE ... RETURNING），新行的行版本取递增后的版本号；
+    并发写入的事务在版本行上排队，不会得到相同的版本号。
+    """
+    if not cards:
+        return set()
+
+    version = versioning.bump_data_version(db)
+    stmt = (
+        insert_ignore(models.Card)
+        .values(row_version=version)
+        .on_conflict_do_nothing(index_elements=["card_id"])
+        .returning(models.Card.card_id)
+    )
+    inserted = set(db.execute(stmt, [
+        {
+            "card_id": card["card_id"],
+            "card_nickname": card.get("card_nickname"),
+            "card_limit": card.get("card_limit", 0.0),
+            "validity_hours": card.get("validity_hours"),
+            "exp_date": None,  # 不自己计算，等API返回
+            "status": "inactive",
+        }
+        for card in cards
+    ]).scalars())
+    return inserted
+
+
+def _update_card_row(db: Session, card_id: str, values: dict) -> Optional[dict]:
+    """
+    用一条 UPDATE ... RETURNING 更新卡片并提交，返回更新后的卡片行
+
+    卡片不存在时（影响行数为 0）回滚并返回 None，不需要先查询。
+    不经过 ORM flush，因此先在同一事务内递增数据版本，行版本取递增后的版本号
+    （并发写入的事务在版本行上排队，每次写入得到不同的版本号）。
+    """
+    version = versioning.bump_data_version(db)
+    row = db.execute(
+        update(models.Card)
+        .where(models.Card.card_id == card_id)
+        .values(**values, row_version=version)
+        .returning(*models.Card.__table__.columns)
+        .execution_options(synchronize_session=False)
+    ).mappings().first()
+    if row is None:
+        db.rollback()
+        return None
 
+    mark_dirty(db, card_id)
     db.commit()
-    db.refresh(db_card)
-    return db_card
+    return dict(row)
+
+
+@tracing.traced()
+def update_card_fields(db: Session, card_id: str, values: dict) -> Optional[dict]:
+    """更新卡片的指定列，返回更新后的卡片行（卡片不存在时返回 None）"""
+    return _update_card_row(db, card_id, values)
 
 
+@tracing.traced()
+def update_card(db: Session, card_id: str, card_update: schemas.CardUpdate) -> Optional[dict]:
+    """更新卡片信息，返回更新后的卡片行（卡片不存在时返回 None）"""
+    return _update_card_row(db, card_id, card_update.model_dump(exclude_unset=True))
+
+
+@tracing.traced()
+def toggle_refund(db: Session, card_id: str) -> Optional[dict]:
+    """切换退款申请状态（按原值取反，单条 UPDATE），返回更新后的卡片行（卡片不存在时返回 None）"""
+    from .config import get_current_time
+    requested = func.coalesce(models.Card.refund_requested, False)
+    return _update_card_row(db, card_id, {
+        "refund_requested": not_(requested),
+        "refund_requested_time": case((requested, null()), else_=get_current_time()),
+    })
+
+
+@tracing.traced()
 def delete_card(db: Session, card_id: str) -> bool:
     """删除卡片（硬删除 - 真正从数据库删除）"""
     db_card = db.query(models.Card).filter(models.Card.card_id == card_id).first()
@@ -137,41 +423,83 @@ def delete_card(db: Session, card_id: str) -> bool:
     return True
 
 
-def activate_card_in_db(
-    db: Session,
-    card_id: str,
+def activation_values(
     card_number: str,
     card_cvc: str,
     card_exp_date: str,
     billing_address: Optional[str] = None,
     validity_hours: Optional[int] = None,
-    exp_date: Optional[datetime] = None
-) -> Optional[models.Card]:
-    """更新卡片激活信息"""
-    db_card = get_card_by_id(db, card_id)
-    if not db_card:
-        return None
-
+    exp_ts: Optional[int] = None
+) -> dict:
+    """激活信息对应的列值"""
     from .config import get_current_time
-    db_card.card_number = card_number
-    db_card.card_cvc = card_cvc
-    db_card.card_exp_date = card_exp_date
-    db_card.billing_address = billing_address
-    db_card.is_activated = True
-    db_card.status = "active"
-    db_card.card_activation_time = get_current_time()  # 使用配置的时区
+    values = {
+        "card_number": card_number,
+        "card_cvc": card_cvc,
+        "card_exp_date": card_exp_date,
+        "billing_address": billing_address,
+        "is_activated": True,
+        "status": "active",
+        "card_activation_time": get_current_time(),  # 使用配置的时区
+    }
 
     # 更新有效期小时数和过期时间（从API的delete_date获取）
     if validity_hours is not None:
-        db_card.validity_hours = validity_hours
-    if exp_date is not None:
-        db_card.exp_date = exp_date
+        values["validity_hours"] = validity_hours
+    if exp_ts is not None:
+        values.update(expiry.expiry_values(exp_ts))
+    return values
 
-    db.commit()
-    db.refresh(db_card)
-    return db_card
+
+def set_card_activation(db_card: models.Card, **activation) -> None:
+    """设置卡片激活信息（不提交，由调用方控制事务），参数同 activation_values"""
+    for field, value in activation_values(**activation).items():
+        setattr(db_card, field, value)
+
+
+@tracing.traced()
+def activate_card_in_db(
+    db: Session,
+    card_id: str,
+    card_number: str,
+    card_cvc: str,
+    card_exp_date: str,
+    billing_address: Optional[str] = None,
+    validity_hours: Optional[int] = None,
+    exp_ts: Optional[int] = None
+) -> Optional[dict]:
+    """更新卡片激活信息，返回更新后的卡片行（卡片不存在时返回 None）"""
+    return _update_card_row(db, card_id, activation_values(
+        card_number, card_cvc, card_exp_date, billing_address,
+        validity_hours=validity_hours, exp_ts=exp_ts
+    ))
+
+
+@tracing.traced()
+def get_cards_by_ids(db: Session, card_ids: list[str]) -> dict[str, models.Card]:
+    """根据卡密批量获取卡片（一次 IN 查询），返回 {卡密: 卡片}"""
+    if not card_ids:
+        return {}
+    cards = db.query(models.Card).filter(models.Card.card_id.in_(card_ids)).all()
+    return {card.card_id: card for card in cards}
+
+
+@tracing.traced()
+def activate_cards_in_db(db: Session, activations: list[tuple[models.Card, dict]], log_message: Optional[str] = None) -> int:
+    """
+    批量更新卡片激活信息并记录激活日志（单个事务）
+
+    activations 为 (卡片, set_card_activation 的参数) 列表，返回更新的卡片数量
+    """
+    for db_card, activation in activations:
+        set_card_activation(db_card, **activation)
+        db.add(models.ActivationLog(card_id=db_card.card_id, status="success", error_message=log_message))
+    if activations:
+        db.commit()
+    return len(activations)
 
 
+@tracing.traced()
 def create_activation_log(
     db: Session,
     card_id: str,
@@ -192,6 +520,7 @@ def create_activation_log(
     return log
 
 
+@tracing.traced()
 def get_activation_logs(db: Session, card_id: str) -> list[models.ActivationLog]:
     """获取卡片的激活记录"""
     return db.query(models.ActivationLog).filter(
@@ -1,20 +1,97 @@
 """
 数据库配置和连接
 """
-from sqlalchemy import create_engine
+import os
+import tempfile
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from .config import (
+    DATABASE_URL, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_SIZE, DB_POOL_TIMEOUT, READ_REPLICA_INTERVAL
+)
+
+
+def normalize_database_url(url: str):
+    """
+    解析数据库 URL
+
+    postgres:// 和未指定驱动的 postgresql:// 统一使用 psycopg（3）驱动
+    """
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    parsed = make_url(url)
+    if parsed.drivername == "postgresql":
+        parsed = parsed.set(drivername="postgresql+psycopg")
+    return parsed
+
+
+# 数据库连接 URL（默认 SQLite 文件，也支持 PostgreSQL）
+SQLALCHEMY_DATABASE_URL = normalize_database_url(DATABASE_URL)
 
-from .config import DATABASE_URL
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.get_backend_name() == "sqlite"
+IS_POSTGRES = SQLALCHEMY_DATABASE_URL.get_backend_name() == "postgresql"
+
+
+def engine_options() -> dict:
+    """
+    按数据库类型选择引擎参数
+    - SQLite：连接可在线程池的不同线程中使用
+    - PostgreSQL：有界连接池，取出连接前检测是否可用，定期回收长时间使用的连接
+    """
+    if IS_SQLITE:
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
 
-# SQLite 数据库文件路径
-SQLALCHEMY_DATABASE_URL = DATABASE_URL
 
 # 创建数据库引擎
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}  # SQLite 特定配置
-)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options())
+
+
+@event.listens_for(engine, "connect")
+def _configure_sqlite(dbapi_connection, connection_record):
+    """
+    SQLite 连接配置（多 worker 进程共享同一个数据库文件）
+    - WAL 模式：读写互不阻塞
+    - busy_timeout：写锁被其他进程持有时等待，而不是立即报 database is locked
+    """
+    if not IS_SQLITE:
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+def insert_ignore(model):
+    """
+    带冲突处理的 INSERT（INSERT ... ON CONFLICT，SQLite 和 PostgreSQL 语法相同）
+
+    返回当前数据库方言的 insert 语句，调用方用 on_conflict_do_nothing（重复时跳过）
+    或 on_conflict_do_update（重复时更新，即 upsert）指定冲突列
+    """
+    if IS_POSTGRES:
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+
+def get_data_dir() -> str:
+    """数据目录：SQLite 数据库文件所在目录，其他数据库使用系统临时目录"""
+    if IS_SQLITE and engine.url.database and engine.url.database != ":memory:":
+        return os.path.dirname(os.path.abspath(engine.url.database))
+    return tempfile.gettempdir()
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -34,3 +111,46 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# ============================================
+# 只读副本（SQLite）
+# ============================================
+
+def _replica_path() -> Optional[str]:
+    """只读副本文件路径（与数据库文件同目录），未启用或不是 SQLite 文件数据库时为 None"""
+    if not READ_REPLICA_INTERVAL or not IS_SQLITE or not engine.url.database or engine.url.database == ":memory:":
+        return None
+    root, ext = os.path.splitext(os.path.abspath(engine.url.database))
+    return f"{root}-replica{ext or '.db'}"
+
+
+REPLICA_PATH = _replica_path()
+
+# 副本文件由后台任务整体替换，不会被原地修改：以 immutable 只读方式打开（不加锁），
+# 不复用连接，每个会话都打开最新的文件
+ReplicaSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    bind=create_engine(
+        f"sqlite:///file:{REPLICA_PATH}?mode=ro&immutable=1&uri=true",
+        poolclass=NullPool,
+        connect_args={"check_same_thread": False}
+    )
+) if REPLICA_PATH else None
+
+
+def read_session():
+    """导出、统计等只读查询的会话：启用只读副本且副本已生成时读副本，否则读主库"""
+    if ReplicaSessionLocal is not None and os.path.exists(REPLICA_PATH):
+        return ReplicaSessionLocal()
+    return SessionLocal()
+
+
+def get_read_db():
+    """只读查询的数据库会话依赖项（可能读取只读副本，数据最多延迟 READ_REPLICA_INTERVAL 秒）"""
+    db = read_session()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,67 @@
+"""
+卡片过期时间
+
+过期时间以 UTC Unix 时间戳（秒）保存在 cards.exp_ts 上，并为未过期、未删除的卡片建立部分索引，
+过期巡检和"即将过期"查询都是索引范围扫描。exp_date 列保留为配置时区下的展示值，
+所有写入过期时间的地方都通过 set_card_expiry / expiry_values，保证两列一致。
+"""
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from .config import APP_TIMEZONE
+
+# MisaCard API 返回的时间不带时区时按东八区处理
+API_TIMEZONE = timezone(timedelta(hours=8))
+
+
+def now_epoch() -> int:
+    """当前 UTC 时间戳（秒）"""
+    return int(time.time())
+
+
+def parse_api_datetime(value: Optional[str]) -> Optional[int]:
+    """把 API 返回的 ISO 时间字符串转换为 UTC 时间戳（无法解析时返回 None）"""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=API_TIMEZONE)
+    return int(dt.timestamp())
+
+
+def epoch_to_local(ts: Optional[int]) -> Optional[datetime]:
+    """UTC 时间戳转换为配置时区的 naive datetime（exp_date 列的存储格式）"""
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, APP_TIMEZONE).replace(tzinfo=None)
+
+
+def local_to_epoch(dt: Optional[datetime]) -> Optional[int]:
+    """exp_date 列的值（配置时区的 naive datetime）转换为 UTC 时间戳"""
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=APP_TIMEZONE)
+    return int(dt.timestamp())
+
+
+def expiry_values(exp_ts: Optional[int]) -> dict:
+    """过期时间对应的列值（exp_ts 和 exp_date），用于 UPDATE 语句"""
+    return {"exp_ts": exp_ts, "exp_date": epoch_to_local(exp_ts)}
+
+
+def set_card_expiry(card, exp_ts: Optional[int]) -> None:
+    """设置卡片过期时间（同时更新 exp_ts 和 exp_date）"""
+    for field, value in expiry_values(exp_ts).items():
+        setattr(card, field, value)
+
+
+def is_expired(exp_ts: Optional[int], status: Optional[str], now: Optional[int] = None) -> bool:
+    """卡片是否已到期但状态尚未更新"""
+    if exp_ts is None or status in ('deleted', 'expired'):
+        return False
+    return exp_ts < (now_epoch() if now is None else now)
@@ -0,0 +1,167 @@
+"""
+幂等导入
+
+每次导入记录为一个 import_batches 批次（内容哈希 + 结果），每行内容的哈希和对应的卡密记录在 import_lines 中：
+- 内容完全相同的重复提交直接返回上次的导入结果
+- 部分重复的内容只处理之前没有出现过的行
+- 只有对应卡片仍然存在（或已归档）的行才算已导入：卡片被删除后，同一行可以重新导入，
+  包含该行的批次重复提交时也会重新处理这些行
+新卡片批量写入，导入批次、行哈希和卡片在同一个事务中提交。
+"""
+import hashlib
+import json
+from typing import Iterable, Optional
+
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .database import insert_ignore
+from .utils.parser import validate_card_id
+
+# IN 查询每批的参数数量
+LOOKUP_CHUNK_SIZE = 500
+
+# 没有有效卡密的行（无法解析或卡密格式不正确）记录的卡密，重复提交时始终跳过
+NO_CARD = ""
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def line_hash(line: str) -> str:
+    """行哈希（忽略首尾空白）"""
+    return _sha256(line.strip())
+
+
+def content_hash(lines: Iterable[str]) -> str:
+    """内容哈希（忽略空行和每行首尾空白）"""
+    return _sha256("\n".join(line.strip() for line in lines if line.strip()))
+
+
+def json_line(card_id: str, card_limit: float, validity_hours: int) -> str:
+    """JSON 导入的单条卡片规范化为一行（带来源前缀，与文本导入的行区分）"""
+    return f"json\t{card_id.strip()}\t{card_limit}\t{validity_hours}"
+
+
+def _chunks(items: list, size: int = LOOKUP_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def find_batch(db: Session, digest: str) -> Optional[models.ImportBatch]:
+    return db.query(models.ImportBatch).filter(models.ImportBatch.content_hash == digest).first()
+
+
+def stored_result(batch: models.ImportBatch) -> dict:
+    """重复提交时返回的结果（上次的导入结果）"""
+    result = json.loads(batch.result)
+    return {
+        **result,
+        "batch_id": batch.id,
+        "duplicate": True,
+        "message": f"相同内容已导入过（批次 {batch.id}），返回上次的导入结果：{result['message']}",
+    }
+
+
+def line_card_id(card_id: Optional[str]) -> str:
+    """行记录的卡密（没有有效卡密时为 NO_CARD）"""
+    return card_id if card_id and validate_card_id(card_id) else NO_CARD
+
+
+def seen_line_hashes(db: Session, hashes: list[str]) -> set[str]:
+    """
+    返回已在之前的批次中处理过、且对应卡片仍然存在（或已归档）的行哈希
+
+    对应卡片已删除的行，以及升级前记录的不知道对应卡片的行，都需要重新处理
+    """
+    line = models.ImportLine
+    live = or_(
+        line.card_id == NO_CARD,
+        select(models.Card.id).where(models.Card.card_id == line.card_id).exists(),
+        select(models.ArchivedCard.id).where(models.ArchivedCard.card_id == line.card_id).exists(),
+    )
+    seen = set()
+    for chunk in _chunks(hashes):
+        seen.update(db.execute(
+            select(line.line_hash).where(line.line_hash.in_(chunk), live)
+        ).scalars())
+    return seen
+
+
+def add_cards(db: Session, cards: list[dict]) -> tuple[int, list[dict]]:
+    """
+    校验并添加卡片（不提交）
+
+    用 INSERT ... ON CONFLICT DO NOTHING 批量插入，未插入的即为已存在的卡密，返回 (成功数量, 失败列表)
+    已归档的卡密不会重新导入。
+    """
+    failed_items = []
+    valid = []
+    seen = set()
+    archived = set()
+    for chunk in _chunks([card_data["card_id"] for card_data in cards]):
+        archived.update(crud.get_archived_card_ids(db, chunk))
+    for card_data in cards:
+        if not validate_card_id(card_data["card_id"]):
+            failed_items.append({"card_id": card_data["card_id"], "reason": "卡密格式不正确"})
+        elif card_data["card_id"] in seen:
+            failed_items.append({"card_id": card_data["card_id"], "reason": "卡密已存在"})
+        elif card_data["card_id"] in archived:
+            failed_items.append({"card_id": card_data["card_id"], "reason": "卡密已归档"})
+        else:
+            seen.add(card_data["card_id"])
+            valid.append(card_data)
+
+    added = crud.insert_new_cards(db, valid)
+    failed_items.extend(
+        {"card_id": card_data["card_id"], "reason": "卡密已存在"}
+        for card_data in valid
+        if card_data["card_id"] not in added
+    )
+    return len(added), failed_items
+
+
+def save_batch(
+    db: Session,
+    source: str,
+    digest: str,
+    line_count: int,
+    line_cards: dict[str, str],
+    result: dict,
+    batch: Optional[models.ImportBatch] = None
+) -> Optional[models.ImportBatch]:
+    """
+    记录导入批次和本次处理的行（行哈希 -> 卡密），与已添加的卡片一起提交
+
+    batch 不为空时（相同内容的批次中有卡片已删除的行被重新处理）更新该批次的结果。
+    并发提交相同内容时返回 None（调用方应重新查询批次）
+    """
+    if batch is None:
+        batch = models.ImportBatch(source=source, content_hash=digest)
+        db.add(batch)
+    batch.line_count = line_count
+    batch.new_line_count = len(line_cards)
+    batch.result = json.dumps(result, ensure_ascii=False)
+    try:
+        db.flush()
+        if line_cards:
+            # 重新导入的行和并发导入的其他批次记录的相同行，更新为本次的批次和卡密
+            stmt = insert_ignore(models.ImportLine)
+            db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["line_hash"],
+                    set_={"batch_id": stmt.excluded.batch_id, "card_id": stmt.excluded.card_id}
+                ),
+                [
+                    {"line_hash": hash_, "batch_id": batch.id, "card_id": card_id}
+                    for hash_, card_id in line_cards.items()
+                ]
+            )
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return None
+    return batch
@@ -0,0 +1,327 @@
+"""
+批量任务队列
+
+批量查询、激活、刷新和导入作为任务写入 jobs / job_items 表，由 leader 进程中的后台任务逐条执行。
+每个子任务执行完立即提交结果（断点），进程重启或 leader 切换后从未完成的子任务继续；
+失败的子任务自动重试，达到最大次数后标记为 failed，可以通过接口重新执行。
+"""
+import asyncio
+import json
+from datetime import datetime
+from typing import Awaitable, Callable, Optional, Tuple
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from . import card_sync, crud, models, schemas, tracing
+from .config import APP_TIMEZONE, JOB_CONCURRENCY, JOB_MAX_ATTEMPTS, get_current_time
+from .database import SessionLocal
+from .utils.parser import validate_card_id
+
+JOB_TYPES = ("query", "activate", "refresh", "import")
+
+# 未指定卡密时，各类型任务默认处理的卡片状态
+DEFAULT_CARD_STATUS = {
+    "query": "inactive",
+    "activate": "inactive",
+    "refresh": "active",
+}
+
+# 子任务处理函数返回 (是否成功, 消息, 失败时是否可以重试)
+ItemResult = Tuple[bool, str, bool]
+ItemHandler = Callable[[Session, models.JobItem], Awaitable[ItemResult]]
+
+
+def _now() -> datetime:
+    """当前时间（带时区；PostgreSQL 按绝对时间保存，SQLite 保存配置时区的本地时间）"""
+    return get_current_time()
+
+
+def _aware(value: datetime) -> datetime:
+    """从数据库读出的时间转换为带时区的时间（SQLite 读出的时间不带时区，是配置时区的本地时间）"""
+    return value if value.tzinfo else value.replace(tzinfo=APP_TIMEZONE)
+
+
+# ============================================
+# 子任务处理函数
+# ============================================
+
+async def _handle_query(db: Session, item: models.JobItem) -> ItemResult:
+    success, message = await card_sync.query_and_update(db, item.payload)
+    return success, message, message != card_sync.CARD_NOT_FOUND
+
+
+async def _handle_activate(db: Session, item: models.JobItem) -> ItemResult:
+    success, message = await card_sync.activate_and_update(db, item.payload)
+    return success, message, message != card_sync.CARD_NOT_FOUND
+
+
+async def _handle_import(db: Session, item: models.JobItem) -> ItemResult:
+    """
+    导入一张卡片
+
+    卡片和子任务结果在同一个事务中提交：进程在提交前退出时卡片也没有写入，
+    重试时卡片已存在只可能是其他导入写入的，直接报告"卡密已存在"。
+    """
+    card_data = json.loads(item.payload)
+    if not validate_card_id(card_data["card_id"]):
+        return False, "卡密格式不正确", False
+    if crud.get_archived_card_ids(db, [card_data["card_id"]]):
+        return False, "卡密已归档", False
+    # ON CONFLICT DO NOTHING：并发导入相同卡密时不会因为唯一约束失败
+    if not crud.insert_new_cards(db, [schemas.CardCreate(**card_data).model_dump()]):
+        db.rollback()
+        return False, "卡密已存在", False
+    item.status = "succeeded"
+    item.message = "导入成功"
+    item.updated_time = _now()
+    db.commit()
+    return True, "导入成功", False
+
+
+HANDLERS: dict[str, ItemHandler] = {
+    "query": _handle_query,
+    "activate": _handle_activate,
+    "refresh": _handle_query,
+    "import": _handle_import,
+}
+
+
+# ============================================
+# 任务管理
+# ============================================
+
+def create_job(db: Session, job_type: str, payloads: list[str], params: Optional[dict] = None) -> models.Job:
+    """创建任务及其全部子任务（同一事务内写入）"""
+    job = models.Job(
+        type=job_type,
+        status="pending",
+        total=len(payloads),
+        params=json.dumps(params, ensure_ascii=False) if params else None,
+        created_time=_now()
+    )
+    db.add(job)
+    db.flush()
+    if payloads:
+        db.execute(insert(models.JobItem), [
+            {"job_id": job.id, "seq": seq, "payload": payload, "status": "pending", "attempts": 0}
+            for seq, payload in enumerate(payloads)
+        ])
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_job(db: Session, job_id: int) -> Optional[models.Job]:
+    return db.query(models.Job).filter(models.Job.id == job_id).first()
+
+
+def get_jobs(db: Session, skip: int = 0, limit: int = 20) -> list[models.Job]:
+    return db.query(models.Job).order_by(models.Job.id.desc()).offset(skip).limit(limit).all()
+
+
+def get_job_progress(db: Session, job: models.Job, failure_limit: int = 20) -> dict:
+    """
+    任务进度
+
+    包括各状态子任务数量、完成比例、吞吐量（已完成子任务数/秒）、预计剩余时间和最近的失败记录
+    """
+    counts = dict(db.execute(
+        select(models.JobItem.status, func.count())
+        .where(models.JobItem.job_id == job.id)
+        .group_by(models.JobItem.status)
+    ).all())
+    succeeded = counts.get("succeeded", 0)
+    failed = counts.get("failed", 0)
+    done = succeeded + failed
+    remaining = counts.get("pending", 0) + counts.get("running", 0)
+
+    throughput = None
+    eta_seconds = None
+    if job.started_time:
+        elapsed = (_aware(job.finished_time or _now()) - _aware(job.started_time)).total_seconds()
+        if elapsed > 0 and done:
+            throughput = round(done / elapsed, 3)
+            if job.status == "running":
+                eta_seconds = round(remaining / throughput, 1)
+
+    failures = db.execute(
+        select(models.JobItem.payload, models.JobItem.attempts, models.JobItem.message)
+        .where(models.JobItem.job_id == job.id, models.JobItem.status == "failed")
+        .order_by(models.JobItem.seq)
+        .limit(failure_limit)
+    ).all()
+
+    return {
+        "id": job.id,
+        "type": job.type,
+        "status": job.status,
+        "total": job.total,
+        "pending": counts.get("pending", 0),
+        "running": counts.get("running", 0),
+        "succeeded": succeeded,
+        "failed": failed,
+        "progress": round(done / job.total, 4) if job.total else 1.0,
+        "throughput": throughput,
+        "eta_seconds": eta_seconds,
+        "created_time": job.created_time,
+        "started_time": job.started_time,
+        "finished_time": job.finished_time,
+        "failures": [
+            {"payload": payload, "attempts": attempts, "message": message}
+            for payload, attempts, message in failures
+        ],
+    }
+
+
+def retry_failed_items(db: Session, job: models.Job) -> int:
+    """把失败的子任务重置为待执行并重新启动任务，返回重置的数量"""
+    result = db.execute(
+        update(models.JobItem)
+        .where(models.JobItem.job_id == job.id, models.JobItem.status == "failed")
+        .values(status="pending", attempts=0, updated_time=_now())
+    )
+    if result.rowcount:
+        job.status = "pending"
+        job.finished_time = None
+    db.commit()
+    return result.rowcount
+
+
+def cancel_job(db: Session, job: models.Job) -> None:
+    """取消任务（正在执行的子任务完成后停止，未执行的子任务保留为 pending）"""
+    if job.status in ("pending", "running"):
+        job.status = "cancelled"
+        job.finished_time = _now()
+        db.commit()
+
+
+def recover_interrupted_items(db: Session) -> int:
+    """
+    把上次运行中断（进程退出或失去 leader）时处于 running 的子任务重置为 pending
+
+    只在没有任务执行时调用，返回重置的数量
+    """
+    result = db.execute(
+        update(models.JobItem)
+        .where(models.JobItem.status == "running")
+        .values(status="pending")
+    )
+    db.commit()
+    return result.rowcount
+
+
+# ============================================
+# 任务执行
+# ============================================
+
+@tracing.traced()
+async def _process_item(job_type: str, item_id: int) -> None:
+    """执行单个子任务并提交结果"""
+    tracing.set_attributes(job_type=job_type, item_id=item_id)
+    db = SessionLocal()
+    try:
+        item = db.get(models.JobItem, item_id)
+        item.status = "running"
+        item.attempts += 1
+        item.updated_time = _now()
+        db.commit()
+
+        try:
+            success, message, retryable = await HANDLERS[job_type](db, item)
+        except Exception as e:
+            db.rollback()
+            success, message, retryable = False, str(e) or type(e).__name__, True
+
+        if success:
+            item.status = "succeeded"
+        elif retryable and item.attempts < JOB_MAX_ATTEMPTS:
+            # 放回队列，排在尝试次数更少的子任务之后
+            item.status = "pending"
+        else:
+            item.status = "failed"
+        item.message = message
+        item.updated_time = _now()
+        db.commit()
+    finally:
+        db.close()
+
+
+def _next_items(db: Session, job_id: int, limit: int, exclude: set[int]) -> list[int]:
+    """取出最多 limit 个待执行的子任务（exclude 为已分配、尚未标记为 running 的子任务）"""
+    item_ids = db.execute(
+        select(models.JobItem.id)
+        .where(models.JobItem.job_id == job_id, models.JobItem.status == "pending")
+        .order_by(models.JobItem.attempts, models.JobItem.seq)
+        .limit(limit + len(exclude))
+    ).scalars().all()
+    # 结束读事务，下一批读取时能看到其他连接提交的结果
+    db.commit()
+    return [item_id for item_id in item_ids if item_id not in exclude][:limit]
+
+
+@tracing.traced()
+async def run_job(job_id: int) -> None:
+    """
+    执行任务直到所有子任务完成或任务被取消（并发的子任务属于同一个 trace）
+
+    始终保持最多 JOB_CONCURRENCY 个子任务同时执行：任一子任务结束后立即补充下一个，
+    个别子任务等待上游超时和重试时，其余名额继续处理后面的子任务。
+    """
+    tracing.set_attributes(job_id=job_id)
+    db = SessionLocal()
+    try:
+        job = get_job(db, job_id)
+        job.status = "running"
+        job.started_time = job.started_time or _now()
+        db.commit()
+        job_type = job.type
+
+        # 正在执行的子任务：asyncio 任务 -> 子任务 ID
+        running: dict[asyncio.Task, int] = {}
+        while True:
+            db.refresh(job)
+            if job.status != "running":
+                # 已取消：等待正在执行的子任务提交结果
+                await asyncio.gather(*running, return_exceptions=True)
+                return
+
+            free = JOB_CONCURRENCY - len(running)
+            if free > 0:
+                for item_id in _next_items(db, job_id, free, set(running.values())):
+                    running[asyncio.create_task(_process_item(job_type, item_id))] = item_id
+
+            if not running:
+                job.status = "completed"
+                job.finished_time = _now()
+                db.commit()
+                return
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                del running[task]
+                task.result()
+    finally:
+        db.close()
+
+
+async def run_pending_jobs() -> None:
+    """按创建顺序执行所有未完成的任务（由 leader 进程的后台任务周期调用）"""
+    db = SessionLocal()
+    try:
+        recovered = recover_interrupted_items(db)
+        if recovered:
+            print(f"🔄 恢复 {recovered} 个中断的批量子任务")
+        while True:
+            job_id = db.execute(
+                select(models.Job.id)
+                .where(models.Job.status.in_(("pending", "running")))
+                .order_by(models.Job.id)
+                .limit(1)
+            ).scalar()
+            db.commit()
+            if job_id is None:
+                return
+            await run_job(job_id)
+    finally:
+        db.close()
@@ -1,67 +1,65 @@
 from fastapi import FastAPI, Request
 from fastapi.responses import RedirectResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
-from starlette.middleware.sessions import SessionMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
 from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
 import os
 
+from . import tracing
+from .api import cards, imports, jobs, profiling, stats
+from .config import ADMIN_PASSWORD, SECRET_KEY, SESSION_MAX_AGE, MISACARD_API_TOKEN, MISACARD_API_CONFIGS, DEBUG, SYNC_API_SECRET, APP_TIMEZONE, GZIP_MINIMUM_SIZE, PROFILING_ENABLED, describe_timezone
+from .admission import AdmissionMiddleware, admission_status
+from .card_cache import card_cache
+from .middleware import AuthMiddleware
 from .database import engine
-from . import models
-from .api import cards, imports
-from .config import ADMIN_PASSWORD, SECRET_KEY, SESSION_MAX_AGE, MISACARD_API_TOKEN, MISACARD_API_CONFIGS, DEBUG, SYNC_API_SECRET, APP_TIMEZONE
-
-models.Base.metadata.create_all(bind=engine)
+from .background import scheduler, start_background_jobs, stop_background_jobs
+from .startup import timed, startup_lock, init_schema, warm_up_database, format_timings
+from .utils.activation import warm_up_http_client, close_http_client
+from .utils.assets import CachedStaticFiles, PageCache, precompress_static
 
 def check_auth(request: Request):
     return request.session.get("authenticated", False)
 
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        path = request.url.path
-        
-        # 安全：阻止直接访问敏感文件
-        sensitive_extensions = [".db", ".sqlite", ".sqlite3", ".env", ".log"]
-        if any(path.endswith(ext) for ext in sensitive_extensions):
-            return JSONResponse(
-                status_code=404,
-                content={"detail": "Not Found"}
-            )
-        
-        # 安全：阻止访问隐藏文件（以 . 开头）
-        path_parts = path.strip("/").split("/")
-        if any(part.startswith(".") for part in path_parts if part):
-            return JSONResponse(
-                status_code=404,
-                content={"detail": "Not Found"}
-            )
-        
-        # 公开路径（不需要登录）
-        public_paths = ["/", "/login", "/api/auth/login", "/health", "/static"]
-        is_public = any(path.startswith(p) for p in public_paths)
-        
-        # 公共同步激活接口（/api/cards/{card_id}/sync-activation）
-        if path.endswith("/sync-activation") and "/api/cards/" in path:
-            is_public = True
-        
-        # /docs 和 /redoc 需要登录才能访问
-        if not is_public:
-            if not check_auth(request):
-                if path.startswith("/api"):
-                    return JSONResponse(
-                        status_code=401,
-                        content={"detail": "未登录，请先登录"}
-                    )
-                else:
-                    # 包括 /docs 和 /redoc 在内的所有非公开页面都重定向到登录页
-                    return RedirectResponse(url="/login", status_code=303)
-        
-        response = await call_next(request)
-        return response
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    启动时执行一次：表结构检查和迁移、静态资源预压缩、模板渲染、数据库和上游连接预热。
+    全部完成后 /health 才会返回就绪状态，然后启动后台任务调度。
+    """
+    timings = {}
+    with timed(timings, "schema"), startup_lock():
+        applied = init_schema()
+        precompress_static(static_path, GZIP_MINIMUM_SIZE)
+    with timed(timings, "templates"):
+        pages.get("query.html", query_page_context)
+        pages.get("index.html", dict)
+        pages.get("login.html", dict)
+    with timed(timings, "database"):
+        warm_up_database()
+    with timed(timings, "upstream"):
+        upstream_ok = await warm_up_http_client()
+
+    app.state.startup_timings = timings
+    app.state.ready = True
+    if applied:
+        print(f"✅ 已补充列: {', '.join(applied)}")
+    if not upstream_ok:
+        print("⚠️  上游 API 连接预热失败，将在首次请求时重试")
+    print(f"✅ 启动完成: 时区 {describe_timezone()}，{len(MISACARD_API_CONFIGS)} 个 API 配置（{format_timings(timings)}）")
+
+    # 单例后台任务：多 worker 时只在选举出的 leader 进程中运行
+    start_background_jobs()
+
+    yield
+
+    app.state.ready = False
+    await stop_background_jobs()
+    await close_http_client()
+    tracing.shutdown()
 
 
 app = FastAPI(
@@ -69,8 +67,10 @@ app = FastAPI(
     description="卡片管理系统 - 支持卡片查询、激活、批量导入",
     version="2.0.0",
     docs_url=None,  # 禁用自动生成的 /docs
-    redoc_url=None  # 禁用自动生成的 /redoc
+    redoc_url=None,  # 禁用自动生成的 /redoc
+    lifespan=lifespan
 )
+app.state.ready = False
 
 app.add_middleware(
     CORSMiddleware,
@@ -80,25 +80,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.add_middleware(AuthMiddleware)
+# 准入控制（在鉴权内层，未登录的请求不占用名额）：上游相关接口限制并发，超出排队容量时快速拒绝
+app.add_middleware(AdmissionMiddleware)
 
+# 按需性能分析（在鉴权内层，只分析已登录的请求；未启用时不挂载）
+if PROFILING_ENABLED:
+    from .profiling import ProfilingMiddleware
+    app.add_middleware(ProfilingMiddleware)
+
+# 鉴权（内部挂载 SessionMiddleware，公开路径不解析 session）
 app.add_middleware(
-    SessionMiddleware, 
+    AuthMiddleware,
     secret_key=SECRET_KEY,
     max_age=SESSION_MAX_AGE,
     same_site="lax",
     https_only=not DEBUG  # 生产环境启用 HTTPS only
 )
 
+# 响应压缩（已压缩的响应会直接透传）
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
+# 请求追踪（最外层，记录包括鉴权和压缩在内的完整耗时；未启用时不挂载）
+if tracing.ENABLED:
+    app.add_middleware(tracing.TracingMiddleware)
+    tracing.instrument_engine(engine)
+
 app.include_router(cards.router, prefix="/api")
 app.include_router(imports.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
+app.include_router(stats.router, prefix="/api")
+if PROFILING_ENABLED:
+    app.include_router(profiling.router, prefix="/api")
 
 templates_path = os.path.join(os.path.dirname(__file__), "templates")
 static_path = os.path.join(os.path.dirname(__file__), "static")
 os.makedirs(static_path, exist_ok=True)
 
 templates = Jinja2Templates(directory=templates_path)
-app.mount("/static", StaticFiles(directory=static_path), name="static")
+# 页面上下文在进程内是固定的，渲染结果可以缓存（DEBUG 模式下模板修改后自动刷新）
+pages = PageCache(templates, check_mtime=DEBUG)
+
+app.mount("/static", CachedStaticFiles(directory=static_path), name="static")
 
 
 class LoginRequest(BaseModel):
@@ -110,8 +132,8 @@ class LoginRequest(BaseModel):
     password: str = Field(..., description="管理员密码（从 .env 文件中的 ADMIN_PASSWORD 配置获取）")
 
 
-@app.get("/")
-async def root(request: Request):
+def query_page_context() -> dict:
+    """公共查询页面的模板上下文（只依赖配置，进程内固定不变）"""
     # 传递 API 配置列表，但不暴露完整 token（仅用于前端识别）
     api_configs_for_frontend = [
         {
@@ -125,25 +147,29 @@ async def root(request: Request):
     # 计算时区偏移（分钟）
     timezone_offset = int(APP_TIMEZONE.utcoffset(None).total_seconds() // 60)
     
-    return templates.TemplateResponse("query.html", {
-        "request": request,
+    return {
         "api_token": MISACARD_API_TOKEN,  # 保持向后兼容
         "api_configs": api_configs_for_frontend,
         "sync_api_secret": SYNC_API_SECRET,  # 同步API签名密钥
         "timezone_offset": timezone_offset  # 时区偏移（分钟）
-    })
+    }
+
+
+@app.get("/")
+async def root(request: Request):
+    return pages.response(request, "query.html", query_page_context)
 
 
 @app.get("/admin")
 async def admin_dashboard(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return pages.response(request, "index.html", cache_control="private, no-cache")
 
 
 @app.get("/login")
 async def login_page(request: Request):
     if check_auth(request):
         return RedirectResponse(url="/admin", status_code=303)
-    return templates.TemplateResponse("login.html", {"request": request})
+    return pages.response(request, "login.html")
 
 
 @app.post("/api/auth/login", summary="管理员登录")
@@ -193,11 +219,21 @@ async def health_check():
     健康检查端点
     
     用于检查服务是否正常运行，返回服务状态和版本信息。
+    启动预热完成前返回 503（status=starting）。
     """
+    if not app.state.ready:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "starting", "service": "MisaCard Backend", "version": "2.0.0"}
+        )
     return {
         "status": "healthy",
         "service": "MisaCard Backend",
-        "version": "2.0.0"
+        "version": "2.0.0",
+        "leader": scheduler.is_leader,
+        "admission": admission_status(),
+        "card_cache": card_cache.stats(),
+        "sync_guard": cards.sync_guard_status()
     }
 
 
@@ -240,6 +276,8 @@ async def api_info():
         "endpoints": {
             "cards": "/api/cards",
             "import": "/api/import",
+            "jobs": "/api/jobs",
+            "stats": "/api/stats/activations",
             "docs": "/docs",
             "redoc": "/redoc"
         }
@@ -0,0 +1,97 @@
+"""
+鉴权与路由访问控制中间件（纯 ASGI 实现）
+
+路由规则在启动时编译为正则表达式，每个请求只做一次匹配：
+- 敏感路径（数据库、环境变量、日志、隐藏文件）直接返回 404
+- 公开路径不解析 session cookie，直接交给应用处理
+- 需要 session 的公开路径（登录页、登录接口）只解析 session，不要求登录
+- 其余路径必须已登录：API 返回 401，页面重定向到登录页
+"""
+import re
+from typing import Iterable
+
+from starlette.middleware.sessions import SessionMiddleware
+from starlette.responses import JSONResponse, RedirectResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# 禁止访问的文件扩展名
+SENSITIVE_EXTENSIONS = (".db", ".sqlite", ".sqlite3", ".env", ".log")
+
+# 公开路径（不需要登录，也不需要 session）
+# 路由语法：* 匹配一个路径段，末尾的 /** 匹配任意后缀
+PUBLIC_ROUTES = (
+    "/",
+    "/health",
+    "/static/**",
+    "/api/cards/*/sync-activation",
+)
+
+# 需要读取 session 但不要求登录的路径
+SESSION_ROUTES = (
+    "/login",
+    "/api/auth/login",
+)
+
+
+def compile_routes(routes: Iterable[str]) -> re.Pattern:
+    """把路由列表编译为一个正则表达式"""
+    alternatives = []
+    for route in routes:
+        if route.endswith("/**"):
+            prefix = re.escape(route[:-3]).replace(r"\*", "[^/]+")
+            alternatives.append(prefix + "(?:/.*)?")
+        else:
+            alternatives.append(re.escape(route).replace(r"\*", "[^/]+"))
+    return re.compile("^(?:" + "|".join(alternatives) + ")$")
+
+
+BLOCKED_PATTERN = re.compile(
+    "(?:" + "|".join(re.escape(ext) for ext in SENSITIVE_EXTENSIONS) + ")$"  # 敏感文件
+    r"|/\."  # 隐藏文件（路径段以 . 开头）
+)
+PUBLIC_PATTERN = compile_routes(PUBLIC_ROUTES)
+SESSION_PATTERN = compile_routes(SESSION_ROUTES)
+
+NOT_FOUND_RESPONSE = JSONResponse(status_code=404, content={"detail": "Not Found"})
+UNAUTHORIZED_RESPONSE = JSONResponse(status_code=401, content={"detail": "未登录，请先登录"})
+LOGIN_REDIRECT_RESPONSE = RedirectResponse(url="/login", status_code=303)
+
+
+class AuthMiddleware:
+    """
+    鉴权中间件（同时负责挂载 SessionMiddleware）
+
+    参数与 SessionMiddleware 相同，只有需要 session 的路径才会经过 SessionMiddleware。
+    """
+
+    def __init__(self, app: ASGIApp, **session_options):
+        self.app = app
+        self.session_app = SessionMiddleware(app, **session_options)
+        self.protected_app = SessionMiddleware(self._require_login, **session_options)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+
+        # 安全：阻止直接访问敏感文件和隐藏文件
+        if BLOCKED_PATTERN.search(path):
+            await NOT_FOUND_RESPONSE(scope, receive, send)
+        elif PUBLIC_PATTERN.match(path):
+            await self.app(scope, receive, send)
+        elif SESSION_PATTERN.match(path):
+            await self.session_app(scope, receive, send)
+        else:
+            await self.protected_app(scope, receive, send)
+
+    async def _require_login(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """已登录时交给应用处理，否则 API 返回 401，页面重定向到登录页"""
+        if scope["session"].get("authenticated", False):
+            await self.app(scope, receive, send)
+        elif scope["path"].startswith("/api"):
+            await UNAUTHORIZED_RESPONSE(scope, receive, send)
+        else:
+            # 包括 /docs 和 /redoc 在内的所有非公开页面都重定向到登录页
+            await LOGIN_REDIRECT_RESPONSE(scope, receive, send)
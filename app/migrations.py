@@ -0,0 +1,79 @@
+"""
+轻量级数据库迁移
+
+create_all 只会创建缺失的表，不会为已有表补充新增的列。
+这里记录新增的列，在启动时按需执行 ALTER TABLE。
+"""
+from sqlalchemy import inspect, select, text, update
+
+from .database import engine
+from . import expiry, models, stats, versioning
+
+# (表名, 列名, 列定义)
+COLUMN_MIGRATIONS = [
+    ("cards", "row_version", "INTEGER NOT NULL DEFAULT 0"),
+    ("cards", "exp_ts", "INTEGER"),
+    ("import_lines", "card_id", "VARCHAR"),
+]
+
+# 为已有表补建的索引（create_all 只为新建的表创建索引）
+INDEX_MIGRATIONS = [
+    ("cards", "ix_cards_live_exp_ts"),
+    ("cards", "ix_cards_waiting_create_time"),
+    ("cards", "ix_cards_status_id"),
+    ("cards", "ix_cards_refund_time"),
+    ("activation_logs", "ix_activation_logs_card_time"),
+]
+
+
+def _index(table: str, name: str):
+    return next(index for index in models.Base.metadata.tables[table].indexes if index.name == name)
+
+
+def backfill_exp_ts(conn) -> int:
+    """根据 exp_date 补充 exp_ts（升级前写入的卡片），返回补充的行数"""
+    rows = conn.execute(
+        select(models.Card.id, models.Card.exp_date)
+        .where(models.Card.exp_ts.is_(None), models.Card.exp_date.isnot(None))
+    ).all()
+    for card_id, exp_date in rows:
+        conn.execute(
+            update(models.Card)
+            .where(models.Card.id == card_id)
+            .values(exp_ts=expiry.local_to_epoch(exp_date))
+        )
+    return len(rows)
+
+
+def run_migrations(bind=engine) -> list[str]:
+    """
+    补充缺失的列并初始化数据版本
+
+    返回本次新增的列（格式：表名.列名）
+    """
+    inspector = inspect(bind)
+    tables = set(inspector.get_table_names())
+    applied = []
+
+    with bind.begin() as conn:
+        for table, column, ddl in COLUMN_MIGRATIONS:
+            if table not in tables:
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table)}
+            if column not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                applied.append(f"{table}.{column}")
+
+        for table, name in INDEX_MIGRATIONS:
+            if table in tables:
+                _index(table, name).create(conn, checkfirst=True)
+
+        if "cards.exp_ts" in applied:
+            backfill_exp_ts(conn)
+
+        if "activation_logs" in tables and stats.rollups_missing(conn):
+            stats.rebuild_rollups(conn)
+
+        versioning.ensure_data_versions(conn)
+
+    return applied
@@ -1,14 +1,19 @@
 """
 数据库模型定义
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Index, text
 from sqlalchemy.sql import func
 from .database import Base
 
+# 未删除且未标记过期的卡片（过期时间部分索引的条件，查询时需使用相同的表达式才能命中索引）
+LIVE_CARD_CONDITION = "status NOT IN ('deleted', 'expired')"
+
+# 等待激活的卡片（后台轮询候选卡片部分索引的条件，查询时同样需要使用相同的表达式）
+WAITING_CARD_CONDITION = "status = 'inactive' AND card_number IS NULL"
 
-class Card(Base):
-    """卡片信息表"""
-    __tablename__ = "cards"
+
+class CardColumns:
+    """卡片的列（cards 和 archived_cards 两张表共用）"""
 
     id = Column(Integer, primary_key=True, index=True)
     # 卡密（唯一标识）
@@ -37,17 +42,66 @@ class Card(Base):
     card_activation_time = Column(DateTime(timezone=True), nullable=True)
     # 卡片系统过期时间（对应API的delete_date字段，这才是判断卡片是否过期的时间戳）
     exp_date = Column(DateTime(timezone=True), nullable=True)
+    # 卡片系统过期时间（UTC Unix 时间戳，秒，与 exp_date 同时写入，用于过期判断和索引范围查询）
+    exp_ts = Column(Integer, nullable=True)
     # 软删除时间（用户删除卡片的时间，不是卡片过期时间）
     delete_date = Column(DateTime(timezone=True), nullable=True)
     # 是否已申请退款
     refund_requested = Column(Boolean, default=False)
     # 退款申请时间
     refund_requested_time = Column(DateTime(timezone=True), nullable=True)
+    # 行版本（最后一次写入时的全局数据版本号，用于 ETag）
+    row_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class Card(CardColumns, Base):
+    """卡片信息表"""
+    __tablename__ = "cards"
+    __table_args__ = (
+        Index(
+            "ix_cards_live_exp_ts", "exp_ts",
+            sqlite_where=text(LIVE_CARD_CONDITION),
+            postgresql_where=text(LIVE_CARD_CONDITION)
+        ),
+        Index(
+            "ix_cards_waiting_create_time", "create_time",
+            sqlite_where=text(WAITING_CARD_CONDITION),
+            postgresql_where=text(WAITING_CARD_CONDITION)
+        ),
+        # 按状态筛选的列表和导出（按 id 分页）
+        Index("ix_cards_status_id", "status", "id"),
+        # 归档任务查找退款时间较早的卡片
+        Index("ix_cards_refund_time", "refund_requested_time"),
+    )
+
+
+class ArchivedCard(CardColumns, Base):
+    """
+    归档卡片表
+
+    过期或退款超过 ARCHIVE_AFTER_DAYS 天的卡片由后台任务从 cards 表整行移到这里（id 保持不变），
+    cards 表只保留仍在使用的卡片。归档卡片只通过归档查询接口和导出（include_archived）读取。
+    """
+    __tablename__ = "archived_cards"
+    __table_args__ = (
+        Index("ix_archived_cards_card_number", "card_number"),
+    )
+
+    # 卡密作为主键（cards 表的 id 在 SQLite 中可能被新卡片复用，不适合作为归档表主键）
+    card_id = Column(String, primary_key=True)
+    # 原 cards 表中的 id
+    id = Column(Integer, index=True, nullable=False)
+    # 归档时间
+    archived_time = Column(DateTime(timezone=True), server_default=func.now())
 
 
 class ActivationLog(Base):
     """激活记录表"""
     __tablename__ = "activation_logs"
+    __table_args__ = (
+        # 单张卡片的激活记录（按时间倒序）
+        Index("ix_activation_logs_card_time", "card_id", "activation_time"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     card_id = Column(String, index=True, nullable=False)
@@ -59,3 +113,115 @@ class ActivationLog(Base):
     activation_time = Column(DateTime(timezone=True), server_default=func.now())
     # 响应数据（JSON格式）
     response_data = Column(String, nullable=True)
+
+
+class ActivationRollup(Base):
+    """激活统计汇总表（按小时、状态和失败原因汇总 activation_logs，写入日志时同步更新）"""
+    __tablename__ = "activation_rollups"
+
+    # 小时起点（UTC Unix 时间戳，秒）
+    bucket_start = Column(Integer, primary_key=True)
+    # 激活状态：success, failed
+    status = Column(String, primary_key=True)
+    # 失败原因（成功记录为空字符串）
+    reason = Column(String, primary_key=True, default="")
+    # 记录数
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ImportBatch(Base):
+    """导入批次表（记录每次导入的内容哈希和结果，相同内容重复提交时直接返回结果）"""
+    __tablename__ = "import_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # 导入来源：text, json
+    source = Column(String, nullable=False)
+    # 内容哈希（规范化后所有行的 SHA-256）
+    content_hash = Column(String, unique=True, index=True, nullable=False)
+    # 提交的行数
+    line_count = Column(Integer, nullable=False, default=0)
+    # 本次处理的新行数（其余行在之前的批次中已处理）
+    new_line_count = Column(Integer, nullable=False, default=0)
+    # 导入结果（JSON格式，与导入接口的响应相同）
+    result = Column(String, nullable=True)
+    # 导入时间
+    created_time = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ImportLine(Base):
+    """已导入行表（每行内容的哈希，部分重复的导入只处理未出现过或对应卡片已删除的行）"""
+    __tablename__ = "import_lines"
+
+    # 行哈希（规范化后该行内容的 SHA-256）
+    line_hash = Column(String, primary_key=True)
+    # 最近一次处理该行的导入批次
+    batch_id = Column(Integer, nullable=False)
+    # 该行对应的卡密（空字符串表示该行没有有效卡密；升级前记录的行为空）
+    card_id = Column(String, nullable=True)
+
+
+class DataVersion(Base):
+    """数据版本表（每次写入对应数据表时递增，多进程共享）"""
+    __tablename__ = "data_versions"
+
+    # 数据集名称，如 "cards"
+    name = Column(String, primary_key=True)
+    # 单调递增的版本号
+    version = Column(Integer, nullable=False, default=0)
+
+
+class Lease(Base):
+    """租约表（多 worker 部署时用于选举执行单例后台任务的 leader）"""
+    __tablename__ = "leases"
+
+    # 租约名称
+    name = Column(String, primary_key=True)
+    # 持有者标识（主机名:进程号:随机串）
+    holder = Column(String, nullable=False)
+    # 过期时间（Unix 时间戳，秒）
+    expires_at = Column(Float, nullable=False)
+
+
+
+class Job(Base):
+    """批量任务表（批量查询、激活、刷新、导入）"""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # 任务类型：query, activate, refresh, import
+    type = Column(String, nullable=False)
+    # 任务状态：pending, running, completed, cancelled
+    status = Column(String, nullable=False, default="pending", index=True)
+    # 子任务总数
+    total = Column(Integer, nullable=False, default=0)
+    # 创建任务时的参数（JSON格式）
+    params = Column(String, nullable=True)
+    # 创建时间
+    created_time = Column(DateTime(timezone=True), server_default=func.now())
+    # 开始执行时间
+    started_time = Column(DateTime(timezone=True), nullable=True)
+    # 结束时间（完成或取消）
+    finished_time = Column(DateTime(timezone=True), nullable=True)
+
+
+class JobItem(Base):
+    """批量任务子项表（每张卡片/每行导入数据一条，逐条记录执行进度）"""
+    __tablename__ = "job_items"
+    __table_args__ = (
+        Index("ix_job_items_job_status", "job_id", "status"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, nullable=False)
+    # 在任务中的序号
+    seq = Column(Integer, nullable=False)
+    # 子任务数据：卡密，导入任务为卡片数据（JSON格式）
+    payload = Column(String, nullable=False)
+    # 状态：pending, running, succeeded, failed
+    status = Column(String, nullable=False, default="pending")
+    # 已尝试次数
+    attempts = Column(Integer, nullable=False, default=0)
+    # 最近一次执行结果或错误信息
+    message = Column(String, nullable=True)
+    # 最近一次更新时间
+    updated_time = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,135 @@
+"""
+未激活卡片自动轮询
+
+leader 进程的后台任务定期通过上游 API 查询未激活的卡片，卡片在别处被激活后几秒内即可同步到本地，
+不需要在页面上手动点击"查询未激活卡密"。
+- 优先级队列：有效期窗口（或过期时间）越早结束的卡片越优先，相同时新导入的卡片优先
+- 调用预算：令牌桶限制每分钟最多 POLLER_CALLS_PER_MINUTE 次上游调用
+- 退避：查询结果没有变化的卡片，下次轮询间隔从 POLLER_MIN_INTERVAL 开始翻倍，最长 POLLER_MAX_INTERVAL
+- 只有查询结果与本地数据不同时才写入数据库
+"""
+import asyncio
+import heapq
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from . import card_sync, crud
+from .config import POLLER_CALLS_PER_MINUTE, POLLER_MAX_INTERVAL, POLLER_MIN_INTERVAL
+from .database import SessionLocal
+from .utils.activation import query_card_from_api
+
+# 没有有效期信息的卡片排在有效期窗口 30 天后结束的卡片之后
+NO_DEADLINE_SECONDS = 30 * 86400
+
+
+def _epoch(value: Optional[datetime]) -> float:
+    """创建时间转换为时间戳（由数据库默认值写入，无时区时为 UTC）"""
+    if value is None:
+        return time.time()
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def card_priority(row: dict) -> tuple[float, float]:
+    """卡片的优先级（越小越优先）：(有效期窗口结束时间, -导入时间)"""
+    created = _epoch(row["create_time"])
+    if row["exp_ts"] is not None:
+        deadline = row["exp_ts"]
+    elif row["validity_hours"]:
+        deadline = created + row["validity_hours"] * 3600
+    else:
+        deadline = created + NO_DEADLINE_SECONDS
+    return deadline, -created
+
+
+class InactiveCardPoller:
+    """未激活卡片轮询器（状态保存在 leader 进程内，切换 leader 后重新开始退避）"""
+
+    def __init__(
+        self,
+        calls_per_minute: int = POLLER_CALLS_PER_MINUTE,
+        min_interval: float = POLLER_MIN_INTERVAL,
+        max_interval: float = POLLER_MAX_INTERVAL
+    ):
+        self.rate = calls_per_minute / 60
+        # 令牌桶容量：最多积累 10 秒的预算，避免空闲后集中调用
+        self.capacity = max(1.0, self.rate * 10)
+        self.tokens = self.capacity
+        self.refilled_at = time.monotonic()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # 卡密 -> (下次轮询时间, 连续无变化次数)
+        self.backoff: dict[str, tuple[float, int]] = {}
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def due_cards(self, rows: list[dict], limit: int, now: Optional[float] = None) -> list[str]:
+        """从候选卡片中按优先级取出已到轮询时间的卡片"""
+        now = time.time() if now is None else now
+        live = {row["card_id"] for row in rows}
+        for card_id in [card_id for card_id in self.backoff if card_id not in live]:
+            del self.backoff[card_id]
+
+        queue = [
+            (card_priority(row), row["card_id"])
+            for row in rows
+            if self.backoff.get(row["card_id"], (0, 0))[0] <= now
+        ]
+        return [card_id for _, card_id in heapq.nsmallest(limit, queue)]
+
+    def _record(self, card_id: str, changed: bool) -> None:
+        """记录轮询结果，安排下次轮询时间（有变化时退避重新开始）"""
+        _, unchanged = (0, 0) if changed else self.backoff.get(card_id, (0, 0))
+        interval = min(self.min_interval * (2 ** unchanged), self.max_interval)
+        self.backoff[card_id] = (time.time() + interval, unchanged + 1)
+
+    async def _poll(self, card_id: str) -> bool:
+        """查询一张卡片，有变化时更新本地数据，返回是否已激活"""
+        success, card_data, _ = await query_card_from_api(card_id)
+        if not success:
+            self._record(card_id, False)
+            return False
+
+        db = SessionLocal()
+        try:
+            db_card = crud.get_card_by_id(db, card_id)
+            if db_card is None or not card_sync.query_result_changed(db_card, card_data):
+                self._record(card_id, False)
+                return False
+            row = card_sync.apply_query_result(db, db_card, card_data)
+            self._record(card_id, True)
+            return bool(row and row["card_number"])
+        finally:
+            db.close()
+
+    async def run_once(self) -> int:
+        """按预算轮询一批卡片，返回本次发现已激活的卡片数量"""
+        self._refill()
+        budget = int(self.tokens)
+        if budget < 1:
+            return 0
+
+        db = SessionLocal()
+        try:
+            rows = crud.get_unactivated_card_rows(db)
+        finally:
+            db.close()
+
+        card_ids = self.due_cards(rows, budget)
+        if not card_ids:
+            return 0
+        self.tokens -= len(card_ids)
+
+        results = await asyncio.gather(*(self._poll(card_id) for card_id in card_ids), return_exceptions=True)
+        activated = sum(1 for result in results if result is True)
+        if activated:
+            print(f"✅ 自动轮询：{activated} 张卡片已激活")
+        return activated
+
+
+poller = InactiveCardPoller()
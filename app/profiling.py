@@ -0,0 +1,235 @@
+"""
+按需性能分析（仅管理员，PROFILING_ENABLED=true 时启用）
+
+- CPU：已登录的请求带 `X-Profile: 1` 头或 `?profile=1` 参数时，用 cProfile 记录该请求的处理过程，
+  结果保存为数据目录 profiles/ 下的 .prof 文件（多 worker 共享，超过 PROFILE_MAX_FILES 时删除最旧的），
+  响应头 X-Profile-Id 返回结果 ID。cProfile 只记录事件循环线程，同步依赖和线程池中的代码不在结果中；
+  分析期间同一进程中并发处理的其他请求也会计入结果。
+- 内存：通过接口启动 tracemalloc，在大批量列表、导出、导入前后分别拍快照并对比。
+  快照保存在当前 worker 进程内，响应中的 pid 用于确认前后两次请求落在同一进程。
+
+未启用时不挂载中间件和接口；启用后未带标记的请求只多一次请求头检查，tracemalloc 只在手动启动后运行。
+"""
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from typing import Optional
+from urllib.parse import parse_qs
+
+from .config import PROFILE_MAX_FILES
+from .database import get_data_dir
+
+PROFILE_DIR = os.path.join(get_data_dir(), "profiles")
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$")
+
+# 报告支持的排序方式
+SORT_KEYS = ("cumulative", "tottime", "calls", "ncalls")
+
+# 同时只分析一个请求（cProfile 不支持嵌套启用）
+_profile_lock = threading.Lock()
+
+
+# ============================================
+# CPU
+# ============================================
+
+def _new_profile_id() -> str:
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + os.urandom(4).hex()
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+    """结果文件路径（ID 格式不正确时返回 None）"""
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    return os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+
+
+def _save_profile(profile: cProfile.Profile, profile_id: str, method: str, path: str, duration_ms: float) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile.dump_stats(profile_path(profile_id))
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.meta"), "w", encoding="utf-8") as f:
+        f.write(f"{method}\t{path}\t{duration_ms:.1f}\t{os.getpid()}")
+
+    files = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith(".prof"))
+    for name in files[:max(len(files) - PROFILE_MAX_FILES, 0)]:
+        for suffix in (".prof", ".meta"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name[:-5] + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles() -> list[dict]:
+    """已保存的分析结果（按时间倒序）"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith(".meta"):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name), encoding="utf-8") as f:
+                method, path, duration_ms, pid = f.read().split("\t")
+        except (OSError, ValueError):
+            continue
+        profiles.append({
+            "id": name[:-5],
+            "method": method,
+            "path": path,
+            "duration_ms": float(duration_ms),
+            "pid": int(pid),
+        })
+    return profiles
+
+
+def profile_report(profile_id: str, sort: str = "cumulative", limit: int = 50) -> Optional[str]:
+    """分析结果的文本报告（pstats 格式），结果不存在时返回 None"""
+    path = profile_path(profile_id)
+    if path is None or not os.path.exists(path):
+        return None
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+def _profile_requested(scope) -> bool:
+    for key, value in scope["headers"]:
+        if key == b"x-profile":
+            return value in (b"1", b"true")
+    query = scope.get("query_string", b"")
+    if b"profile=" in query:
+        return parse_qs(query.decode("latin-1")).get("profile", [""])[0] in ("1", "true")
+    return False
+
+
+class ProfilingMiddleware:
+    """已登录且带有分析标记的请求用 cProfile 记录（需挂载在 AuthMiddleware 内层，依赖 session）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if (
+            scope["type"] != "http"
+            or not _profile_requested(scope)
+            or not scope.get("session", {}).get("authenticated", False)
+            or not _profile_lock.acquire(blocking=False)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = _new_profile_id()
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profile.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profile.disable()
+            _save_profile(profile, profile_id, scope["method"], scope["path"], (time.perf_counter() - started) * 1000)
+        finally:
+            _profile_lock.release()
+
+
+# ============================================
+# 内存
+# ============================================
+
+_snapshots: dict[str, tracemalloc.Snapshot] = {}
+_snapshot_order: list[str] = []
+
+# 进程内最多保留的内存快照数量
+MAX_SNAPSHOTS = 10
+
+
+def memory_status() -> dict:
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "pid": os.getpid(),
+        "tracing": tracemalloc.is_tracing(),
+        "current_bytes": current,
+        "peak_bytes": peak,
+        "snapshots": list(_snapshot_order),
+    }
+
+
+def start_memory_tracing(frames: int = 10) -> dict:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    return memory_status()
+
+
+def stop_memory_tracing() -> dict:
+    """停止 tracemalloc 并清除快照"""
+    tracemalloc.stop()
+    _snapshots.clear()
+    _snapshot_order.clear()
+    return memory_status()
+
+
+def _stat_to_dict(stat) -> dict:
+    frame = stat.traceback[0]
+    item = {
+        "location": f"{frame.filename}:{frame.lineno}",
+        "size_bytes": stat.size,
+        "count": stat.count,
+    }
+    if hasattr(stat, "size_diff"):
+        item["size_diff_bytes"] = stat.size_diff
+        item["count_diff"] = stat.count_diff
+    return item
+
+
+def _filtered(snapshot: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+    return snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+
+def take_snapshot(limit: int = 20) -> dict:
+    """拍摄内存快照（需要先启动 tracemalloc），返回快照 ID 和占用最多的代码位置"""
+    snapshot = _filtered(tracemalloc.take_snapshot())
+    snapshot_id = time.strftime("%H%M%S") + "-" + os.urandom(2).hex()
+    _snapshots[snapshot_id] = snapshot
+    _snapshot_order.append(snapshot_id)
+    while len(_snapshot_order) > MAX_SNAPSHOTS:
+        del _snapshots[_snapshot_order.pop(0)]
+
+    return {
+        **memory_status(),
+        "snapshot_id": snapshot_id,
+        "top": [_stat_to_dict(stat) for stat in snapshot.statistics("lineno")[:limit]],
+    }
+
+
+def compare_snapshots(base_id: str, target_id: str, limit: int = 20) -> Optional[dict]:
+    """对比两个快照（按代码行），返回增长最多的位置；快照不存在时返回 None"""
+    base = _snapshots.get(base_id)
+    target = _snapshots.get(target_id)
+    if base is None or target is None:
+        return None
+    diff = target.compare_to(base, "lineno")
+    return {
+        "pid": os.getpid(),
+        "from": base_id,
+        "to": target_id,
+        "size_diff_bytes": sum(stat.size_diff for stat in diff),
+        "top": [_stat_to_dict(stat) for stat in diff[:limit]],
+    }
@@ -0,0 +1,104 @@
+"""
+公共接口限流和防重放（进程内，多 worker 时每个进程单独计数）
+
+- SlidingWindowLimiter：滑动窗口计数（当前窗口计数 + 上一窗口计数按重叠比例加权），
+  每个键只保存三个数，键数量有上限（超出时淘汰最久未访问的键），伪造大量来源也不会占满内存
+- ReplayCache：最近处理过的签名及过期时间，重复提交的签名直接拒绝，不需要再计算 HMAC 和查询数据库
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# 限流器最多跟踪的键数量
+MAX_TRACKED_KEYS = 100_000
+
+
+class SlidingWindowLimiter:
+    """每个键在 window 秒内最多 limit 次请求（limit 为 0 表示不限制）"""
+
+    def __init__(self, limit: int, window: float = 60, max_keys: int = MAX_TRACKED_KEYS):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.rejected = 0
+        # 键 -> [当前窗口起点, 当前窗口计数, 上一窗口计数]
+        self._counters: OrderedDict[str, list] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, now: Optional[float] = None) -> Optional[int]:
+        """记录一次请求；超出限制时不计数，返回建议的重试等待秒数，否则返回 None"""
+        if not self.limit:
+            return None
+        now = time.monotonic() if now is None else now
+        window_start = now - now % self.window
+
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = [window_start, 0, 0]
+                while len(self._counters) > self.max_keys:
+                    self._counters.popitem(last=False)
+            else:
+                self._counters.move_to_end(key)
+                if counter[0] != window_start:
+                    # 进入新窗口：紧接着的窗口保留上一窗口计数，间隔更久则清零
+                    previous = counter[1] if window_start - counter[0] == self.window else 0
+                    counter[:] = [window_start, 0, previous]
+
+            overlap = 1 - (now - window_start) / self.window
+            if counter[1] + counter[2] * overlap >= self.limit:
+                self.rejected += 1
+                return max(1, math.ceil(window_start + self.window - now))
+            counter[1] += 1
+            return None
+
+    def status(self) -> dict:
+        return {
+            "limit": self.limit,
+            "window": self.window,
+            "tracked_keys": len(self._counters),
+            "rejected": self.rejected,
+        }
+
+
+class ReplayCache:
+    """最近处理过的签名（有界，过期的条目在访问时清理）"""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.rejected = 0
+        # 签名 -> 过期时间（按加入顺序，过期时间单调递增）
+        self._items: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purge(self, now: float) -> None:
+        while self._items:
+            signature, expires_at = next(iter(self._items.items()))
+            if expires_at > now:
+                break
+            del self._items[signature]
+
+    def seen(self, signature: str) -> bool:
+        """签名是否在有效期内处理过"""
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            if signature in self._items:
+                self.rejected += 1
+                return True
+            return False
+
+    def add(self, signature: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            self._items[signature] = now + self.ttl
+            self._items.move_to_end(signature)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def status(self) -> dict:
+        return {"size": len(self._items), "maxsize": self.maxsize, "rejected": self.rejected}
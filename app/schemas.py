@@ -2,7 +2,7 @@
 Pydantic 数据验证模型
 """
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Literal, Optional
 from datetime import datetime
 
 
@@ -59,6 +59,15 @@ class CardResponse(CardBase):
         from_attributes = True
 
 
+class ArchivedCardResponse(CardResponse):
+    """
+    归档卡片响应模型
+
+    过期或退款后被移到归档表的卡片，字段与卡片响应相同，另外包含归档时间。
+    """
+    archived_time: Optional[datetime] = Field(None, description="归档时间（UTC）")
+
+
 class CardImportItem(BaseModel):
     """
     批量导入单条卡片数据模型
@@ -88,6 +97,9 @@ class CardImportResponse(BaseModel):
     success_count: int = Field(..., description="成功导入的卡片数量")
     failed_count: int = Field(..., description="导入失败的卡片数量")
     failed_items: list[dict] = Field(..., description="失败的卡片列表，每个元素包含 card_id（卡密）和 reason（失败原因）")
+    skipped_count: int = Field(0, description="跳过的行数（之前的导入批次中已处理过）")
+    batch_id: Optional[int] = Field(None, description="导入批次 ID")
+    duplicate: bool = Field(False, description="是否为重复提交（内容与之前的批次完全相同，返回的是上次的结果）")
     message: str = Field(..., description="结果消息（包含成功和失败的数量统计）")
 
 
@@ -120,3 +132,159 @@ class APIResponse(BaseModel):
     success: bool = Field(..., description="操作是否成功（true=成功，false=失败）")
     message: str = Field(..., description="响应消息（描述操作结果或错误信息）")
     data: Optional[dict] = Field(None, description="响应数据（可选，根据不同的接口返回不同的数据结构）")
+
+
+
+class JobCreateRequest(BaseModel):
+    """
+    创建批量任务请求模型
+
+    查询/激活/刷新任务处理 card_ids 指定的卡片；未指定时按 status/search 筛选，
+    status 也未指定时默认查询和激活未激活的卡片、刷新已激活的卡片。
+    导入任务处理 content 中的文本（格式与文本导入相同）。
+    """
+    type: Literal["query", "activate", "refresh", "import"] = Field(..., description="任务类型（query=查询，activate=激活，refresh=刷新，import=导入）")
+    card_ids: Optional[list[str]] = Field(None, description="卡密列表（可选）")
+    status: Optional[str] = Field(None, description="按状态筛选卡片（可选，未指定 card_ids 时生效）")
+    search: Optional[str] = Field(None, description="按卡密/昵称/卡号搜索卡片（可选，未指定 card_ids 时生效）")
+    content: Optional[str] = Field(None, description="导入的文本内容（导入任务必需）")
+
+
+class JobFailure(BaseModel):
+    """批量任务失败子项"""
+    payload: str = Field(..., description="子任务数据（卡密或导入的卡片数据）")
+    attempts: int = Field(..., description="已尝试次数")
+    message: Optional[str] = Field(None, description="失败原因")
+
+
+class JobResponse(BaseModel):
+    """
+    批量任务进度响应模型
+
+    throughput 为已完成子任务数/秒（从开始执行到结束或当前时间），eta_seconds 为按当前吞吐量估算的剩余时间。
+    """
+    id: int = Field(..., description="任务ID")
+    type: str = Field(..., description="任务类型（query/activate/refresh/import）")
+    status: str = Field(..., description="任务状态（pending=等待执行，running=执行中，completed=已完成，cancelled=已取消）")
+    total: int = Field(..., description="子任务总数")
+    pending: int = Field(..., description="等待执行的子任务数（包括等待重试的）")
+    running: int = Field(..., description="正在执行的子任务数")
+    succeeded: int = Field(..., description="成功的子任务数")
+    failed: int = Field(..., description="失败的子任务数（已达到最大重试次数）")
+    progress: float = Field(..., description="完成比例（0~1）")
+    throughput: Optional[float] = Field(None, description="吞吐量（子任务数/秒）")
+    eta_seconds: Optional[float] = Field(None, description="预计剩余时间（秒）")
+    created_time: datetime = Field(..., description="创建时间")
+    started_time: Optional[datetime] = Field(None, description="开始执行时间")
+    finished_time: Optional[datetime] = Field(None, description="结束时间")
+    failures: list[JobFailure] = Field(default_factory=list, description="失败的子任务（最多 20 条）")
+
+
+
+class ActivationStatsPoint(BaseModel):
+    """激活统计数据点"""
+    success: int = Field(..., description="成功次数")
+    failed: int = Field(..., description="失败次数")
+    total: int = Field(..., description="总次数")
+    success_rate: Optional[float] = Field(None, description="成功率（0~1，没有记录时为空）")
+
+
+class ActivationStatsBucket(ActivationStatsPoint):
+    """按时间桶统计的数据点"""
+    bucket_start: datetime = Field(..., description="时间桶起点（配置时区）")
+
+
+class FailureReasonCount(BaseModel):
+    """失败原因统计"""
+    reason: str = Field(..., description="失败原因")
+    count: int = Field(..., description="次数")
+
+
+class ActivationStatsResponse(BaseModel):
+    """
+    激活统计响应模型
+
+    series 按时间升序包含范围内的每个时间桶（没有记录的时间桶计数为 0）。
+    """
+    bucket: str = Field(..., description="时间桶粒度（hour/day）")
+    from_: datetime = Field(..., alias="from", description="统计起点（对齐到时间桶起点）")
+    to: datetime = Field(..., description="统计终点（不含）")
+    series: list[ActivationStatsBucket] = Field(..., description="每个时间桶的统计")
+    totals: ActivationStatsPoint = Field(..., description="范围内的总计")
+    failure_reasons: list[FailureReasonCount] = Field(..., description="失败原因排行（按次数倒序）")
+
+
+
+class SpendCardRow(BaseModel):
+    """单张卡片的额度和消费"""
+    card_id: str = Field(..., description="卡密")
+    card_number: str = Field(..., description="卡号")
+    card_limit: Optional[float] = Field(None, description="额度（美元）")
+    spent: Optional[float] = Field(None, description="消费金额（已入账 + 待处理，查询失败时为空）")
+    available: Optional[float] = Field(None, description="可用额度")
+    posted: Optional[float] = Field(None, description="已入账")
+    pending: Optional[float] = Field(None, description="待处理")
+    unavailable: Optional[float] = Field(None, description="不可用")
+    source: Optional[str] = Field(None, description="数据来源（live=实时查询，cache=缓存，stale=查询失败时返回的旧数据，空=查询失败）")
+    age_seconds: Optional[float] = Field(None, description="数据距查询时间（秒）")
+    error: Optional[str] = Field(None, description="查询失败原因")
+
+
+class SpendTotals(BaseModel):
+    """消费汇总金额（只包含查询成功的卡片）"""
+    card_limit: float = Field(..., description="总额度")
+    spent: float = Field(..., description="总消费")
+    available: float = Field(..., description="总可用额度")
+    posted: float = Field(..., description="总已入账")
+    pending: float = Field(..., description="总待处理")
+    unavailable: float = Field(..., description="总不可用")
+
+
+class SpendSummaryResponse(BaseModel):
+    """
+    消费汇总响应模型
+
+    partial 为 true 时部分卡片查询失败且没有可用缓存，这些卡片不计入 totals。
+    """
+    card_count: int = Field(..., description="参与汇总的卡片数量")
+    succeeded: int = Field(..., description="获取到余额信息的卡片数量")
+    failed: int = Field(..., description="查询失败的卡片数量")
+    partial: bool = Field(..., description="是否为部分结果")
+    totals: SpendTotals = Field(..., description="汇总金额")
+    cards: list[SpendCardRow] = Field(..., description="每张卡片的额度和消费")
+
+
+class ActivationLogItem(BaseModel):
+    """激活记录"""
+    id: int = Field(..., description="记录ID")
+    status: str = Field(..., description="激活状态（success/failed）")
+    error_message: Optional[str] = Field(None, description="错误信息")
+    activation_time: Optional[datetime] = Field(None, description="激活时间（UTC）")
+
+
+class CardLogsPart(BaseModel):
+    """卡片详情中的激活记录部分"""
+    status: Literal["ok", "timeout", "error"] = Field(..., description="加载结果（ok=成功，timeout=超时，error=失败）")
+    data: Optional[list[ActivationLogItem]] = Field(None, description="激活记录（按时间倒序，失败时为空）")
+    error: Optional[str] = Field(None, description="失败原因")
+
+
+class CardTransactionsPart(BaseModel):
+    """
+    卡片详情中的消费记录部分
+
+    实时查询超时或失败时，如果有缓存的余额信息则在 balance 中返回（source 为 stale），交易记录为空。
+    """
+    status: Literal["ok", "timeout", "error", "skipped"] = Field(..., description="加载结果（skipped=卡片未激活，不查询）")
+    source: Optional[str] = Field(None, description="余额数据来源（live=实时查询，stale=缓存的旧数据）")
+    age_seconds: Optional[float] = Field(None, description="余额数据距查询时间（秒）")
+    balance: Optional[dict] = Field(None, description="余额信息（可用额度、已入账、待处理、不可用）")
+    data: Optional[dict] = Field(None, description="上游返回的完整消费记录和余额信息（与消费记录接口的 data 相同）")
+    error: Optional[str] = Field(None, description="失败原因")
+
+
+class CardFullResponse(BaseModel):
+    """卡片详情聚合响应模型（卡片信息、激活记录、消费记录）"""
+    card: CardResponse = Field(..., description="卡片信息")
+    logs: CardLogsPart = Field(..., description="激活记录")
+    transactions: CardTransactionsPart = Field(..., description="消费记录")
@@ -0,0 +1,151 @@
+"""
+消费汇总
+
+并发查询所有已激活、未退款卡片的余额信息（并发数受限），汇总总额度和总消费。
+每张卡片的查询结果缓存在进程内：未超过 SPEND_CACHE_TTL 直接使用缓存；
+重新查询失败时，未超过 SPEND_CACHE_MAX_STALE 的旧结果仍会返回并标记为 stale。
+"""
+import asyncio
+import time
+from typing import Optional
+
+from .config import SPEND_CACHE_MAX_STALE, SPEND_CACHE_TTL, SPEND_CONCURRENCY
+from .utils.activation import get_card_transactions
+
+# 余额信息中参与汇总的金额字段
+AMOUNT_FIELDS = ("available", "posted", "pending", "unavailable")
+
+
+def _amount(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class SpendCache:
+    """卡片余额信息缓存（按卡号）"""
+
+    def __init__(self):
+        self._items: dict[str, tuple[float, dict]] = {}
+
+    def get(self, card_number: str, max_age: float) -> Optional[tuple[float, dict]]:
+        """返回 (缓存时长（秒）, 余额信息)，不存在或超过 max_age 时返回 None"""
+        item = self._items.get(card_number)
+        if item is None:
+            return None
+        age = time.monotonic() - item[0]
+        if age > max_age:
+            return None
+        return age, item[1]
+
+    def set(self, card_number: str, balance: dict) -> None:
+        self._items[card_number] = (time.monotonic(), balance)
+
+    def prune(self, max_age: float = SPEND_CACHE_MAX_STALE) -> None:
+        """删除超过最大过期时间的缓存"""
+        now = time.monotonic()
+        for card_number in [key for key, (fetched, _) in self._items.items() if now - fetched > max_age]:
+            del self._items[card_number]
+
+
+spend_cache = SpendCache()
+
+
+def remember(card_number: str, card_info: dict) -> dict:
+    """缓存从 API 获取的余额信息（消费记录接口查询后也会调用），返回缓存的余额字段"""
+    balance = {field: _amount(card_info.get(field)) for field in AMOUNT_FIELDS}
+    spend_cache.set(str(card_number), balance)
+    return balance
+
+
+async def _fetch_balance(card_number: str, max_age: float, semaphore: asyncio.Semaphore) -> dict:
+    """获取单张卡片的余额信息，返回 {余额字段..., source, age_seconds, error}"""
+    cached = spend_cache.get(card_number, max_age)
+    if cached:
+        age, balance = cached
+        return {**balance, "source": "cache", "age_seconds": round(age, 1), "error": None}
+
+    async with semaphore:
+        success, card_info, error = await get_card_transactions(card_number)
+
+    if success:
+        return {**remember(card_number, card_info), "source": "live", "age_seconds": 0.0, "error": None}
+
+    stale = spend_cache.get(card_number, SPEND_CACHE_MAX_STALE)
+    if stale:
+        age, balance = stale
+        return {**balance, "source": "stale", "age_seconds": round(age, 1), "error": error}
+    return {**{field: None for field in AMOUNT_FIELDS}, "source": None, "age_seconds": None, "error": error}
+
+
+async def fetch_card_info(card_number: str, timeout: float) -> dict:
+    """
+    实时查询单张卡片的消费记录和余额信息（最多等待 timeout 秒）
+
+    成功时更新余额缓存；超时或失败时返回缓存中的余额信息（不超过 SPEND_CACHE_MAX_STALE），
+    返回 {status, source, age_seconds, balance, data, error}
+    """
+    try:
+        success, card_info, error = await asyncio.wait_for(get_card_transactions(card_number), timeout)
+        status = "ok" if success else "error"
+    except asyncio.TimeoutError:
+        card_info, error, status = None, f"查询超时（{timeout:g} 秒）", "timeout"
+
+    if status == "ok":
+        return {
+            "status": status, "source": "live", "age_seconds": 0.0,
+            "balance": remember(card_number, card_info), "data": card_info, "error": None,
+        }
+
+    stale = spend_cache.get(card_number, SPEND_CACHE_MAX_STALE)
+    age, balance = stale if stale else (None, None)
+    return {
+        "status": status, "source": "stale" if stale else None,
+        "age_seconds": round(age, 1) if stale else None,
+        "balance": balance, "data": None, "error": error,
+    }
+
+
+async def summarize_spend(cards: list[dict], max_age: float = SPEND_CACHE_TTL, concurrency: int = SPEND_CONCURRENCY) -> dict:
+    """
+    汇总卡片的额度和消费（cards 为包含 card_id、card_number、card_limit 的字典列表）
+
+    消费 = 已入账 + 待处理。部分卡片查询失败且没有可用缓存时，这些卡片不计入金额汇总，
+    partial 为 True，对应行的 error 字段给出失败原因。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    balances = await asyncio.gather(*(
+        _fetch_balance(str(card["card_number"]), max_age, semaphore) for card in cards
+    ))
+    spend_cache.prune()
+
+    rows = []
+    totals = {"card_limit": 0.0, "spent": 0.0, **{field: 0.0 for field in AMOUNT_FIELDS}}
+    failed = 0
+    for card, balance in zip(cards, balances):
+        if balance["source"] is None:
+            failed += 1
+            spent = None
+        else:
+            spent = round(balance["posted"] + balance["pending"], 2)
+            totals["card_limit"] += _amount(card["card_limit"])
+            totals["spent"] += spent
+            for field in AMOUNT_FIELDS:
+                totals[field] += balance[field]
+        rows.append({
+            "card_id": card["card_id"],
+            "card_number": card["card_number"],
+            "card_limit": card["card_limit"],
+            "spent": spent,
+            **balance,
+        })
+
+    return {
+        "card_count": len(cards),
+        "succeeded": len(cards) - failed,
+        "failed": failed,
+        "partial": failed > 0,
+        "totals": {name: round(value, 2) for name, value in totals.items()},
+        "cards": rows,
+    }
@@ -0,0 +1,77 @@
+"""
+应用启动流程
+在 lifespan 中执行一次：检查表结构并迁移、预热模板缓存、数据库连接和上游连接池。
+每个步骤的耗时都会记录下来，便于排查冷启动慢的问题。
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+from . import models
+from .database import IS_POSTGRES, engine, get_data_dir
+from .migrations import run_migrations
+
+# PostgreSQL 启动初始化 advisory lock 的键（任意固定的 64 位整数）
+STARTUP_LOCK_KEY = 0x4D697361
+
+
+@contextmanager
+def timed(timings: dict, name: str):
+    """记录代码块耗时（毫秒）到 timings[name]"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = (time.perf_counter() - start) * 1000
+
+
+@contextmanager
+def startup_lock():
+    """
+    启动初始化锁
+
+    多 worker 部署时所有进程同时启动，用锁保证表结构创建和迁移串行执行。
+    PostgreSQL 使用 advisory lock（多台主机共享同一个数据库时同样有效），
+    SQLite 使用数据目录下的文件锁，不支持 fcntl 的平台（Windows）只能单进程运行，直接跳过。
+    """
+    if IS_POSTGRES:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": STARTUP_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": STARTUP_LOCK_KEY})
+        return
+
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+
+    with open(os.path.join(get_data_dir(), ".misacard-startup.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def init_schema() -> list[str]:
+    """创建缺失的表并执行列迁移，返回新增的列"""
+    models.Base.metadata.create_all(bind=engine)
+    return run_migrations(engine)
+
+
+def warm_up_database() -> None:
+    """预先建立数据库连接并加载表结构（放回连接池供后续请求复用）"""
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT COUNT(*) FROM cards"))
+
+
+def format_timings(timings: dict) -> str:
+    """格式化耗时，如 "schema 12.3ms, templates 45.6ms"""
+    return ", ".join(f"{name} {ms:.1f}ms" for name, ms in timings.items())
@@ -0,0 +1,170 @@
+"""
+激活统计
+
+写入 activation_logs 时在同一事务内按小时、状态和失败原因累加到 activation_rollups，
+统计接口只读取汇总表，耗时与日志总量无关。按天统计时把所在日期（配置时区）的小时汇总相加。
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import APP_TIMEZONE
+from .database import SessionLocal, insert_ignore
+from .expiry import now_epoch
+
+BUCKET_SECONDS = {"hour": 3600, "day": 86400}
+
+# 单次查询最多返回的时间桶数量
+MAX_BUCKETS = 1000
+
+# 失败原因最大长度（超出部分截断，避免上游返回的长错误信息产生过多不同的汇总行）
+MAX_REASON_LENGTH = 120
+
+# 配置时区相对 UTC 的偏移（秒），按天统计时以配置时区的零点为起点
+_TZ_OFFSET = int(APP_TIMEZONE.utcoffset(None).total_seconds())
+
+
+def bucket_start(ts: int, bucket: str = "hour") -> int:
+    """时间戳所在时间桶的起点（按天时对齐到配置时区的零点）"""
+    size = BUCKET_SECONDS[bucket]
+    offset = _TZ_OFFSET if bucket == "day" else 0
+    return (ts + offset) // size * size - offset
+
+
+def normalize_reason(status: str, error_message: Optional[str]) -> str:
+    """汇总使用的失败原因（成功记录为空字符串）"""
+    if status != "failed":
+        return ""
+    reason = (error_message or "").strip() or "未知错误"
+    return reason[:MAX_REASON_LENGTH]
+
+
+def add_to_rollup(conn, bucket: int, status: str, reason: str, count: int = 1) -> None:
+    """
+    累加汇总计数（在调用方的事务中执行）
+
+    单条 INSERT ... ON CONFLICT DO UPDATE：PostgreSQL 多个 worker 同时写入新时间桶时
+    不会因为都先查到 0 行再插入而违反主键约束
+    """
+    stmt = insert_ignore(models.ActivationRollup).values(
+        bucket_start=bucket, status=status, reason=reason, count=count
+    )
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=[
+            models.ActivationRollup.bucket_start, models.ActivationRollup.status, models.ActivationRollup.reason
+        ],
+        set_={"count": models.ActivationRollup.count + stmt.excluded.count}
+    ))
+
+
+def _log_timestamp(activation_time: Optional[datetime]) -> int:
+    """激活记录时间转换为 UTC 时间戳（由数据库默认值 CURRENT_TIMESTAMP 写入，无时区时为 UTC）"""
+    if activation_time is None:
+        return now_epoch()
+    if activation_time.tzinfo is None:
+        activation_time = activation_time.replace(tzinfo=timezone.utc)
+    return int(activation_time.timestamp())
+
+
+def rollups_missing(conn) -> bool:
+    """汇总表为空但已有激活记录（首次升级到带汇总表的版本）"""
+    has_rollups = conn.execute(select(models.ActivationRollup.bucket_start).limit(1)).first()
+    has_logs = conn.execute(select(models.ActivationLog.id).limit(1)).first()
+    return has_rollups is None and has_logs is not None
+
+
+def rebuild_rollups(conn) -> int:
+    """根据 activation_logs 重建汇总表（升级时执行一次），返回处理的日志数"""
+    conn.execute(models.ActivationRollup.__table__.delete())
+    rows = conn.execute(
+        select(models.ActivationLog.activation_time, models.ActivationLog.status, models.ActivationLog.error_message)
+    )
+    totals: dict[tuple, int] = {}
+    processed = 0
+    for activation_time, status, error_message in rows:
+        key = (bucket_start(_log_timestamp(activation_time)), status, normalize_reason(status, error_message))
+        totals[key] = totals.get(key, 0) + 1
+        processed += 1
+    for (bucket, status, reason), count in totals.items():
+        add_to_rollup(conn, bucket, status, reason, count)
+    return processed
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _track_activation_logs(session, flush_context, instances):
+    """新增激活记录时累加当前小时的汇总计数"""
+    logs = [obj for obj in session.new if isinstance(obj, models.ActivationLog)]
+    if not logs:
+        return
+
+    bucket = bucket_start(now_epoch())
+    totals: dict[tuple, int] = {}
+    for log in logs:
+        key = (log.status, normalize_reason(log.status, log.error_message))
+        totals[key] = totals.get(key, 0) + 1
+
+    conn = session.connection()
+    for (status, reason), count in totals.items():
+        add_to_rollup(conn, bucket, status, reason, count)
+
+
+def get_activation_stats(db: Session, bucket: str, start: int, end: int) -> dict:
+    """
+    读取 [start, end) 时间范围内的激活统计
+
+    返回每个时间桶的成功/失败数量和成功率（没有记录的时间桶补 0）、总计以及失败原因排行
+    """
+    size = BUCKET_SECONDS[bucket]
+    first = bucket_start(start, bucket)
+
+    rows = db.execute(
+        select(
+            models.ActivationRollup.bucket_start,
+            models.ActivationRollup.status,
+            models.ActivationRollup.reason,
+            models.ActivationRollup.count
+        ).where(
+            models.ActivationRollup.bucket_start >= first,
+            models.ActivationRollup.bucket_start < end
+        )
+    ).all()
+
+    series = {
+        ts: {"success": 0, "failed": 0}
+        for ts in range(first, end, size)
+    }
+    reasons: dict[str, int] = {}
+    for hour, status, reason, count in rows:
+        counts = series.get(bucket_start(hour, bucket))
+        if counts is None or status not in counts:
+            continue
+        counts[status] += count
+        if reason:
+            reasons[reason] = reasons.get(reason, 0) + count
+
+    def with_rate(counts: dict) -> dict:
+        total = counts["success"] + counts["failed"]
+        return {**counts, "total": total, "success_rate": round(counts["success"] / total, 4) if total else None}
+
+    totals = {"success": 0, "failed": 0}
+    for counts in series.values():
+        totals["success"] += counts["success"]
+        totals["failed"] += counts["failed"]
+
+    return {
+        "bucket": bucket,
+        "from": datetime.fromtimestamp(first, APP_TIMEZONE),
+        "to": datetime.fromtimestamp(end, APP_TIMEZONE),
+        "series": [
+            {"bucket_start": datetime.fromtimestamp(ts, APP_TIMEZONE), **with_rate(counts)}
+            for ts, counts in series.items()
+        ],
+        "totals": with_rate(totals),
+        "failure_reasons": [
+            {"reason": reason, "count": count}
+            for reason, count in sorted(reasons.items(), key=lambda item: item[1], reverse=True)
+        ],
+    }
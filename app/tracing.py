@@ -0,0 +1,379 @@
+"""
+请求追踪
+
+在路由、crud 函数、SQL 语句和上游 API 调用外记录 span，定位耗时花在哪一步：
+- 当前 span 保存在 contextvars 中，asyncio 创建任务和 asyncio.to_thread 会复制上下文，
+  批量任务中并发执行的子任务自动归属到所在任务的 trace
+- 是否采样在 trace 的根 span 决定（TRACING_SAMPLE_RATE），未采样的 trace 内不再创建 span；
+  请求带有 W3C traceparent 头时沿用上游的 trace ID，但是否采样仍按 TRACING_SAMPLE_RATE 决定
+  （公共接口的客户端可以伪造 traceparent，不能由它强制采样）
+- 结束的 span 放入队列，由后台线程批量写入 JSONL 文件或发送到 OTLP/HTTP（JSON）collector
+
+未配置 TRACING_EXPORTER 时不注册 SQL 事件和中间件，traced 直接返回原函数，没有额外开销。
+"""
+import functools
+import inspect
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+import httpx
+import orjson
+
+from .config import (
+    TRACING_EXPORTER, TRACING_FILE, TRACING_OTLP_ENDPOINT, TRACING_SAMPLE_RATE, TRACING_SERVICE_NAME
+)
+
+ENABLED = TRACING_EXPORTER in ("jsonl", "otlp")
+
+# 单批导出的最大 span 数、导出线程的刷新间隔（秒）、队列容量（满时丢弃新 span）
+EXPORT_BATCH_SIZE = 512
+EXPORT_INTERVAL = 2.0
+QUEUE_SIZE = 10000
+
+# SQL 语句属性的最大长度
+MAX_STATEMENT_LENGTH = 500
+
+# OTLP 的 span 类型编号
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    """一次操作的耗时记录"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, kind: str, attributes: dict):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+
+    def set(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        """JSONL 导出格式"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _Unsampled:
+    """未采样 trace 的上下文标记（其中不再创建 span）"""
+
+    __slots__ = ("trace_id", "span_id")
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+
+_current: ContextVar = ContextVar("trace_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    """当前正在记录的 span（不在已采样的 trace 中时返回 None）"""
+    span = _current.get()
+    return span if isinstance(span, Span) else None
+
+
+def set_attributes(**attributes) -> None:
+    """给当前 span 添加属性（没有正在记录的 span 时忽略）"""
+    span = current_span()
+    if span is not None:
+        span.attributes.update(attributes)
+
+
+# ============================================
+# 导出
+# ============================================
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_payload(spans: list[Span]) -> dict:
+    """OTLP/HTTP JSON 格式的导出请求"""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACING_SERVICE_NAME}}]},
+        "scopeSpans": [{
+            "scope": {"name": "app.tracing"},
+            "spans": [{
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or "",
+                "name": span.name,
+                "kind": SPAN_KINDS[span.kind],
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            } for span in spans],
+        }],
+    }]}
+
+
+class Exporter:
+    """后台线程批量导出结束的 span"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.queue: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def submit(self, span: Span) -> None:
+        if self._thread is None:
+            self.start()
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        """停止导出线程（导出队列中剩余的 span）"""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout=EXPORT_INTERVAL * 2)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not (self._stopping.is_set() and self.queue.empty()):
+            batch = []
+            try:
+                batch.append(self.queue.get(timeout=EXPORT_INTERVAL))
+                while len(batch) < EXPORT_BATCH_SIZE:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            if batch:
+                try:
+                    self.export(batch)
+                except Exception as e:
+                    print(f"⚠️  导出追踪数据失败: {e}")
+
+    def export(self, spans: list[Span]) -> None:
+        if self.kind == "otlp":
+            httpx.post(
+                TRACING_OTLP_ENDPOINT,
+                content=orjson.dumps(_otlp_payload(spans)),
+                headers={"Content-Type": "application/json"},
+                timeout=5.0
+            ).raise_for_status()
+        else:
+            with open(TRACING_FILE, "ab") as f:
+                f.write(b"".join(orjson.dumps(span.to_dict(), default=str) + b"\n" for span in spans))
+
+
+exporter = Exporter(TRACING_EXPORTER)
+
+
+def shutdown() -> None:
+    if ENABLED:
+        exporter.shutdown()
+
+
+# ============================================
+# 创建 span
+# ============================================
+
+def _new_trace(traceparent: Optional[str] = None):
+    """根 span 的 (trace ID, 上游 span ID, 是否采样)；上游的采样标志不可信，采样始终按 TRACING_SAMPLE_RATE"""
+    sampled = random.random() < TRACING_SAMPLE_RATE
+    match = TRACEPARENT_PATTERN.match(traceparent or "")
+    if match:
+        trace_id, parent_id, _ = match.groups()
+        return trace_id, parent_id, sampled
+    return os.urandom(16).hex(), None, sampled
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", traceparent: Optional[str] = None, **attributes):
+    """
+    记录一个 span（未启用追踪或所在 trace 未采样时返回 None）
+
+    没有当前 span 时作为根 span 决定是否采样，traceparent 为上游传入的 W3C trace 上下文。
+    """
+    if not ENABLED:
+        yield None
+        return
+
+    parent = _current.get()
+    if parent is None:
+        trace_id, parent_id, sampled = _new_trace(traceparent)
+        if not sampled:
+            token = _current.set(_Unsampled(trace_id, parent_id))
+            try:
+                yield None
+            finally:
+                _current.reset(token)
+            return
+    elif isinstance(parent, _Unsampled):
+        yield None
+        return
+    else:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+
+    current = Span(trace_id, parent_id, name, kind, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        current.end_ns = time.time_ns()
+        exporter.submit(current)
+
+
+def traced(name: Optional[str] = None, kind: str = "internal") -> Callable:
+    """
+    装饰器：在函数调用外记录 span（支持 async 函数），默认名称为 "模块名.函数名"
+
+    未启用追踪时直接返回原函数。
+    """
+    def decorator(func: Callable) -> Callable:
+        if not ENABLED:
+            return func
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, kind):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+# ============================================
+# SQL 语句
+# ============================================
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = current_span()
+    if parent is None:
+        return
+    sql = Span(parent.trace_id, parent.span_id, "sql", "client", {
+        "db.statement": statement[:MAX_STATEMENT_LENGTH],
+        "db.executemany": executemany,
+    })
+    context._trace_span = sql
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    sql = getattr(context, "_trace_span", None)
+    if sql is None:
+        return
+    sql.end_ns = time.time_ns()
+    if cursor.rowcount is not None and cursor.rowcount >= 0:
+        sql.set("db.rowcount", cursor.rowcount)
+    exporter.submit(sql)
+
+
+def _handle_error(exception_context):
+    context = exception_context.execution_context
+    sql = getattr(context, "_trace_span", None) if context is not None else None
+    if sql is None:
+        return
+    sql.end_ns = time.time_ns()
+    sql.error = f"{type(exception_context.original_exception).__name__}: {exception_context.original_exception}"
+    exporter.submit(sql)
+
+
+def instrument_engine(engine) -> None:
+    """为数据库引擎的每条 SQL 语句记录 span（只在已采样的 trace 中）"""
+    if not ENABLED:
+        return
+    from sqlalchemy import event
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# ============================================
+# 路由
+# ============================================
+
+class TracingMiddleware:
+    """
+    为每个 HTTP 请求记录根 span（名称为 "方法 路由模板"，记录响应状态码）
+
+    不记录原始请求路径：路径中包含卡密（公共同步接口也是），只记录路由模板（如 /api/cards/{card_id}），
+    没有匹配到路由的请求只记录方法。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for key, value in scope.get("headers", ()):
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        with span(scope["method"], "server", traceparent, **{"http.method": scope["method"]}) as request_span:
+            if request_span is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_wrapper(message) -> None:
+                if message["type"] == "http.response.start":
+                    request_span.set("http.status_code", message["status"])
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None and getattr(route, "path", None):
+                    request_span.name = f"{scope['method']} {route.path}"
+                    request_span.set("http.route", route.path)
@@ -2,29 +2,63 @@ import httpx
 from typing import Optional, Dict, Tuple
 
 from ..config import MISACARD_API_BASE_URL, MISACARD_API_HEADERS
+from ..tracing import traced
 
 
 API_BASE_URL = MISACARD_API_BASE_URL
 API_HEADERS = MISACARD_API_HEADERS
 
+# 上游 API 共享客户端（复用连接池，避免每次请求都重新建立 TCP/TLS 连接）
+_http_client: Optional[httpx.AsyncClient] = None
 
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享的上游 HTTP 客户端（首次使用时创建）"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            follow_redirects=True,
+            verify=False
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """关闭共享客户端（应用关闭时调用）"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def warm_up_http_client(timeout: float = 3.0) -> bool:
+    """预先建立到上游 API 的连接，失败不影响启动"""
+    try:
+        await get_http_client().head(API_BASE_URL, timeout=timeout)
+        return True
+    except httpx.HTTPError:
+        return False
+
+
+@traced(kind="client")
 async def query_card_from_api(card_id: str) -> Tuple[bool, Optional[Dict], Optional[str]]:
     try:
-        timeout = httpx.Timeout(30.0, connect=10.0)
-        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True, verify=False) as client:
-            response = await client.get(
-                f"{API_BASE_URL}/api/card/{card_id}",
-                headers=API_HEADERS
-            )
-
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("result"):
-                    return True, data["result"], None
-                else:
-                    return False, None, data.get("msg") or "卡片不存在"
+        client = get_http_client()
+        response = await client.get(
+            f"{API_BASE_URL}/api/card/{card_id}",
+            headers=API_HEADERS
+        )
+
+        if response.status_code == 200:
+            data = response.json()
+            if data.get("result"):
+                return True, data["result"], None
             else:
-                return False, None, f"API 请求失败: {response.status_code}"
+                return False, None, data.get("msg") or "卡片不存在"
+        else:
+            return False, None, f"API 请求失败: {response.status_code}"
 
     except httpx.TimeoutException as e:
         return False, None, f"请求超时: {str(e)}"
@@ -34,23 +68,23 @@ async def query_card_from_api(card_id: str) -> Tuple[bool, Optional[Dict], Optio
         return False, None, f"查询失败: {str(e)}"
 
 
+@traced(kind="client")
 async def activate_card_via_api(card_id: str) -> Tuple[bool, Optional[Dict], Optional[str]]:
     try:
-        timeout = httpx.Timeout(30.0, connect=10.0)
-        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True, verify=False) as client:
-            response = await client.post(
-                f"{API_BASE_URL}/api/card/activate/{card_id}",
-                headers=API_HEADERS
-            )
-
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("result"):
-                    return True, data["result"], None
-                else:
-                    return False, None, data.get("msg") or "激活失败"
+        client = get_http_client()
+        response = await client.post(
+            f"{API_BASE_URL}/api/card/activate/{card_id}",
+            headers=API_HEADERS
+        )
+
+        if response.status_code == 200:
+            data = response.json()
+            if data.get("result"):
+                return True, data["result"], None
             else:
-                return False, None, f"激活请求失败: {response.status_code}"
+                return False, None, data.get("msg") or "激活失败"
+        else:
+            return False, None, f"激活请求失败: {response.status_code}"
 
     except httpx.TimeoutException as e:
         return False, None, f"激活超时: {str(e)}"
@@ -68,6 +102,7 @@ def is_card_unactivated(card_data: Dict) -> bool:
     )
 
 
+@traced()
 async def auto_activate_if_needed(card_id: str) -> Tuple[bool, Optional[Dict], str]:
     # 步骤1: 查询卡片
     success, card_data, error = await query_card_from_api(card_id)
@@ -102,23 +137,23 @@ def extract_card_info(api_response: Dict) -> Dict:
     }
 
 
+@traced(kind="client")
 async def get_card_transactions(card_number: str) -> Tuple[bool, Optional[Dict], Optional[str]]:
     try:
-        timeout = httpx.Timeout(30.0, connect=10.0)
-        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True, verify=False) as client:
-            response = await client.get(
-                f"{API_BASE_URL}/api/m/get_card_info/{card_number}",
-                headers=API_HEADERS
-            )
-
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("result"):
-                    return True, data["result"], None
-                else:
-                    return False, None, data.get("msg") or "无法获取卡片信息"
+        client = get_http_client()
+        response = await client.get(
+            f"{API_BASE_URL}/api/m/get_card_info/{card_number}",
+            headers=API_HEADERS
+        )
+
+        if response.status_code == 200:
+            data = response.json()
+            if data.get("result"):
+                return True, data["result"], None
             else:
-                return False, None, f"API 请求失败: {response.status_code}"
+                return False, None, data.get("msg") or "无法获取卡片信息"
+        else:
+            return False, None, f"API 请求失败: {response.status_code}"
 
     except httpx.TimeoutException as e:
         return False, None, f"请求超时: {str(e)}"
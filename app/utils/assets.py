@@ -0,0 +1,168 @@
+"""
+页面与静态资源的压缩和缓存
+- 上下文固定的页面只渲染一次，缓存原始内容和 gzip 压缩内容
+- 静态文件支持预压缩的 .gz 版本
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Callable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from fastapi.templating import Jinja2Templates
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from ..versioning import etag_matches
+
+# 静态资源：短期缓存
+STATIC_CACHE_CONTROL = "public, max-age=3600"
+
+# 需要预压缩的文件类型（图片等已压缩格式不处理）
+COMPRESSIBLE_EXTENSIONS = {".html", ".css", ".js", ".mjs", ".json", ".svg", ".txt", ".xml", ".map", ".ico"}
+
+
+def accepts_gzip(headers) -> bool:
+    """客户端是否接受 gzip 编码"""
+    return "gzip" in headers.get("accept-encoding", "").lower()
+
+
+# ============================================
+# 页面缓存
+# ============================================
+
+class RenderedPage:
+    """预渲染的页面（原始内容、gzip 压缩内容及各自的 ETag）"""
+    __slots__ = ("body", "gzip_body", "etag", "gzip_etag", "mtime")
+
+    def __init__(self, body: bytes, mtime: Optional[float] = None):
+        digest = hashlib.sha1(body).hexdigest()[:24]
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=9)
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gz"'
+        self.mtime = mtime
+
+
+class PageCache:
+    """
+    模板渲染结果缓存
+
+    用于上下文固定的页面：首次访问时渲染一次，之后直接返回缓存的内容。
+    check_mtime 为 True 时（DEBUG 模式）会检查模板文件的修改时间，修改后自动重新渲染。
+    """
+
+    def __init__(self, templates: Jinja2Templates, check_mtime: bool = False):
+        self.templates = templates
+        self.check_mtime = check_mtime
+        self._pages: dict[str, RenderedPage] = {}
+
+    def _template_mtime(self, name: str) -> Optional[float]:
+        filename = self.templates.env.get_template(name).filename
+        return os.path.getmtime(filename) if filename else None
+
+    def get(self, name: str, context_factory: Callable[[], dict]) -> RenderedPage:
+        """获取页面（未缓存或模板已修改时重新渲染）"""
+        page = self._pages.get(name)
+        mtime = self._template_mtime(name) if self.check_mtime else None
+        if page is None or page.mtime != mtime:
+            template = self.templates.get_template(name)
+            page = RenderedPage(template.render(**context_factory()).encode("utf-8"), mtime)
+            self._pages[name] = page
+        return page
+
+    def response(
+        self,
+        request: Request,
+        name: str,
+        context_factory: Callable[[], dict] = dict,
+        cache_control: str = "no-cache"
+    ) -> Response:
+        """返回页面响应（支持 If-None-Match 和 gzip）"""
+        page = self.get(name, context_factory)
+        use_gzip = accepts_gzip(request.headers)
+        etag = page.gzip_etag if use_gzip else page.etag
+        headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(page.gzip_body, media_type="text/html", headers=headers)
+        return Response(page.body, media_type="text/html", headers=headers)
+
+    def clear(self) -> None:
+        self._pages.clear()
+
+
+# ============================================
+# 静态资源
+# ============================================
+
+def precompress_static(directory: str, minimum_size: int = 1024) -> int:
+    """
+    为静态目录中可压缩的文件生成 .gz 版本（已存在且不旧于原文件时跳过）
+
+    返回新生成的文件数量
+    """
+    count = 0
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            if os.path.splitext(filename)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(root, filename)
+            gz_path = path + ".gz"
+            try:
+                stat = os.stat(path)
+                if stat.st_size < minimum_size:
+                    continue
+                if os.path.exists(gz_path) and os.path.getmtime(gz_path) >= stat.st_mtime:
+                    continue
+                with open(path, "rb") as src:
+                    data = gzip.compress(src.read(), compresslevel=9)
+                with open(gz_path, "wb") as dst:
+                    dst.write(data)
+                count += 1
+            except OSError:
+                # 静态目录只读时跳过，运行时回退到动态压缩
+                continue
+    return count
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    带缓存和预压缩支持的静态文件服务
+
+    - 客户端支持 gzip 且存在预压缩的 .gz 文件时直接返回压缩版本
+    - 统一返回短期缓存头（Cache-Control）
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        response = None
+
+        if accepts_gzip(request_headers) and not str(full_path).endswith(".gz"):
+            gz_path = f"{full_path}.gz"
+            try:
+                gz_stat = os.stat(gz_path)
+            except OSError:
+                gz_stat = None
+            if gz_stat and gz_stat.st_mtime >= stat_result.st_mtime:
+                media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+                response = FileResponse(
+                    gz_path, status_code=status_code, stat_result=gz_stat, media_type=media_type
+                )
+                response.headers["Content-Encoding"] = "gzip"
+                if self.is_not_modified(response.headers, request_headers):
+                    response = NotModifiedResponse(response.headers)
+
+        if response is None:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+
+        response.headers["Cache-Control"] = STATIC_CACHE_CONTROL
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
@@ -0,0 +1,60 @@
+"""
+卡片导出编码
+把逐行产生的字典编码为 CSV 或 JSONL 字节块，供 StreamingResponse 使用
+"""
+import csv
+import io
+from datetime import datetime
+from typing import Iterable, Iterator
+
+import orjson
+
+# 每个输出块包含的行数
+CHUNK_ROWS = 500
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+}
+
+
+def _csv_value(value):
+    """CSV 单元格格式：时间用 ISO 格式，空值为空字符串"""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(rows: Iterable[dict], fields: list[str]) -> Iterator[bytes]:
+    """编码为 CSV（带 UTF-8 BOM，方便 Excel 直接打开）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    buffer.write("\ufeff")
+    writer.writerow(fields)
+
+    count = 0
+    for row in rows:
+        writer.writerow([_csv_value(row[name]) for name in fields])
+        count += 1
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue().encode("utf-8")
+
+
+def iter_jsonl(rows: Iterable[dict]) -> Iterator[bytes]:
+    """编码为 JSON Lines（每行一个 JSON 对象）"""
+    chunk = []
+    for row in rows:
+        chunk.append(orjson.dumps(row))
+        if len(chunk) >= CHUNK_ROWS:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
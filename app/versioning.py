@@ -0,0 +1,147 @@
+"""
+数据版本与 ETag 支持
+
+每次写入 cards 表时，会在同一事务内递增 data_versions 表中的全局版本号，
+并把新的版本号记录到被修改行的 row_version 上。版本号保存在数据库中，
+因此多个 worker 进程共享同一个版本，可以安全地用于生成 ETag。
+"""
+import hashlib
+from collections import OrderedDict
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal, insert_ignore
+
+# 卡片数据集名称
+CARDS = "cards"
+
+
+def _connection(db):
+    """Session 返回其底层连接，Connection 原样返回"""
+    return db.connection() if isinstance(db, Session) else db
+
+
+def bump_data_version(db, name: str = CARDS) -> int:
+    """
+    递增指定数据集的版本号（在调用方的事务中执行）
+
+    单条 INSERT ... ON CONFLICT DO UPDATE ... RETURNING，版本行不存在时创建，
+    并发写入时也不会违反主键约束。返回递增后的版本号
+    """
+    stmt = insert_ignore(models.DataVersion).values(name=name, version=1)
+    return _connection(db).execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.DataVersion.name],
+            set_={"version": models.DataVersion.version + 1}
+        ).returning(models.DataVersion.version)
+    ).scalar_one()
+
+
+def get_data_version(db, name: str = CARDS) -> int:
+    """读取指定数据集的当前版本号（不存在时为 0）"""
+    version = _connection(db).execute(
+        select(models.DataVersion.version).where(models.DataVersion.name == name)
+    ).scalar()
+    return version or 0
+
+
+def ensure_data_versions(conn) -> None:
+    """确保所有数据集的版本行存在（启动时调用）"""
+    existing = set(conn.execute(select(models.DataVersion.name)).scalars())
+    if CARDS not in existing:
+        conn.execute(insert(models.DataVersion).values(name=CARDS, version=0))
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _track_card_writes(session, flush_context, instances):
+    """ORM 写入 cards 时自动递增全局版本号并更新行版本"""
+    changed = [obj for obj in session.new if isinstance(obj, models.Card)]
+    changed += [
+        obj for obj in session.dirty
+        if isinstance(obj, models.Card) and session.is_modified(obj)
+    ]
+    deleted = any(isinstance(obj, models.Card) for obj in session.deleted)
+    if not changed and not deleted:
+        return
+
+    version = bump_data_version(session)
+    for card in changed:
+        card.row_version = version
+
+
+class VersionedCache:
+    """
+    按数据版本失效的进程内缓存
+
+    多 worker 部署时每个进程各有一份缓存。任一进程写入 cards 后 data_versions
+    中的版本号递增，其他进程在下一次 sync() 时发现版本变化，清空本地缓存。
+    """
+
+    def __init__(self, name: str = CARDS, maxsize: int = 128):
+        self.name = name
+        self.maxsize = maxsize
+        self.version: Optional[int] = None
+        self._items: OrderedDict = OrderedDict()
+
+    def sync(self, version: int) -> None:
+        """传入当前数据版本，版本变化时清空缓存"""
+        if version != self.version:
+            self._items.clear()
+            self.version = version
+
+    def get(self, key, default=None) -> Any:
+        if key not in self._items:
+            return default
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def set(self, key, value) -> None:
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+
+# ============================================
+# ETag 工具函数
+# ============================================
+
+def make_etag(*parts) -> str:
+    """根据版本号和请求参数生成强 ETag"""
+    raw = ":".join("" if part is None else str(part) for part in parts)
+    return '"' + hashlib.sha1(raw.encode()).hexdigest()[:24] + '"'
+
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    """检查请求的 If-None-Match 是否与 ETag 匹配"""
+    if not etag:
+        return False
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def set_etag(response: Response, etag: str) -> None:
+    """设置 ETag，并要求客户端每次使用前重新验证"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+
+
+def not_modified(etag: str) -> Response:
+    """返回 304 Not Modified 响应"""
+    response = Response(status_code=304)
+    set_etag(response, etag)
+    return response
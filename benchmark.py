@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+"""
+性能基准测试脚本
+在临时数据库中生成测试数据，对比关键路径优化前后的耗时
+
+默认使用临时 SQLite 数据库；--backend postgres 在临时目录中启动一个本地 PostgreSQL 实例
+（需要 initdb / pg_ctl，或用 --postgres-url 指定专用于测试的空数据库），--backend both 依次测试两种数据库。
+"""
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+
+def setup_environment(database_url: str):
+    """使用临时数据库，并为必需的配置项提供默认值"""
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("ADMIN_PASSWORD", "benchmark")
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+    if not os.environ.get("MISACARD_API_CONFIGS"):
+        os.environ.setdefault("MISACARD_API_TOKEN", "benchmark-token-0000000000")
+
+
+def find_postgres_tool(name: str) -> str:
+    """查找 PostgreSQL 命令（Debian/Ubuntu 的 initdb、pg_ctl 不在 PATH 中）"""
+    path = shutil.which(name) or next(iter(sorted(glob.glob(f"/usr/lib/postgresql/*/bin/{name}"), reverse=True)), None)
+    if path is None:
+        sys.exit(f"❌ 未找到 {name}，请安装 PostgreSQL 服务端，或使用 --postgres-url 指定已有数据库")
+    return path
+
+
+@contextmanager
+def local_postgres(tmp_dir: str):
+    """在临时目录中初始化并启动 PostgreSQL（只监听 Unix socket），结束时停止"""
+    data_dir = os.path.join(tmp_dir, "pgdata")
+    pg_ctl = find_postgres_tool("pg_ctl")
+    subprocess.run(
+        [find_postgres_tool("initdb"), "-D", data_dir, "-U", "postgres", "-A", "trust"],
+        check=True, capture_output=True
+    )
+    subprocess.run(
+        [pg_ctl, "-D", data_dir, "-l", os.path.join(tmp_dir, "postgres.log"), "-w",
+         "-o", f"-k {tmp_dir} -c listen_addresses=''", "start"],
+        check=True, capture_output=True
+    )
+    try:
+        yield f"postgresql+psycopg://postgres@/postgres?host={tmp_dir}"
+    finally:
+        subprocess.run([pg_ctl, "-D", data_dir, "-m", "fast", "-w", "stop"], capture_output=True)
+
+
+def best_of(func, repeat: int) -> float:
+    """重复执行 repeat 次，返回最短耗时（毫秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def seed_cards(total: int):
+    """
+    补充测试卡片到 total 张（已激活卡片，所有列都有值）
+
+    一半为已过期卡片，另一半的过期时间均匀分布在未来 30 天内
+    """
+    import uuid
+    from datetime import datetime
+    from sqlalchemy import func, insert, select
+    from app import expiry, models
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        existing = db.execute(select(func.count(models.Card.id))).scalar()
+        now = datetime.now()
+        now_ts = expiry.now_epoch()
+
+        def exp_ts(i):
+            offset = (i // 2 % 720 + 1) * 3600
+            return now_ts - offset if i % 2 == 0 else now_ts + offset
+
+        rows = [
+            {
+                "card_id": f"mio-{uuid.uuid4()}",
+                "card_nickname": f"bench-{i}",
+                "card_number": f"{4000000000000000 + i}",
+                "card_cvc": f"{i % 1000:03d}",
+                "card_exp_date": "11/31",
+                "billing_address": "1 Benchmark Street, Test City, CA 90000, US",
+                "card_limit": 10.0,
+                "validity_hours": 24,
+                "status": "expired" if i % 2 == 0 else "active",
+                "is_activated": True,
+                "create_time": now,
+                "card_activation_time": now,
+                "exp_ts": exp_ts(i),
+                "exp_date": expiry.epoch_to_local(exp_ts(i)),
+                "refund_requested": False,
+            }
+            for i in range(existing, total)
+        ]
+        if rows:
+            db.execute(insert(models.Card), rows)
+            db.commit()
+    finally:
+        db.close()
+
+
+def bench_list(sizes: list[int], repeat: int):
+    """卡片列表：ORM + Pydantic + json 与 列查询 + orjson 对比"""
+    import json
+    import orjson
+    from fastapi.encoders import jsonable_encoder
+    from app import crud, schemas
+    from app.database import SessionLocal
+
+    def orm_path(limit):
+        db = SessionLocal()
+        try:
+            cards = crud.get_cards(db, limit=limit)
+            data = [schemas.CardResponse.model_validate(card) for card in cards]
+            json.dumps(jsonable_encoder(data), ensure_ascii=False).encode()
+        finally:
+            db.close()
+
+    def fast_path(limit):
+        db = SessionLocal()
+        try:
+            orjson.dumps(crud.get_card_rows(db, limit=limit))
+        finally:
+            db.close()
+
+    print(f"{'行数':>8} {'ORM+Pydantic(ms)':>18} {'列查询+orjson(ms)':>18} {'加速比':>8}")
+    for size in sizes:
+        seed_cards(size)
+        before = best_of(lambda: orm_path(size), repeat)
+        after = best_of(lambda: fast_path(size), repeat)
+        print(f"{size:>8} {before:>18.1f} {after:>18.1f} {before / after:>7.1f}x")
+
+
+def bench_fields(sizes: list[int], repeat: int):
+    """稀疏字段：全部字段 与 fields=card_id,card_number 的耗时和响应体积对比"""
+    import orjson
+    from app import crud
+    from app.database import SessionLocal
+
+    def encode(limit, fields=None):
+        db = SessionLocal()
+        try:
+            return orjson.dumps(crud.get_card_rows(db, limit=limit, fields=fields))
+        finally:
+            db.close()
+
+    narrow = ["card_id", "card_number"]
+    print(f"{'行数':>8} {'全部字段(ms)':>14} {'体积(KB)':>10} {'两个字段(ms)':>14} {'体积(KB)':>10}")
+    for size in sizes:
+        seed_cards(size)
+        full_ms = best_of(lambda: encode(size), repeat)
+        narrow_ms = best_of(lambda: encode(size, narrow), repeat)
+        full_kb = len(encode(size)) / 1024
+        narrow_kb = len(encode(size, narrow)) / 1024
+        print(f"{size:>8} {full_ms:>14.1f} {full_kb:>10.1f} {narrow_ms:>14.1f} {narrow_kb:>10.1f}")
+
+
+def bench_export(sizes: list[int], repeat: int):
+    """流式导出：一次性加载全部行 与 yield_per 流式编码的耗时和内存峰值对比"""
+    import tracemalloc
+    from app import crud
+    from app.database import SessionLocal
+    from app.utils import export
+
+    def load_all():
+        db = SessionLocal()
+        try:
+            rows = crud.get_card_rows(db, limit=-1)
+            for _ in export.iter_csv(rows, list(crud.CARD_FIELDS)):
+                pass
+        finally:
+            db.close()
+
+    def stream():
+        db = SessionLocal()
+        try:
+            rows = crud.iter_card_rows(db)
+            for _ in export.iter_csv(rows, list(crud.CARD_FIELDS)):
+                pass
+        finally:
+            db.close()
+
+    def peak_kb(func):
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak / 1024
+
+    print(f"{'行数':>8} {'全量加载(ms)':>14} {'峰值(KB)':>10} {'流式导出(ms)':>14} {'峰值(KB)':>10}")
+    for size in sizes:
+        seed_cards(size)
+        load_ms = best_of(load_all, repeat)
+        stream_ms = best_of(stream, repeat)
+        print(f"{size:>8} {load_ms:>14.1f} {peak_kb(load_all):>10.0f} {stream_ms:>14.1f} {peak_kb(stream):>10.0f}")
+
+
+def bench_expiry(sizes: list[int], repeat: int):
+    """过期巡检与即将过期查询：加载全部未过期卡片逐行比较 与 exp_ts 部分索引范围扫描对比"""
+    from datetime import timedelta
+    from app import crud, expiry, models
+    from app.database import IS_SQLITE, SessionLocal, engine
+
+    def legacy_sweep():
+        # 改造前的实现：加载所有未删除、未过期且有过期时间的卡片，在 Python 中逐行比较
+        db = SessionLocal()
+        try:
+            now = expiry.epoch_to_local(expiry.now_epoch())
+            cards = db.query(models.Card).filter(
+                models.Card.status != 'deleted',
+                models.Card.status != 'expired',
+                models.Card.exp_date.isnot(None)
+            ).all()
+            [card for card in cards if card.exp_date.replace(tzinfo=None) < now]
+        finally:
+            db.close()
+
+    def legacy_expiring():
+        db = SessionLocal()
+        try:
+            now = expiry.epoch_to_local(expiry.now_epoch())
+            cards = db.query(models.Card).filter(
+                models.Card.status != 'deleted',
+                models.Card.status != 'expired',
+                models.Card.exp_date.isnot(None)
+            ).all()
+            [card for card in cards if now <= card.exp_date.replace(tzinfo=None) < now + timedelta(days=1)]
+        finally:
+            db.close()
+
+    def with_session(func, *args, **kwargs):
+        db = SessionLocal()
+        try:
+            return func(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(
+            ("EXPLAIN QUERY PLAN" if IS_SQLITE else "EXPLAIN") + " SELECT id FROM cards "
+            f"WHERE {models.LIVE_CARD_CONDITION} AND exp_ts < {expiry.now_epoch()}"
+        ).all()
+    print("巡检查询计划: " + "; ".join(row[-1].strip() for row in plan))
+
+    print(f"{'行数':>8} {'全量巡检(ms)':>14} {'索引巡检(ms)':>14} {'全量即将过期(ms)':>18} {'索引即将过期(ms)':>18}")
+    for size in sizes:
+        seed_cards(size)
+        print(
+            f"{size:>8} {best_of(legacy_sweep, repeat):>14.2f} "
+            f"{best_of(lambda: with_session(crud.update_expired_cards), repeat):>14.2f} "
+            f"{best_of(legacy_expiring, repeat):>18.2f} "
+            f"{best_of(lambda: with_session(crud.get_expiring_card_rows, 86400), repeat):>18.2f}"
+        )
+
+
+def bench_import(sizes: list[int], repeat: int):
+    """批量导入（一半卡密已存在）：先 IN 查询再逐个 ORM 添加 与 INSERT ... ON CONFLICT DO NOTHING 对比"""
+    import uuid
+    from app import crud, models
+    from app.database import SessionLocal
+
+    def make_cards(size):
+        # 一半为已存在的卡密，一半为新卡密
+        db = SessionLocal()
+        try:
+            existing = [card_id for card_id, in db.query(models.Card.card_id).limit(size // 2)]
+        finally:
+            db.close()
+        return [{"card_id": card_id, "card_limit": 1.0} for card_id in existing] + [
+            {"card_id": f"mio-{uuid.uuid4()}", "card_limit": 1.0} for _ in range(size - len(existing))
+        ]
+
+    def legacy_import(cards):
+        db = SessionLocal()
+        try:
+            existing = set()
+            for start in range(0, len(cards), 500):
+                existing.update(crud.get_cards_by_ids(db, [card["card_id"] for card in cards[start:start + 500]]))
+            for card in cards:
+                if card["card_id"] not in existing:
+                    db.add(models.Card(card_id=card["card_id"], card_limit=card["card_limit"], status="inactive"))
+            db.commit()
+        finally:
+            db.close()
+
+    def upsert_import(cards):
+        db = SessionLocal()
+        try:
+            crud.insert_new_cards(db, cards)
+            db.commit()
+        finally:
+            db.close()
+
+    def timed_import(func, size):
+        # 每轮使用新的卡密，避免后面几轮全部是重复卡密
+        best = float("inf")
+        for _ in range(repeat):
+            cards = make_cards(size)
+            start = time.perf_counter()
+            func(cards)
+            best = min(best, time.perf_counter() - start)
+        return best * 1000
+
+    print(f"{'行数':>8} {'查询+ORM 添加(ms)':>18} {'ON CONFLICT(ms)':>16}")
+    for size in sizes:
+        seed_cards(size)
+        print(f"{size:>8} {timed_import(legacy_import, size):>18.1f} {timed_import(upsert_import, size):>16.1f}")
+
+
+def bench_auth(requests: int, repeat: int):
+    """鉴权中间件：BaseHTTPMiddleware 实现 与 纯 ASGI 实现的单请求开销对比"""
+    import asyncio
+    import base64
+    import json
+    from itsdangerous import TimestampSigner
+    from starlette.applications import Starlette
+    from starlette.middleware.base import BaseHTTPMiddleware
+    from starlette.middleware.sessions import SessionMiddleware
+    from starlette.responses import JSONResponse, PlainTextResponse, RedirectResponse
+    from starlette.routing import Route
+    from app.middleware import AuthMiddleware
+
+    secret = os.environ["SECRET_KEY"]
+
+    class LegacyAuthMiddleware(BaseHTTPMiddleware):
+        """重写前的实现（每个请求重建规则列表并线性扫描）"""
+        async def dispatch(self, request, call_next):
+            path = request.url.path
+            sensitive_extensions = [".db", ".sqlite", ".sqlite3", ".env", ".log"]
+            if any(path.endswith(ext) for ext in sensitive_extensions):
+                return JSONResponse(status_code=404, content={"detail": "Not Found"})
+            path_parts = path.strip("/").split("/")
+            if any(part.startswith(".") for part in path_parts if part):
+                return JSONResponse(status_code=404, content={"detail": "Not Found"})
+            public_paths = ["/", "/login", "/api/auth/login", "/health", "/static"]
+            is_public = any(path.startswith(p) for p in public_paths)
+            if path.endswith("/sync-activation") and "/api/cards/" in path:
+                is_public = True
+            if not is_public and not request.session.get("authenticated", False):
+                if path.startswith("/api"):
+                    return JSONResponse(status_code=401, content={"detail": "未登录，请先登录"})
+                return RedirectResponse(url="/login", status_code=303)
+            return await call_next(request)
+
+    async def ok(request):
+        return PlainTextResponse("ok")
+
+    routes = [Route("/health", ok), Route("/api/cards/", ok)]
+    apps = {
+        "无中间件": Starlette(routes=routes),
+        "BaseHTTPMiddleware": SessionMiddleware(LegacyAuthMiddleware(Starlette(routes=routes)), secret_key=secret),
+        "纯 ASGI": AuthMiddleware(Starlette(routes=routes), secret_key=secret),
+    }
+
+    session = base64.b64encode(json.dumps({"authenticated": True}).encode())
+    cookie = b"session=" + TimestampSigner(secret).sign(session)
+
+    def make_scope(path):
+        return {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+            "root_path": "", "query_string": b"", "headers": [(b"cookie", cookie)],
+            "client": ("127.0.0.1", 50000), "server": ("benchmark", 80),
+        }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    async def run(app, path):
+        for _ in range(requests):
+            await app(make_scope(path), receive, send)
+
+    print(f"{'实现':<20} {'/health (µs)':>14} {'/api/cards/ (µs)':>18}")
+    for name, app in apps.items():
+        timings = [
+            best_of(lambda: asyncio.run(run(app, path)), repeat) * 1000 / requests
+            for path in ("/health", "/api/cards/")
+        ]
+        print(f"{name:<20} {timings[0]:>14.1f} {timings[1]:>18.1f}")
+
+
+STARTUP_SCRIPT = """
+import asyncio, json, time
+start = time.perf_counter()
+import app.main as main
+import_ms = (time.perf_counter() - start) * 1000
+
+async def run_lifespan():
+    async with main.app.router.lifespan_context(main.app):
+        pass
+
+asyncio.run(run_lifespan())
+print(json.dumps({"import_ms": import_ms, "timings": main.app.state.startup_timings}))
+"""
+
+
+def bench_startup(top: int):
+    """冷启动：在新进程中导入 app.main 并执行 lifespan，按包汇总导入耗时并列出初始化各步骤耗时"""
+    import json
+    import subprocess
+    from collections import defaultdict
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+        cwd=str(Path(__file__).parent), capture_output=True, text=True, check=True
+    )
+
+    # importtime 输出格式：import time: self [us] | cumulative | imported package
+    by_package = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if not parts[0].strip().isdigit():
+            continue
+        package = parts[2].strip().split(".")[0]
+        if package == "app":
+            package = parts[2].strip()
+        by_package[package] += int(parts[0])
+
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+
+    print(f"导入 app.main 总耗时: {report['import_ms']:.1f}ms")
+    print(f"\n按包汇总的导入耗时（前 {top} 项）:")
+    for package, us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {package:<32} {us / 1000:>8.1f}ms")
+
+    print("\n启动初始化（lifespan）:")
+    for name, ms in report["timings"].items():
+        print(f"  {name:<32} {ms:>8.1f}ms")
+    print(f"  {'合计':<30} {sum(report['timings'].values()):>8.1f}ms")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='MisaCard 性能基准测试')
+    parser.add_argument('target',
+                        choices=['list', 'fields', 'export', 'expiry', 'import', 'auth', 'startup'],
+                        help='测试项: list(卡片列表序列化), fields(稀疏字段), export(流式导出), '
+                             'expiry(过期巡检和即将过期查询), import(批量导入), auth(鉴权中间件), '
+                             'startup(冷启动耗时分解)')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000],
+                        help='测试数据行数（默认 1000 10000）')
+    parser.add_argument('--requests', type=int, default=5000,
+                        help='auth 测试的请求次数（默认 5000）')
+    parser.add_argument('--top', type=int, default=15,
+                        help='startup 测试列出的包数量（默认 15）')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='每项重复次数，取最短耗时（默认 5）')
+    parser.add_argument('--backend', choices=['sqlite', 'postgres', 'both'], default='sqlite',
+                        help='数据库类型（默认 sqlite，both 依次测试两种数据库）')
+    parser.add_argument('--postgres-url', default=os.getenv('BENCHMARK_POSTGRES_URL'),
+                        help='使用已有的 PostgreSQL 数据库（必须是专用于测试的空数据库，结束时删除所有表），'
+                             '不指定时在临时目录中启动本地实例')
+
+    args = parser.parse_args()
+
+    if args.backend == 'both':
+        # 引擎在导入 app 时创建，每种数据库在单独的进程中测试
+        for backend in ('sqlite', 'postgres'):
+            print(f"\n===== {backend} =====", flush=True)
+            result = subprocess.run([sys.executable, __file__, *sys.argv[1:], '--backend', backend])
+            if result.returncode:
+                sys.exit(result.returncode)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.backend == 'sqlite':
+            database = nullcontext(f"sqlite:///{os.path.join(tmp_dir, 'benchmark.db')}")
+        elif args.postgres_url:
+            database = nullcontext(args.postgres_url)
+        else:
+            database = local_postgres(tmp_dir)
+
+        with database as database_url:
+            setup_environment(database_url)
+
+            from app import models
+            from app.database import engine
+            from app.migrations import run_migrations
+            models.Base.metadata.create_all(bind=engine)
+            run_migrations(engine)
+
+            try:
+                if args.target == 'list':
+                    bench_list(args.rows, args.repeat)
+                elif args.target == 'fields':
+                    bench_fields(args.rows, args.repeat)
+                elif args.target == 'export':
+                    bench_export(args.rows, args.repeat)
+                elif args.target == 'expiry':
+                    bench_expiry(args.rows, args.repeat)
+                elif args.target == 'import':
+                    bench_import(args.rows, args.repeat)
+                elif args.target == 'auth':
+                    bench_auth(args.requests, args.repeat)
+                elif args.target == 'startup':
+                    bench_startup(args.top)
+            finally:
+                if args.postgres_url and args.backend == 'postgres':
+                    models.Base.metadata.drop_all(bind=engine)
+                engine.dispose()
@@ -11,6 +11,7 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 from app.database import engine, Base
 from app.models import Card, ActivationLog
+from app.migrations import run_migrations
 
 
 def init_database():
@@ -21,6 +22,9 @@ def init_database():
     try:
         # 创建所有表
         Base.metadata.create_all(bind=engine)
+        applied = run_migrations(engine)
+        if applied:
+            print(f"✅ 已补充列: {', '.join(applied)}")
         print("✅ 数据库初始化成功！")
         print(f"✅ 已创建表: {', '.join(Base.metadata.tables.keys())}")
         return True
@@ -73,13 +77,29 @@ def drop_all_tables():
         return False
 
 
+def backup_database():
+    """在线备份数据库（应用运行时也可以执行，不影响读写）"""
+    from app import backup
+
+    print("\n正在备份数据库...")
+    try:
+        result = backup.create_backup()
+        print(f"✅ 已备份到 {result['path']}（{result['size_bytes'] / 1048576:.1f} MB，{result['duration_ms']:.0f}ms）")
+        if result["removed"]:
+            print(f"✅ 已删除旧备份: {', '.join(result['removed'])}")
+        return True
+    except Exception as e:
+        print(f"❌ 备份失败: {e}")
+        return False
+
+
 if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser(description='MisaCard 数据库管理工具')
     parser.add_argument('action',
-                       choices=['init', 'check', 'reset'],
-                       help='操作: init(初始化), check(检查), reset(重置)')
+                       choices=['init', 'check', 'reset', 'backup'],
+                       help='操作: init(初始化), check(检查), reset(重置), backup(在线备份)')
 
     args = parser.parse_args()
 
@@ -92,5 +112,8 @@ if __name__ == "__main__":
         if drop_all_tables():
             init_database()
             check_database()
+    elif args.action == 'backup':
+        if not backup_database():
+            sys.exit(1)
 
     print("\n完成！")